@@ -1,5 +1,7 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
 from design_baselines.logger import Logger
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.autofocused_cbas.trainers import Ensemble
 from design_baselines.autofocused_cbas.trainers import WeightedVAE
 from design_baselines.autofocused_cbas.trainers import CBAS
@@ -22,19 +24,30 @@ def autofocused_cbas(config):
         a dictionary of hyper parameters such as the learning rate
     """
 
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
-    if task.is_discrete:
-        task.map_to_integers()
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
+        if task.is_discrete:
+            task.map_to_integers()
 
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
 
+    # trace every step function once by padding and masking last batches
+    fixed = config.get('fixed_batch_size', False)
+    debug_retracing = config.get('debug_retracing', False)
+
+    # compile the training and sampling steps with XLA when requested
+    jit_compile = config.get('jit_compile', False)
+
     # create the training task and logger
     train_data, val_data = build_pipeline(
         x=x, y=y, w=np.ones_like(y),
@@ -42,27 +55,56 @@ def autofocused_cbas(config):
         batch_size=config['ensemble_batch_size'],
         bootstraps=config['bootstraps'])
 
-    # make several keras neural networks with two hidden layers
-    forward_models = [ForwardModel(
-        task,
-        embedding_size=config['embedding_size'],
-        hidden_size=config['hidden_size'],
-        num_layers=config['num_layers'],
-        initial_max_std=config['initial_max_std'],
-        initial_min_std=config['initial_min_std'])
-        for b in range(config['bootstraps'])]
-
-    # create a trainer for a forward model with a conservative objective
-    ensemble = Ensemble(
-        forward_models,
-        forward_model_optim=tf.keras.optimizers.Adam,
-        forward_model_lr=config['ensemble_lr'])
+    if config.get('stacked_ensemble', False):
+
+        # make one keras neural network that stacks every bootstrap
+        forward_model = StackedForwardModel(
+            task.input_shape,
+            bootstraps=config['bootstraps'],
+            activations=['leaky_relu'] * config['num_layers'],
+            hidden_size=config['hidden_size'],
+            num_classes=task.num_classes if task.is_discrete else None,
+            embedding_size=config['embedding_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+
+        # create a trainer that updates every bootstrap in one step
+        ensemble = StackedEnsemble(
+            forward_model,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            fixed_batch_size=config['ensemble_batch_size'] if fixed else None,
+            debug_retracing=debug_retracing,
+            jit_compile=jit_compile)
+
+    else:
+
+        # make several keras neural networks with two hidden layers
+        forward_models = [ForwardModel(
+            task,
+            embedding_size=config['embedding_size'],
+            hidden_size=config['hidden_size'],
+            num_layers=config['num_layers'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+            for b in range(config['bootstraps'])]
+
+        # create a trainer for a forward model with a conservative objective
+        ensemble = Ensemble(
+            forward_models,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            fixed_batch_size=config['ensemble_batch_size'] if fixed else None,
+            debug_retracing=debug_retracing,
+            jit_compile=jit_compile)
 
     # train the model for an additional number of epochs
-    ensemble.launch(train_data,
-                    val_data,
-                    logger,
-                    config['ensemble_epochs'])
+    logger.watch(ensemble)
+    with logger.span('ensemble'):
+        ensemble.launch(train_data,
+                        val_data,
+                        logger,
+                        config['ensemble_epochs'])
 
     # determine which arcitecture for the decoder to use
     decoder = DiscreteDecoder \
@@ -83,7 +125,11 @@ def autofocused_cbas(config):
     p_vae = WeightedVAE(p_encoder, p_decoder,
                         vae_optim=tf.keras.optimizers.Adam,
                         vae_lr=config['vae_lr'],
-                        vae_beta=config['vae_beta'])
+                        vae_beta=config['vae_beta'],
+                        fixed_batch_size=config['vae_batch_size']
+                        if fixed else None,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
 
     # build a weighted data set
     train_data, val_data = build_pipeline(
@@ -92,10 +138,12 @@ def autofocused_cbas(config):
         val_size=config['val_size'])
 
     # train the initial vae fit to the original data distribution
-    p_vae.launch(train_data,
-                 val_data,
-                 logger,
-                 config['offline_epochs'])
+    logger.watch(p_vae)
+    with logger.span('vae'):
+        p_vae.launch(train_data,
+                     val_data,
+                     logger,
+                     config['offline_epochs'])
 
     # build the encoder and decoder distribution and the p model
     q_encoder = Encoder(task, config['latent_size'],
@@ -112,59 +160,69 @@ def autofocused_cbas(config):
     q_vae = WeightedVAE(q_encoder, q_decoder,
                         vae_optim=tf.keras.optimizers.Adam,
                         vae_lr=config['vae_lr'],
-                        vae_beta=config['vae_beta'])
+                        vae_beta=config['vae_beta'],
+                        fixed_batch_size=config['vae_batch_size']
+                        if fixed else None,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
 
     # create the cbas importance weight generator
     cbas = CBAS(ensemble,
                 p_vae,
                 q_vae,
-                latent_size=config['latent_size'])
+                latent_size=config['latent_size'],
+                jit_compile=jit_compile)
+    logger.watch(q_vae, cbas)
 
     # train and validate the q_vae using online samples
     q_encoder.set_weights(p_encoder.get_weights())
     q_decoder.set_weights(p_decoder.get_weights())
-    for i in range(config['iterations']):
-
-        # generate an importance weighted dataset
-        x_t, y_t, w = cbas.generate_data(
-            config['online_batches'],
-            config['vae_batch_size'],
-            config['percentile'])
-
-        # build a weighted data set
-        train_data, val_data = build_pipeline(
-            x=x_t.numpy(),
-            y=y_t.numpy(),
-            w=w.numpy(),
-            batch_size=config['vae_batch_size'],
-            val_size=config['val_size'])
-
-        # train a vae fit using weighted maximum likelihood
-        start_epoch = config['online_epochs'] * i + \
-                      config['offline_epochs']
-        q_vae.launch(train_data,
-                     val_data,
-                     logger,
-                     config['online_epochs'],
-                     start_epoch=start_epoch)
-
-        # autofocus the forward model using importance weights
-        v = cbas.autofocus_weights(
-            x, batch_size=config['ensemble_batch_size'])
-        train_data, val_data = build_pipeline(
-            x=x, y=y, w=v.numpy(),
-            bootstraps=config['bootstraps'],
-            batch_size=config['ensemble_batch_size'],
-            val_size=config['val_size'])
-
-        # train a vae fit using weighted maximum likelihood
-        start_epoch = config['autofocus_epochs'] * i + \
-            config['ensemble_epochs']
-        ensemble.launch(train_data,
-                        val_data,
-                        logger,
-                        config['autofocus_epochs'],
-                        start_epoch=start_epoch)
+    with logger.span('solver'):
+        for i in range(config['iterations']):
+
+            # generate an importance weighted dataset
+            with logger.span('sampling'):
+                x_t, y_t, w = cbas.generate_data(
+                    config['online_batches'],
+                    config['vae_batch_size'],
+                    config['percentile'])
+
+            # build a weighted data set
+            train_data, val_data = build_pipeline(
+                x=x_t.numpy(),
+                y=y_t.numpy(),
+                w=w.numpy(),
+                batch_size=config['vae_batch_size'],
+                val_size=config['val_size'])
+
+            # train a vae fit using weighted maximum likelihood
+            start_epoch = config['online_epochs'] * i + \
+                          config['offline_epochs']
+            with logger.span('vae'):
+                q_vae.launch(train_data,
+                             val_data,
+                             logger,
+                             config['online_epochs'],
+                             start_epoch=start_epoch)
+
+            # autofocus the forward model using importance weights
+            v = cbas.autofocus_weights(
+                x, batch_size=config['ensemble_batch_size'])
+            train_data, val_data = build_pipeline(
+                x=x, y=y, w=v.numpy(),
+                bootstraps=config['bootstraps'],
+                batch_size=config['ensemble_batch_size'],
+                val_size=config['val_size'])
+
+            # train a vae fit using weighted maximum likelihood
+            start_epoch = config['autofocus_epochs'] * i + \
+                config['ensemble_epochs']
+            with logger.span('ensemble'):
+                ensemble.launch(train_data,
+                                val_data,
+                                logger,
+                                config['autofocus_epochs'],
+                                start_epoch=start_epoch)
 
     # sample designs from the prior
     z = tf.random.normal([config['solver_samples'], config['latent_size']])
@@ -173,10 +231,15 @@ def autofocused_cbas(config):
     np.save(os.path.join(config["logging_dir"],
                          f"solution.npy"), x_t.numpy())
     if config["do_evaluation"]:
-        score = task.predict(x_t)
+        with logger.span('oracle'):
+            score = task.predict(x_t)
         if task.is_normalized_y:
             score = task.denormalize_y(score)
         logger.record("score",
                       score,
                       config['iterations'],
                       percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
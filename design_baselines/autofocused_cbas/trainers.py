@@ -1,4 +1,9 @@
 from design_baselines.utils import spearman
+from design_baselines.utils import pad_batch
+from design_baselines.utils import unpad_statistics
+from design_baselines.utils import get_fixed_step
+from design_baselines.utils import check_retracing
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow_probability as tfp
@@ -10,7 +15,10 @@ class Ensemble(tf.Module):
     def __init__(self,
                  forward_models,
                  forward_model_optim=tf.keras.optimizers.Adam,
-                 forward_model_lr=0.001):
+                 forward_model_lr=0.001,
+                 fixed_batch_size=None,
+                 debug_retracing=False,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -22,6 +30,9 @@ class Ensemble(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        fixed_batch_size, debug_retracing, jit_compile:
+            how the step functions are traced and compiled, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -33,6 +44,12 @@ class Ensemble(tf.Module):
             forward_model_optim(learning_rate=forward_model_lr)
             for i in range(self.bootstraps)]
 
+        # trace and compile the step functions as requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        fixed_batch_size=fixed_batch_size,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
+
     def get_distribution(self,
                          x,
                          **kwargs):
@@ -70,7 +87,8 @@ class Ensemble(tf.Module):
                    x,
                    y,
                    b,
-                   w):
+                   w,
+                   size=None):
         """Perform a training step of gradient descent on an ensemble
         using bootstrap weights for each model in the ensemble
 
@@ -82,6 +100,9 @@ class Ensemble(tf.Module):
             a batch of training labels shaped like [batch_size, 1]
         b: tf.Tensor
             bootstrap indicators shaped like [batch_size, num_oracles]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
 
         Returns:
 
@@ -102,7 +123,8 @@ class Ensemble(tf.Module):
                 nll = -d.log_prob(y)[:, 0]
 
                 # evaluate how correct the rank fo the model predictions are
-                rank_correlation = spearman(y[:, 0], d.mean()[:, 0])
+                rank_correlation = spearman(
+                    y[:, 0], d.mean()[:, 0], size=size)
 
                 # build the total loss and weight by the bootstrap
                 total_loss = tf.math.divide_no_nan(tf.reduce_sum(
@@ -119,7 +141,8 @@ class Ensemble(tf.Module):
     @tf.function(experimental_relax_shapes=True)
     def validate_step(self,
                       x,
-                      y):
+                      y,
+                      size=None):
         """Perform a validation step on an ensemble of models
         without using bootstrapping weights
 
@@ -129,6 +152,9 @@ class Ensemble(tf.Module):
             a batch of validation inputs shaped like [batch_size, channels]
         y: tf.Tensor
             a batch of validation labels shaped like [batch_size, 1]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
 
         Returns:
 
@@ -146,7 +172,8 @@ class Ensemble(tf.Module):
             nll = -d.log_prob(y)[:, 0]
 
             # evaluate how correct the rank fo the model predictions are
-            rank_correlation = spearman(y[:, 0], d.mean()[:, 0])
+            rank_correlation = spearman(
+                y[:, 0], d.mean()[:, 0], size=size)
 
             statistics[f'oracle_{i}/validate/nll'] = nll
             statistics[f'oracle_{i}/validate/rank_corr'] = rank_correlation
@@ -171,7 +198,17 @@ class Ensemble(tf.Module):
 
         statistics = defaultdict(list)
         for x, y, b, w in dataset:
-            for name, tensor in self.train_step(x, y, b, w).items():
+            step, size = self.train_step, int(x.shape[0])
+            args = (x, y, b, w)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and mask the padding out of the loss
+                mask, (x, y, b, w) = pad_batch(
+                    self.fixed_batch_size, x, y, b, w)
+                args = (x, y, b * mask, w, tf.constant(size))
+                step = get_fixed_step(self, 'train_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -195,7 +232,16 @@ class Ensemble(tf.Module):
 
         statistics = defaultdict(list)
         for x, y in dataset:
-            for name, tensor in self.validate_step(x, y).items():
+            step, size = self.validate_step, int(x.shape[0])
+            args = (x, y)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and remove padding from statistics
+                _, (x, y) = pad_batch(self.fixed_batch_size, x, y)
+                args = (x, y, tf.constant(size))
+                step = get_fixed_step(self, 'validate_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -224,9 +270,13 @@ class Ensemble(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+            # fail when a step function is traced again after one epoch
+            if self.debug_retracing:
+                check_retracing(self)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -252,7 +302,10 @@ class WeightedVAE(tf.Module):
                  decoder,
                  vae_optim=tf.keras.optimizers.Adam,
                  vae_lr=0.001,
-                 vae_beta=1.0):
+                 vae_beta=1.0,
+                 fixed_batch_size=None,
+                 debug_retracing=False,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -268,6 +321,9 @@ class WeightedVAE(tf.Module):
             the learning rate for the oracle model optimizer
         vae_beta: float
             the variational beta for the oracle model optimizer
+        fixed_batch_size, debug_retracing, jit_compile:
+            how the step functions are traced and compiled, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -276,6 +332,12 @@ class WeightedVAE(tf.Module):
         self.optim = vae_optim(learning_rate=vae_lr)
         self.vae_beta = vae_beta
 
+        # trace and compile the step functions as requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        fixed_batch_size=fixed_batch_size,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x,
@@ -390,7 +452,16 @@ class WeightedVAE(tf.Module):
 
         statistics = defaultdict(list)
         for x, y, w in dataset:
-            for name, tensor in self.train_step(x, y, w).items():
+            step, size = self.train_step, int(x.shape[0])
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and mask the padding out of the loss
+                # scaling weights so the mean over the batch is unchanged
+                mask, (x, y, w) = pad_batch(self.fixed_batch_size, x, y, w)
+                w = w * mask * (self.fixed_batch_size / size)
+                step = get_fixed_step(self, 'train_step', x, y, w)
+            for name, tensor in unpad_statistics(
+                    step(x, y, w), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -414,7 +485,14 @@ class WeightedVAE(tf.Module):
 
         statistics = defaultdict(list)
         for x, y in dataset:
-            for name, tensor in self.validate_step(x, y).items():
+            step, size = self.validate_step, int(x.shape[0])
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and remove padding from statistics
+                _, (x, y) = pad_batch(self.fixed_batch_size, x, y)
+                step = get_fixed_step(self, 'validate_step', x, y)
+            for name, tensor in unpad_statistics(
+                    step(x, y), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -443,9 +521,13 @@ class WeightedVAE(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+            # fail when a step function is traced again after one epoch
+            if self.debug_retracing:
+                check_retracing(self)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -470,7 +552,8 @@ class CBAS(tf.Module):
                  ensemble,
                  p_vae,
                  q_vae,
-                 latent_size=20):
+                 latent_size=20,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -486,6 +569,9 @@ class CBAS(tf.Module):
             the learning rate for the oracle model optimizer
         vae_beta: float
             the variational beta for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the sampling functions with XLA, which
+            traces again for every number of batches and samples
         """
 
         super().__init__()
@@ -494,7 +580,10 @@ class CBAS(tf.Module):
         self.q_vae = q_vae
         self.latent_size = latent_size
 
-    @tf.function(experimental_relax_shapes=True)
+        # compile the sampling functions with XLA when requested
+        configure_steps(self, 'sample_data', 'get_autofocus_ratio',
+                        jit_compile=jit_compile)
+
     def generate_data(self,
                       num_batches,
                       num_samples,
@@ -521,11 +610,44 @@ class CBAS(tf.Module):
             the dataset importance weights calculated using the vaes
         """
 
-        xs = []
-        ys = []
-        ws = []
+        # xla needs static shapes, so sizes are traced as constants
+        if self.jit_compile:
+            return self.sample_data(num_batches, num_samples,
+                                    tf.constant(percentile, tf.float32))
 
-        for j in range(num_batches):
+        # pass tensors so that new sizes do not trigger a retrace
+        return self.sample_data(tf.constant(num_batches, tf.int32),
+                                tf.constant(num_samples, tf.int32),
+                                tf.constant(percentile, tf.float32))
+
+    @tf.function(experimental_relax_shapes=True)
+    def sample_data(self,
+                    num_batches,
+                    num_samples,
+                    percentile):
+        """Generate a data set of samples in fixed size batches inside a
+        single while loop, evaluating the ensemble once per batch
+
+        Args:
+
+        num_batches: int or tf.Tensor
+            the number of batches of samples to generate
+        num_samples: int or tf.Tensor
+            the number of samples to generate all at once using the vae
+        percentile: tf.Tensor
+            the percentile in [0, 100] that determines importance weights
+
+        Returns:
+
+        xs: tf.Tensor
+            the dataset x values sampled from the vaes
+        ys: tf.Tensor
+            the dataset y values predicted by the ensemble
+        ws: tf.Tensor
+            the dataset importance weights calculated using the vaes
+        """
+
+        def sample_batch():
 
             # sample designs from the prior
             z = tf.random.normal([num_samples, self.latent_size])
@@ -534,28 +656,37 @@ class CBAS(tf.Module):
 
             # evaluate the score and importance weights
             x = q_dx.sample()
-            y = self.ensemble.get_distribution(x).mean()
+            d = self.ensemble.get_distribution(x)
             log_w = p_dx.log_prob(x)[..., tf.newaxis] - \
                     q_dx.log_prob(x)[..., tf.newaxis]
             while len(log_w.shape) > 2:
                 log_w = tf.reduce_sum(log_w, axis=1)
 
-            xs.append(x)
-            ys.append(y)
-            ws.append(tf.math.exp(log_w))
+            # keep the parameters of the ensemble for the cdf later
+            return (x, d.mean(), log_w, d.components_distribution.loc,
+                    d.components_distribution.scale)
 
-        # locate the cutoff for the scores below the percentile
-        gamma = tfp.stats.percentile(ys, percentile)
+        def loop_body(j, arrays):
+            return j + 1, [a.write(j, t) for a, t in zip(
+                arrays, sample_batch())]
 
-        for j in range(num_batches):
+        # the first batch determines the types of the remaining batches
+        arrays = [tf.TensorArray(t.dtype, size=num_batches).write(0, t)
+                  for t in sample_batch()]
+        j, arrays = tf.while_loop(
+            lambda j, arrays: tf.less(j, num_batches), loop_body,
+            (tf.constant(1), arrays))
+        xs, ys, log_ws, loc, scale = [a.concat() for a in arrays]
 
-            # re-weight by the cumulative probability of the score
-            d = self.ensemble.get_distribution(xs[j])
-            ws[j] *= 1.0 - d.cdf(tf.fill([num_samples, 1], gamma))
+        # locate the cutoff for the scores below the percentile
+        gamma = tfp.stats.percentile(ys, percentile)
 
-        return tf.concat(xs, axis=0), \
-               tf.concat(ys, axis=0), \
-               tf.concat(ws, axis=0)
+        # re-weight by the cumulative probability of the score
+        d = tfpd.MixtureSameFamily(
+            tfpd.Categorical(logits=tf.zeros(tf.shape(loc)[-1:])),
+            tfpd.Normal(loc=loc, scale=scale))
+        ws = tf.math.exp(log_ws) * (1.0 - d.cdf(tf.fill(tf.shape(ys), gamma)))
+        return xs, ys, ws
 
     @tf.function(experimental_relax_shapes=True)
     def get_autofocus_ratio(self, x):
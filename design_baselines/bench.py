@@ -0,0 +1,471 @@
+from design_baselines.synthetic import SyntheticTask
+from design_baselines.utils import get_peak_rss
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import tensorflow as tf
+import numpy as np
+import platform
+import time
+import json
+import os
+
+
+def measure(step_fn,
+            steps,
+            samples_per_step,
+            warmup=2):
+    """Call a step function several times after a number of warm up
+    calls that trace functions, and report its throughput and latency
+
+    Args:
+
+    step_fn: Callable
+        a function with no arguments that runs one step of a stage
+    steps: int
+        the number of timed calls to the step function
+    samples_per_step: int
+        the number of samples processed by every call
+    warmup: int
+        the number of untimed calls before measuring
+
+    Returns:
+
+    results: dict
+        a dictionary with the throughput, latency percentiles in
+        milliseconds, and peak memory of the process running the stage
+    """
+
+    def run():
+        # block until every returned tensor is computed
+        tf.nest.map_structure(lambda t: t.numpy() if hasattr(
+            t, 'numpy') else t, step_fn())
+
+    start = time.perf_counter()
+    for i in range(warmup):
+        run()
+    warmup_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(steps):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+
+    total_time = float(np.sum(latencies))
+    return dict(steps=steps,
+                samples_per_step=samples_per_step,
+                warmup_seconds=warmup_time,
+                total_seconds=total_time,
+                steps_per_sec=steps / total_time,
+                samples_per_sec=steps * samples_per_step / total_time,
+                p50_ms=float(np.percentile(latencies, 50)) * 1000.0,
+                p95_ms=float(np.percentile(latencies, 95)) * 1000.0,
+                peak_rss_mb=get_peak_rss())
+
+
+def ensemble_train_step(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a step of Ensemble.train_step from gradient ascent"""
+
+    from design_baselines.gradient_ascent.trainers import Ensemble
+    from design_baselines.gradient_ascent.nets import ForwardModel
+    ensemble = Ensemble([ForwardModel(
+        task.input_shape, hidden_size=hidden_size) for b in range(5)],
+        jit_compile=jit_compile)
+
+    x, y = task.x[:batch_size], task.y[:batch_size]
+    b = tf.ones([batch_size, 5])
+    return lambda: ensemble.train_step(x, y, b), batch_size
+
+
+def coms_train_step(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a step of ConservativeObjectiveModel.train_step"""
+
+    from design_baselines.coms_cleaned.trainers \
+        import ConservativeObjectiveModel
+    from design_baselines.coms_cleaned.nets import ForwardModel
+    trainer = ConservativeObjectiveModel(ForwardModel(
+        task.input_shape, hidden_size=hidden_size), jit_compile=jit_compile)
+
+    x, y = task.x[:batch_size], task.y[:batch_size]
+    return lambda: trainer.train_step(x, y), batch_size
+
+
+def coms_optimize(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a call to ConservativeObjectiveModel.optimize"""
+
+    from design_baselines.coms_cleaned.trainers \
+        import ConservativeObjectiveModel
+    from design_baselines.coms_cleaned.nets import ForwardModel
+    trainer = ConservativeObjectiveModel(ForwardModel(
+        task.input_shape, hidden_size=hidden_size), jit_compile=jit_compile)
+
+    x = tf.constant(task.x[:batch_size])
+    return lambda: trainer.optimize(
+        x, trainer.particle_gradient_steps, training=False), batch_size
+
+
+def mins_train_step(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a step of WeightedGAN.train_step from MINs"""
+
+    from design_baselines.mins.trainers import WeightedGAN
+    from design_baselines.mins.nets import ContinuousGenerator
+    from design_baselines.mins.nets import Discriminator
+    gan = WeightedGAN(
+        ContinuousGenerator(task.input_shape, 32, hidden=hidden_size),
+        Discriminator(task.input_shape, hidden=hidden_size),
+        jit_compile=jit_compile)
+
+    x, y = task.x[:batch_size], task.y[:batch_size]
+    w = tf.ones([batch_size, 1])
+    i = tf.constant(0)
+    return lambda: gan.train_step(i, x, y, w), batch_size
+
+
+def build_cbas(task, hidden_size, jit_compile=False):
+    """Build the ensemble and the two VAEs used by CbAS"""
+
+    from design_baselines.cbas.trainers import Ensemble
+    from design_baselines.cbas.trainers import WeightedVAE
+    from design_baselines.cbas.trainers import CBAS
+    from design_baselines.cbas.nets import ForwardModel
+    from design_baselines.cbas.nets import Encoder
+    from design_baselines.cbas.nets import ContinuousDecoder
+    ensemble = Ensemble([ForwardModel(
+        task, hidden_size=hidden_size) for b in range(5)],
+        jit_compile=jit_compile)
+    p_vae = WeightedVAE(
+        Encoder(task, 32, hidden_size=hidden_size),
+        ContinuousDecoder(task, 32, hidden_size=hidden_size),
+        jit_compile=jit_compile)
+    q_vae = WeightedVAE(
+        Encoder(task, 32, hidden_size=hidden_size),
+        ContinuousDecoder(task, 32, hidden_size=hidden_size),
+        jit_compile=jit_compile)
+    return CBAS(ensemble, p_vae, q_vae,
+                latent_size=32, jit_compile=jit_compile)
+
+
+def cbas_train_step(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a step of WeightedVAE.train_step from CbAS"""
+
+    cbas = build_cbas(task, hidden_size, jit_compile=jit_compile)
+    x, y = task.x[:batch_size], task.y[:batch_size]
+    w = tf.ones([batch_size, 1])
+    return lambda: cbas.p_vae.train_step(x, y, w), batch_size
+
+
+def cbas_generate_data(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a call to CBAS.generate_data with ten batches"""
+
+    cbas = build_cbas(task, hidden_size, jit_compile=jit_compile)
+    return lambda: cbas.generate_data(
+        10, batch_size, 80.0), 10 * batch_size
+
+
+def gradient_ascent_solve(task, batch_size, hidden_size, jit_compile=False):
+    """Returns a call to GradientAscentSolver.solve with fifty steps"""
+
+    from design_baselines.gradient_ascent.solver import GradientAscentSolver
+    from design_baselines.gradient_ascent.nets import ForwardModel
+    forward_models = [ForwardModel(
+        task.input_shape, hidden_size=hidden_size) for b in range(5)]
+
+    def get_predictions(xt):
+        return tf.stack([fm.get_distribution(
+            xt).mean() for fm in forward_models], axis=0)
+
+    solver = GradientAscentSolver(
+        get_predictions, solver_lr=0.01, jit_compile=jit_compile)
+    x = tf.constant(task.x[:batch_size])
+    mean_x = tf.reduce_mean(x, axis=0, keepdims=True)
+    return lambda: solver.solve(x, mean_x, 50), batch_size
+
+
+def cma_es(task, batch_size, hidden_size, jit_compile=False):
+    """Returns one generation of BatchedCMAES scored by an ensemble"""
+
+    from design_baselines.cma_es.solver import BatchedCMAES
+    from design_baselines.gradient_ascent.nets import ForwardModel
+    model = ForwardModel(task.input_shape, hidden_size=hidden_size)
+
+    @tf.function(experimental_relax_shapes=True,
+                 experimental_compile=jit_compile)
+    def fitness(x):
+        return -model.get_distribution(x).mean()[:, 0]
+
+    es = BatchedCMAES(task.x[:batch_size], 0.5, seed=0)
+
+    def step():
+        candidates = es.ask()
+        es.tell(candidates, fitness(tf.cast(tf.reshape(
+            candidates, [-1, task.input_size]), tf.float32)).numpy()
+            .reshape(candidates.shape[:2]))
+
+    return step, batch_size * es.popsize
+
+
+def bo_qei(task, batch_size, hidden_size, jit_compile=False):
+    """Returns one iteration of BO-qEI that fits its gaussian process in
+    pytorch and scores the proposed designs with a tensorflow ensemble"""
+
+    from design_baselines.bo_qei.bridge import BatchedObjective
+    from design_baselines.bo_qei.bridge import tf_to_torch
+    from design_baselines.bo_qei.gp import initialize_model
+    from design_baselines.bo_qei.gp import optimize_qei
+    from design_baselines.gradient_ascent.nets import ForwardModel
+    from botorch import fit_gpytorch_model
+    import torch
+
+    model = ForwardModel(task.input_shape, hidden_size=hidden_size)
+
+    @tf.function(experimental_relax_shapes=True,
+                 experimental_compile=jit_compile)
+    def predict(x):
+        return model.get_distribution(x).mean()
+
+    q = 8
+    objective = BatchedObjective(predict, task.input_shape, q)
+    train_x = tf_to_torch(task.x[:batch_size], dtype=torch.float32)
+    train_y = tf_to_torch(task.y[:batch_size], dtype=torch.float32)
+    train_yvar = torch.tensor(0.01, dtype=torch.float32)
+    bounds = torch.stack([train_x.min(0)[0], train_x.max(0)[0]])
+
+    def step():
+        mll, gp = initialize_model(train_x, train_y, train_yvar)
+        fit_gpytorch_model(mll, options={"maxiter": 50})
+        candidates = optimize_qei(
+            gp, train_y.max(), bounds, q, mc_samples=128,
+            num_restarts=4, raw_samples=64, batch_limit=4, maxiter=50)
+        return objective(candidates).numpy()
+
+    return step, batch_size
+
+
+def build_pipeline(task, batch_size, hidden_size, jit_compile=False):
+    """Returns the next batch of a bootstrapped build_pipeline, which
+    runs in tf.data and is never compiled with XLA"""
+
+    from design_baselines.data import build_pipeline as build
+    train_data, val_data = build(
+        x=task.x, y=task.y, bootstraps=5,
+        batch_size=batch_size, val_size=batch_size)
+    iterator = iter(train_data.repeat())
+    return lambda: next(iterator), batch_size
+
+
+# the stages of every baseline that can be benchmarked
+STAGES = {
+    "ensemble_train_step": ensemble_train_step,
+    "coms_train_step": coms_train_step,
+    "coms_optimize": coms_optimize,
+    "mins_train_step": mins_train_step,
+    "cbas_train_step": cbas_train_step,
+    "cbas_generate_data": cbas_generate_data,
+    "gradient_ascent_solve": gradient_ascent_solve,
+    "cma_es": cma_es,
+    "bo_qei": bo_qei,
+    "build_pipeline": build_pipeline,
+}
+
+
+def run_stage(name,
+              steps=50,
+              warmup=2,
+              batch_size=128,
+              hidden_size=256,
+              input_size=64,
+              dataset_size=4096,
+              seed=0,
+              jit_compile=False):
+    """Build one stage on a random synthetic task and measure it, which
+    is the entry point of the process that runs every stage
+
+    Args:
+
+    name: str
+        the name of a stage in STAGES to run
+    steps: int
+        the number of timed steps of the stage
+    warmup: int
+        the number of untimed steps before timing the stage
+    batch_size: int
+        the number of designs processed by every step
+    hidden_size: int
+        the hidden size of every neural network
+    input_size: int
+        the number of dimensions of every design
+    dataset_size: int
+        the number of designs in the random dataset
+    seed: int
+        the random seed used to create inputs and weights
+    jit_compile: bool
+        whether to compile the step functions of the stage with XLA
+
+    Returns:
+
+    results: dict
+        the dictionary returned by measure, or the reason the stage was
+        skipped when its optional dependencies are not installed
+    """
+
+    tf.random.set_seed(seed)
+    task = SyntheticTask(oracle="mlp", dataset_size=dataset_size,
+                         design_shape=(input_size,), seed=seed)
+    try:
+        step_fn, samples_per_step = STAGES[name](
+            task, batch_size, hidden_size, jit_compile=jit_compile)
+    except ImportError as e:
+        return dict(skipped=str(e))
+    return measure(step_fn, steps, samples_per_step, warmup=warmup)
+
+
+def run_benchmarks(stages=None,
+                   steps=50,
+                   warmup=2,
+                   batch_size=128,
+                   hidden_size=256,
+                   input_size=64,
+                   dataset_size=4096,
+                   seed=0,
+                   jit_compile=False,
+                   isolate_stages=True):
+    """Run the benchmark of several stages on fixed size random inputs,
+    skipping stages whose optional dependencies are not installed
+
+    Args:
+
+    stages: list of str
+        the names of stages in STAGES to run, defaults to every stage
+    steps: int
+        the number of timed steps of every stage
+    warmup: int
+        the number of untimed steps before timing every stage
+    batch_size: int
+        the number of designs processed by every step
+    hidden_size: int
+        the hidden size of every neural network
+    input_size: int
+        the number of dimensions of every design
+    dataset_size: int
+        the number of designs in the random dataset
+    seed: int
+        the random seed used to create inputs and weights
+    jit_compile: bool
+        whether to compile the step functions of every stage with XLA
+    isolate_stages: bool
+        whether to run every stage in a fresh process, without which
+        the peak memory of a stage includes every earlier stage
+
+    Returns:
+
+    report: dict
+        a dictionary with the settings of the benchmark, information
+        about the machine, and the results of every stage
+    """
+
+    kwargs = dict(steps=steps, warmup=warmup, batch_size=batch_size,
+                  hidden_size=hidden_size, input_size=input_size,
+                  dataset_size=dataset_size, seed=seed,
+                  jit_compile=jit_compile)
+
+    results = dict()
+    for name in (stages if stages else list(STAGES.keys())):
+        if isolate_stages:
+
+            # tensorflow is not fork safe so stages run in spawned processes
+            with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn')) as pool:
+                results[name] = pool.submit(run_stage, name, **kwargs).result()
+
+        else:
+            results[name] = run_stage(name, **kwargs)
+
+        if "skipped" not in results[name]:
+            print(f"{name}{' (xla)' if jit_compile else ''}: "
+                  f"{results[name]['steps_per_sec']:.2f} steps/sec, "
+                  f"p50 = {results[name]['p50_ms']:.2f} ms, "
+                  f"p95 = {results[name]['p95_ms']:.2f} ms, "
+                  f"peak = {results[name]['peak_rss_mb']:.1f} MB")
+
+    return dict(settings=dict(steps=steps, warmup=warmup,
+                              batch_size=batch_size,
+                              hidden_size=hidden_size,
+                              input_size=input_size,
+                              dataset_size=dataset_size, seed=seed,
+                              jit_compile=jit_compile,
+                              isolate_stages=isolate_stages),
+                machine=dict(python=platform.python_version(),
+                             tensorflow=tf.__version__,
+                             processor=platform.processor(),
+                             cpu_count=os.cpu_count()),
+                results=results)
+
+
+def compare_reports(report,
+                    baseline):
+    """Compare the throughput of every stage in a benchmark report with
+    a report saved before, such as a report from an earlier commit
+
+    Args:
+
+    report: dict
+        a dictionary returned by run_benchmarks
+    baseline: dict
+        a dictionary returned by run_benchmarks for an earlier commit
+
+    Returns:
+
+    speedups: dict
+        a dictionary mapping stages run in both reports to the ratio of
+        their steps per second, where values below one are regressions
+    """
+
+    speedups = dict()
+    for name, results in report["results"].items():
+        previous = baseline["results"].get(name, dict())
+        if "steps_per_sec" in results and "steps_per_sec" in previous:
+            speedups[name] = results["steps_per_sec"] / \
+                previous["steps_per_sec"]
+    return speedups
+
+
+def compare_jit_compile(**kwargs):
+    """Run the benchmark of several stages twice, with and without
+    compiling their step functions with XLA, and report the speedup of
+    the compiled step functions for every stage
+
+    Args:
+
+    kwargs: dict
+        the arguments passed to run_benchmarks such as the stages
+
+    Returns:
+
+    report: dict
+        a dictionary containing the compiled and uncompiled reports and
+        the speedup of every stage, where values below one mean that
+        compiling made the stage slower
+    """
+
+    uncompiled = run_benchmarks(jit_compile=False, **kwargs)
+    compiled = run_benchmarks(jit_compile=True, **kwargs)
+    return dict(uncompiled=uncompiled, compiled=compiled,
+                speedups=compare_reports(compiled, uncompiled))
+
+
+def save_report(report,
+                path):
+    """Save a benchmark report to a json file that can be compared
+    against reports from other commits
+
+    Args:
+
+    report: dict
+        a dictionary returned by run_benchmarks
+    path: str
+        the path to the json file to write
+    """
+
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4, sort_keys=True)
@@ -1,8 +1,14 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
+from design_baselines.data import get_dataset_key
 from design_baselines.logger import Logger
+from design_baselines.checkpoints import ModelCache
+from design_baselines.checkpoints import VAECache
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.bo_qei.trainers import Ensemble, VAETrainer
 from design_baselines.bo_qei.nets import ForwardModel, SequentialVAE
 from design_baselines.utils import render_video
+from design_baselines.utils import set_seed
 import tensorflow as tf
 import numpy as np
 import os
@@ -18,16 +24,27 @@ def bo_qei(config):
         a dictionary of hyper parameters such as the learning rate
     """
 
-    # create the training task and logger
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
+    # models are only cached when training is seeded
+    if config.get('seed', None) is not None:
+        set_seed(config['seed'])
 
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if task.is_discrete and not config["use_vae"]:
-        task.map_to_logits()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+    # create the training task and logger
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
+
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if task.is_discrete and not config["use_vae"] \
+                and config.get('lazy_logits', False):
+            task.map_to_lazy_logits()
+        elif task.is_discrete and not config["use_vae"]:
+            task.map_to_logits()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
@@ -45,7 +62,9 @@ def bo_qei(config):
         vae_trainer = VAETrainer(vae_model,
                                  vae_optim=tf.keras.optimizers.Adam,
                                  vae_lr=config['vae_lr'],
-                                 beta=config['vae_beta'])
+                                 beta=config['vae_beta'],
+                                 jit_compile=config.get('jit_compile', False))
+        logger.watch(vae_trainer)
 
         # create the training task and logger
         train_data, val_data = build_pipeline(
@@ -53,18 +72,48 @@ def bo_qei(config):
             batch_size=config['vae_batch_size'],
             val_size=config['val_size'])
 
-        # estimate the number of training steps per epoch
-        vae_trainer.launch(train_data, val_data,
-                           logger, config['vae_epochs'])
+        # the dataset key is None when the subsample is not reproducible
+        dataset_key = get_dataset_key(task.task_name, task.task_kwargs,
+                                      seed=task.dataset_seed)
+        if config.get('vae_cache_dir', None) is not None \
+                and config.get('seed', None) is not None \
+                and dataset_key is not None:
+
+            # restore a VAE and latent dataset shared by latent baselines
+            vae_cache = VAECache(config['vae_cache_dir'])
+            vae_key = vae_cache.get_key(
+                dataset=dataset_key,
+                hidden_size=config['vae_hidden_size'],
+                latent_size=config['vae_latent_size'],
+                activation=config['vae_activation'],
+                kernel_size=config['vae_kernel_size'],
+                num_blocks=config['vae_num_blocks'],
+                lr=config['vae_lr'], beta=config['vae_beta'],
+                batch_size=config['vae_batch_size'],
+                val_size=config['val_size'], epochs=config['vae_epochs'],
+                seed=config['seed'])
+            with logger.span('vae'):
+                vae_cache.launch(vae_key, vae_trainer, train_data, val_data,
+                                 logger, config['vae_epochs'])
+            x, mean, standard_dev = vae_cache.encode(vae_key, vae_model, x)
+
+        else:
+
+            # estimate the number of training steps per epoch
+            with logger.span('vae'):
+                vae_trainer.launch(train_data, val_data,
+                                   logger, config['vae_epochs'])
 
-        # map the x values to latent space
-        x = vae_model.encoder_cnn.predict(x)[0]
+            # map the x values to latent space
+            x = vae_model.encoder_cnn.predict(x)[0]
 
-        mean = np.mean(x, axis=0, keepdims=True)
-        standard_dev = np.std(x - mean, axis=0, keepdims=True)
-        x = (x - mean) / standard_dev
+            mean = np.mean(x, axis=0, keepdims=True)
+            standard_dev = np.std(x - mean, axis=0, keepdims=True)
+            x = (x - mean) / standard_dev
 
     input_shape = x.shape[1:]
+    if task.is_lazy_logits:
+        input_shape = list(input_shape) + [task.num_classes - 1]
     input_size = np.prod(input_shape)
 
     # create the training task and logger
@@ -73,41 +122,97 @@ def bo_qei(config):
         batch_size=config['ensemble_batch_size'],
         val_size=config['val_size'])
 
-    # make several keras neural networks with two hidden layers
-    forward_models = [ForwardModel(
-        input_shape,
-        hidden_size=config['hidden_size'],
-        num_layers=config['num_layers'],
-        initial_max_std=config['initial_max_std'],
-        initial_min_std=config['initial_min_std'])
-        for b in range(config['bootstraps'])]
-
-    # create a trainer for a forward model with a conservative objective
-    ensemble = Ensemble(
-        forward_models,
-        forward_model_optim=tf.keras.optimizers.Adam,
-        forward_model_lr=config['ensemble_lr'])
-
-    # train the model for an additional number of epochs
-    ensemble.launch(train_data,
-                    val_data,
-                    logger,
-                    config['ensemble_epochs'])
+    if task.is_lazy_logits:
+
+        # convert only the designs in every batch to logits
+        def map_to_logits(x, *rest):
+            return (task.lazy_to_logits(x), *rest)
+
+        train_data = train_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        val_data = val_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    if config.get('stacked_ensemble', False):
+
+        # make one keras neural network that stacks every bootstrap
+        forward_model = StackedForwardModel(
+            input_shape,
+            bootstraps=config['bootstraps'],
+            activations=['leaky_relu'] * config['num_layers'],
+            hidden_size=config['hidden_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+
+        # create a trainer that updates every bootstrap in one step
+        ensemble = StackedEnsemble(
+            forward_model,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+
+    else:
+
+        # make several keras neural networks with two hidden layers
+        forward_models = [ForwardModel(
+            input_shape,
+            hidden_size=config['hidden_size'],
+            num_layers=config['num_layers'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+            for b in range(config['bootstraps'])]
+
+        # create a trainer for a forward model with a conservative objective
+        ensemble = Ensemble(
+            forward_models,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+    logger.watch(ensemble)
+
+    if config.get('model_cache_dir', None) is not None \
+            and config.get('seed', None) is not None \
+            and not config["use_vae"]:
+
+        # restore the ensemble when an identical one was trained before
+        cache = ModelCache(config['model_cache_dir'])
+        key = cache.get_key(seed=config['seed'], model='bo_qei', **{
+            name: config.get(name, None) for name in (
+                'task', 'task_kwargs', 'normalize_ys', 'normalize_xs',
+                'lazy_logits', 'stacked_ensemble', 'bootstraps',
+                'hidden_size', 'num_layers', 'initial_max_std',
+                'initial_min_std', 'ensemble_lr', 'ensemble_batch_size',
+                'ensemble_epochs', 'val_size')})
+        with logger.span('ensemble'):
+            cache.launch(key, ensemble, train_data, val_data,
+                         logger, config['ensemble_epochs'])
+
+    else:
+
+        # train the model for an additional number of epochs
+        with logger.span('ensemble'):
+            ensemble.launch(train_data,
+                            val_data,
+                            logger,
+                            config['ensemble_epochs'])
 
     # select the top 1 initial designs from the dataset
     indices = tf.math.top_k(y[:, 0], k=config['bo_gp_samples'])[1]
     initial_x = tf.gather(x, indices, axis=0)
+    if task.is_lazy_logits:
+        initial_x = task.lazy_to_logits(initial_x)
     initial_y = tf.gather(y, indices, axis=0)
 
-    from botorch.models import FixedNoiseGP, ModelListGP
-    from gpytorch.mlls.sum_marginal_log_likelihood import SumMarginalLogLikelihood
+    from botorch.models import ModelListGP
     from botorch.acquisition.objective import GenericMCObjective
-    from botorch.optim import optimize_acqf
     from botorch import fit_gpytorch_model
-    from botorch.acquisition.monte_carlo import qExpectedImprovement
-    from botorch.sampling.samplers import SobolQMCNormalSampler
     from botorch.exceptions import BadInitialCandidatesWarning
 
+    from design_baselines.bo_qei.bridge import BatchedObjective
+    from design_baselines.bo_qei.bridge import tf_to_torch
+    from design_baselines.bo_qei.bridge import torch_to_tf
+    from design_baselines.bo_qei.gp import initialize_model
+    from design_baselines.bo_qei.gp import optimize_qei
     import torch
     import time
     import warnings
@@ -118,48 +223,39 @@ def bo_qei(config):
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     dtype = torch.float32
 
-    def objective(input_x):
-        original_x = input_x
-        # convert the tensor into numpy before using a TF model
-        if torch.cuda.is_available():
-            input_x = input_x.detach().cpu().numpy()
-        else:
-            input_x = input_x.detach().numpy()
-        batch_shape = input_x.shape[:-1]
-        # pass the input into a TF model
-        input_x = tf.reshape(input_x, [-1, *input_shape])
-
-        # optimize teh ground truth or the learned model
+    # score a batch of designs using the ground truth or the learned model
+    def predict(input_x):
         if config["optimize_ground_truth"]:
             if task.is_discrete and config["use_vae"]:
                 input_x = tf.argmax(vae_model.decoder_cnn.predict(
                     input_x * standard_dev + mean),
                     axis=2, output_type=tf.int32)
-            value = task.predict(input_x)
-        else:
-            value = ensemble.get_distribution(input_x).mean()
+            return task.predict(input_x)
+        return ensemble_mean(input_x)
 
-        ys = value.numpy()
+    @tf.function(experimental_relax_shapes=True)
+    def ensemble_mean(input_x):
+        return ensemble.get_distribution(input_x).mean()
 
-        ys.reshape(list(batch_shape) + [1])
-        # convert the scores back to pytorch tensors
-        return torch.tensor(ys).type_as(
-            original_x).to(device, dtype=dtype)
+    # share tensors between pytorch and tensorflow without copies
+    objective = BatchedObjective(
+        predict, input_shape, config['bo_batch_size'],
+        pad_batches=not config["optimize_ground_truth"])
 
     NOISE_SE = config['bo_noise_se']
     train_yvar = torch.tensor(NOISE_SE ** 2, device=device, dtype=dtype)
 
-    def initialize_model(train_x, train_obj, state_dict=None):
-        # define models for objective
-        model_obj = FixedNoiseGP(train_x, train_obj,
-                                 train_yvar.expand_as(train_obj)).to(train_x)
-        # combine into a multi-output GP model
-        model = ModelListGP(model_obj)
-        mll = SumMarginalLogLikelihood(model.likelihood, model)
-        # load state dict if it is passed
-        if state_dict is not None:
-            model.load_state_dict(state_dict)
-        return mll, model
+    # select the surrogate model and how often it is fit again
+    gp_mode = config.get('bo_gp_mode', 'exact')
+    refit_interval = config.get('bo_gp_refit_interval', 1) \
+        if gp_mode == 'incremental' else 1
+    num_inducing_points = min(config.get(
+        'bo_gp_inducing_points', 256), config['bo_gp_samples'])
+
+    # limit the optimizer iterations when fitting the hyper parameters
+    fit_kwargs = dict()
+    if config.get('bo_gp_fit_maxiter', None) is not None:
+        fit_kwargs['options'] = {"maxiter": config['bo_gp_fit_maxiter']}
 
     def obj_callable(Z):
         return Z[..., 0]
@@ -168,28 +264,38 @@ def bo_qei(config):
     obj = GenericMCObjective(obj_callable)
 
     BATCH_SIZE = config['bo_batch_size']
-    bounds = torch.tensor(
-        [np.min(x, axis=0).reshape([input_size]).tolist(),
-         np.max(x, axis=0).reshape([input_size]).tolist()],
+    if task.is_lazy_logits:
+
+        # find the bounds of the logits one chunk at a time
+        x_min, x_max = np.inf, -np.inf
+        for i in range(0, x.shape[0], 4096):
+            chunk = task.lazy_to_logits(x[i:i + 4096]).numpy()
+            x_min = np.minimum(x_min, np.min(chunk, axis=0))
+            x_max = np.maximum(x_max, np.max(chunk, axis=0))
+    else:
+        x_min, x_max = np.min(x, axis=0), np.max(x, axis=0)
+
+    bounds = tf_to_torch(tf.stack([
+        tf.reshape(tf.cast(x_min, tf.float32), [input_size]),
+        tf.reshape(tf.cast(x_max, tf.float32), [input_size])], axis=0),
         device=device, dtype=dtype)
 
-    def optimize_acqf_and_get_observation(acq_func):
+    def optimize_acqf_and_get_observation(model, best_f):
         """Optimizes the acquisition function, and returns
         a new candidate and a noisy observation."""
         # optimize
         try:
-            candidates, _ = optimize_acqf(
-                acq_function=acq_func,
-                bounds=bounds,
-                q=BATCH_SIZE,
+            candidates = optimize_qei(
+                model, best_f, bounds, BATCH_SIZE,
+                mc_samples=MC_SAMPLES,
                 num_restarts=config['bo_num_restarts'],
                 raw_samples=config['bo_raw_samples'],  # used for intialization heuristic
-                options={"batch_limit": config['bo_batch_limit'],
-                         "maxiter": config['bo_maxiter']})
+                batch_limit=config['bo_batch_limit'],
+                maxiter=config['bo_maxiter'])
         except RuntimeError:
             return
         # observe new values
-        new_x = candidates.detach()
+        new_x = candidates
         exact_obj = objective(candidates)
         new_obj = exact_obj + NOISE_SE * torch.randn_like(exact_obj)
         return new_x, new_obj
@@ -200,14 +306,18 @@ def bo_qei(config):
     best_observed_ei = []
 
     # call helper functions to generate initial training data and initialize model
-    train_x_ei = initial_x.numpy().reshape([initial_x.shape[0], input_size])
-    train_x_ei = torch.tensor(train_x_ei).to(device, dtype=dtype)
+    train_x_ei = tf_to_torch(tf.reshape(
+        initial_x, [initial_x.shape[0], input_size]),
+        device=device, dtype=dtype)
 
-    train_obj_ei = initial_y.numpy().reshape([initial_y.shape[0], 1])
-    train_obj_ei = torch.tensor(train_obj_ei).to(device, dtype=dtype)
+    train_obj_ei = tf_to_torch(tf.reshape(
+        initial_y, [initial_y.shape[0], 1]),
+        device=device, dtype=dtype)
 
     best_observed_value_ei = train_obj_ei.max().item()
-    mll_ei, model_ei = initialize_model(train_x_ei, train_obj_ei)
+    mll_ei, model_ei = initialize_model(
+        train_x_ei, train_obj_ei, train_yvar, gp_mode=gp_mode,
+        num_inducing_points=num_inducing_points)
     best_observed_ei.append(best_observed_value_ei)
 
     # run N_BATCH rounds of BayesOpt after the initial random batch
@@ -215,19 +325,16 @@ def bo_qei(config):
 
         t0 = time.time()
 
-        # fit the models
-        fit_gpytorch_model(mll_ei)
-
-        # define the qEI acquisition module using a QMC sampler
-        qmc_sampler = SobolQMCNormalSampler(num_samples=MC_SAMPLES)
+        # fit the models, which are warm started from the last fit
+        if (iteration - 1) % refit_interval == 0:
+            with logger.span('gp_fit'):
+                fit_gpytorch_model(mll_ei, **fit_kwargs)
 
-        # for best_f, we use the best observed noisy values as an approximation
-        qEI = qExpectedImprovement(
-            model=model_ei, best_f=train_obj_ei.max(),
-            sampler=qmc_sampler, objective=obj)
-
-        # optimize and get new observation
-        result = optimize_acqf_and_get_observation(qEI)
+        # optimize and get new observation, where for best_f, we use
+        # the best observed noisy values as an approximation
+        with logger.span('acquisition'):
+            result = optimize_acqf_and_get_observation(
+                model_ei, train_obj_ei.max())
         if result is None:
             print("RuntimeError was encountered, most likely a "
                   "'symeig_cpu: the algorithm failed to converge'")
@@ -242,23 +349,30 @@ def bo_qei(config):
         best_value_ei = obj(train_x_ei).max().item()
         best_observed_ei.append(best_value_ei)
 
-        # reinitialize the models so they are ready for fitting on next iteration
-        # use the current state dict to speed up fitting
-        mll_ei, model_ei = initialize_model(
-            train_x_ei, train_obj_ei, model_ei.state_dict())
+        if iteration % refit_interval != 0:
+
+            # add the new observations with a low rank update of the
+            # cached kernel factorization, keeping the hyper parameters
+            model_ei.posterior(new_x_ei)
+            model_ei = ModelListGP(model_ei.models[0].condition_on_observations(
+                new_x_ei, new_obj_ei, noise=train_yvar.expand_as(new_obj_ei)))
+
+        else:
+
+            # reinitialize the models so they are ready for fitting on next iteration
+            # use the current state dict to speed up fitting
+            mll_ei, model_ei = initialize_model(
+                train_x_ei, train_obj_ei, train_yvar, gp_mode=gp_mode,
+                num_inducing_points=num_inducing_points,
+                state_dict=model_ei.state_dict())
 
         t1 = time.time()
         print(f"Batch {iteration:>2}: best_value = "
               f"({best_value_ei:>4.2f}), "
               f"time = {t1 - t0:>4.2f}.", end="")
 
-    if torch.cuda.is_available():
-        x_sol = train_x_ei.detach().cpu().numpy()
-        y_sol = train_obj_ei.detach().cpu().numpy()
-
-    else:
-        x_sol = train_x_ei.detach().numpy()
-        y_sol = train_obj_ei.detach().numpy()
+    x_sol = torch_to_tf(train_x_ei)
+    y_sol = torch_to_tf(train_obj_ei)
 
     # select the top 1 initial designs from the dataset
     indices = tf.math.top_k(y_sol[:, 0], k=config['solver_samples'])[1]
@@ -276,7 +390,12 @@ def bo_qei(config):
     if config["do_evaluation"]:
 
         # evaluate the found solution and record a video
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
         if task.is_normalized_y:
             score = task.denormalize_y(score)
         logger.record("score", score, N_BATCH, percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
@@ -0,0 +1,136 @@
+import tensorflow as tf
+import numpy as np
+import torch
+import torch.utils.dlpack
+
+
+# the errors raised when a device or dtype cannot be shared using DLPack,
+# where tensorflow raises InvalidArgumentError and pytorch a RuntimeError
+DLPACK_ERRORS = (tf.errors.InvalidArgumentError,
+                 tf.errors.UnimplementedError, RuntimeError)
+
+
+def torch_to_tf(tensor):
+    """Share the memory of a pytorch tensor with a tensorflow tensor
+    using DLPack, which avoids copying the tensor between frameworks
+
+    Args:
+
+    tensor: torch.Tensor
+        a pytorch tensor that will be detached from the autograd graph
+
+    Returns:
+
+    tensor: tf.Tensor
+        a tensorflow tensor that shares memory with the pytorch tensor
+    """
+
+    tensor = tensor.detach().contiguous()
+    try:
+        return tf.experimental.dlpack.from_dlpack(
+            torch.utils.dlpack.to_dlpack(tensor))
+    except DLPACK_ERRORS:
+
+        # tensorflow may not see the device that pytorch is using
+        return tf.convert_to_tensor(tensor.cpu().numpy())
+
+
+def tf_to_torch(tensor,
+                device=None,
+                dtype=None):
+    """Share the memory of a tensorflow tensor with a pytorch tensor
+    using DLPack, which avoids copying the tensor between frameworks
+
+    Args:
+
+    tensor: tf.Tensor
+        a tensorflow tensor or an array that will be converted
+    device: torch.device
+        the device to place the result on, which only copies the tensor
+        when it is not already on this device
+    dtype: torch.dtype
+        the dtype of the result, which only copies the tensor when it
+        does not already have this dtype
+
+    Returns:
+
+    tensor: torch.Tensor
+        a pytorch tensor that shares memory with the tensorflow tensor
+    """
+
+    tensor = tf.convert_to_tensor(tensor)
+    try:
+        tensor = torch.utils.dlpack.from_dlpack(
+            tf.experimental.dlpack.to_dlpack(tensor))
+    except DLPACK_ERRORS:
+
+        # numpy arrays on the cpu are shared with pytorch without copies
+        tensor = torch.from_numpy(np.asarray(tensor.numpy()))
+    return tensor.to(device=device, dtype=dtype)
+
+
+class BatchedObjective(object):
+
+    def __init__(self,
+                 fn,
+                 input_shape,
+                 batch_size,
+                 pad_batches=True):
+        """Expose a tensorflow model as a callable on pytorch tensors that
+        evaluates every design in fixed size batches, where the last batch
+        is padded so that a traced model is not traced again
+
+        Args:
+
+        fn: callable
+            a function that maps a tf.Tensor of designs shaped like
+            [batch_size, *input_shape] to scores shaped like [batch_size, 1]
+        input_shape: list
+            the shape of a single design expected by the model
+        batch_size: int
+            the number of designs passed to the model at once
+        pad_batches: bool
+            whether to pad the last batch with zeros, which should be
+            disabled when the model is not traced such as an oracle
+        """
+
+        self.fn = fn
+        self.input_shape = [int(d) for d in input_shape]
+        self.batch_size = int(batch_size)
+        self.pad_batches = pad_batches
+
+    def __call__(self,
+                 input_x):
+        """Score a batch of designs represented by a pytorch tensor with
+        any number of batch dimensions
+
+        Args:
+
+        input_x: torch.Tensor
+            a tensor of designs shaped like [..., prod(input_shape)]
+
+        Returns:
+
+        value: torch.Tensor
+            a tensor of scores shaped like [..., 1] with the same dtype
+            and device as the designs
+        """
+
+        batch_shape = list(input_x.shape[:-1])
+        x = tf.reshape(torch_to_tf(input_x), [-1, *self.input_shape])
+        size = int(x.shape[0])
+
+        values = []
+        for i in range(0, size, self.batch_size):
+            xi = x[i:i + self.batch_size]
+            pad = self.batch_size - int(xi.shape[0])
+            if self.pad_batches and pad > 0:
+                xi = tf.concat([xi, tf.zeros(
+                    [pad, *self.input_shape], dtype=xi.dtype)], 0)
+            values.append(tf.reshape(self.fn(xi), [int(xi.shape[0]), -1]))
+
+        # remove the padding and restore the batch dimensions
+        value = tf.concat(values, 0)[:size]
+        value = tf.reshape(value, [*batch_shape, 1])
+        return tf_to_torch(value, device=input_x.device,
+                           dtype=input_x.dtype)
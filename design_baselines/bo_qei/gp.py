@@ -0,0 +1,183 @@
+from botorch.models.gpytorch import GPyTorchModel
+from botorch.models import FixedNoiseGP, ModelListGP
+from botorch.acquisition.objective import GenericMCObjective
+from botorch.acquisition.monte_carlo import qExpectedImprovement
+from botorch.sampling.samplers import SobolQMCNormalSampler
+from botorch.optim import optimize_acqf
+from gpytorch.mlls.sum_marginal_log_likelihood import SumMarginalLogLikelihood
+from gpytorch.models import ExactGP
+from gpytorch.means import ConstantMean
+from gpytorch.kernels import InducingPointKernel
+from gpytorch.kernels import MaternKernel
+from gpytorch.kernels import ScaleKernel
+from gpytorch.likelihoods import FixedNoiseGaussianLikelihood
+from gpytorch.distributions import MultivariateNormal
+import torch
+
+
+class InducingPointGP(ExactGP, GPyTorchModel):
+
+    _num_outputs = 1
+
+    def __init__(self,
+                 train_x,
+                 train_obj,
+                 train_yvar,
+                 num_inducing_points=256):
+        """Build a sparse gaussian process whose kernel is approximated
+        using a set of learned inducing points, so that fitting the model
+        scales linearly in the number of observations
+
+        Args:
+
+        train_x: torch.Tensor
+            the observed designs shaped like [num_samples, input_size]
+        train_obj: torch.Tensor
+            the observed scores shaped like [num_samples, 1]
+        train_yvar: torch.Tensor
+            the variance of the observation noise shaped like [num_samples, 1]
+        num_inducing_points: int
+            the number of inducing points, which are initialized to a random
+            subset of the observed designs
+        """
+
+        likelihood = FixedNoiseGaussianLikelihood(
+            noise=train_yvar.squeeze(-1))
+        super(InducingPointGP, self).__init__(
+            train_x, train_obj.squeeze(-1), likelihood)
+
+        # initialize the inducing points to a random subset of the designs
+        indices = torch.randperm(train_x.shape[0], device=train_x.device)
+        inducing_points = train_x[indices[:num_inducing_points]].clone()
+
+        self.mean_module = ConstantMean()
+        self.covar_module = InducingPointKernel(
+            ScaleKernel(MaternKernel(
+                nu=2.5, ard_num_dims=train_x.shape[-1])),
+            inducing_points=inducing_points, likelihood=likelihood)
+        self.to(train_x)
+
+    def forward(self,
+                x):
+        """Compute the prior distribution of the latent function at a
+        batch of designs
+
+        Args:
+
+        x: torch.Tensor
+            a batch of designs shaped like [..., num_samples, input_size]
+
+        Returns:
+
+        distribution: MultivariateNormal
+            the prior distribution over the latent function values
+        """
+
+        return MultivariateNormal(self.mean_module(x), self.covar_module(x))
+
+
+def initialize_model(train_x,
+                     train_obj,
+                     train_yvar,
+                     gp_mode='exact',
+                     num_inducing_points=256,
+                     state_dict=None):
+    """Build the gaussian process surrogate used by BO-qEI and the
+    marginal log likelihood that is maximized to fit it
+
+    Args:
+
+    train_x: torch.Tensor
+        the observed designs shaped like [num_samples, input_size]
+    train_obj: torch.Tensor
+        the observed scores shaped like [num_samples, 1]
+    train_yvar: torch.Tensor
+        the scalar variance of the observation noise
+    gp_mode: str
+        'sparse' for an InducingPointGP, otherwise an exact FixedNoiseGP
+    num_inducing_points: int
+        the number of inducing points when gp_mode is 'sparse'
+    state_dict: dict
+        the parameters of an earlier model used to warm start fitting
+
+    Returns:
+
+    mll: SumMarginalLogLikelihood
+        the marginal log likelihood of the surrogate model
+    model: ModelListGP
+        the surrogate model wrapped in a multi-output model
+    """
+
+    # define models for objective
+    if gp_mode == 'sparse':
+        model_obj = InducingPointGP(
+            train_x, train_obj, train_yvar.expand_as(train_obj),
+            num_inducing_points=num_inducing_points)
+    else:
+        model_obj = FixedNoiseGP(
+            train_x, train_obj,
+            train_yvar.expand_as(train_obj)).to(train_x)
+
+    # combine into a multi-output GP model
+    model = ModelListGP(model_obj)
+    mll = SumMarginalLogLikelihood(model.likelihood, model)
+
+    # load state dict if it is passed
+    if state_dict is not None:
+        model.load_state_dict(state_dict)
+    return mll, model
+
+
+def optimize_qei(model,
+                 best_f,
+                 bounds,
+                 q,
+                 mc_samples=128,
+                 num_restarts=10,
+                 raw_samples=512,
+                 batch_limit=5,
+                 maxiter=200):
+    """Optimize the batch expected improvement of a surrogate model and
+    return the next batch of designs to observe
+
+    Args:
+
+    model: ModelListGP
+        the fitted surrogate model returned by initialize_model
+    best_f: torch.Tensor
+        the best observed score used as the improvement threshold
+    bounds: torch.Tensor
+        the lower and upper bounds of the designs shaped like [2, input_size]
+    q: int
+        the number of designs proposed together
+    mc_samples: int
+        the number of quasi monte carlo samples that estimate qEI
+    num_restarts: int
+        the number of starting points optimized with gradients
+    raw_samples: int
+        the number of random designs used to select starting points
+    batch_limit: int
+        the number of starting points optimized at once
+    maxiter: int
+        the maximum number of optimizer iterations
+
+    Returns:
+
+    candidates: torch.Tensor
+        the proposed designs shaped like [q, input_size]
+    """
+
+    # score the first output of the multi-output model
+    objective = GenericMCObjective(lambda Z: Z[..., 0])
+
+    # define the qEI acquisition module using a QMC sampler
+    qEI = qExpectedImprovement(
+        model=model, best_f=best_f,
+        sampler=SobolQMCNormalSampler(num_samples=mc_samples),
+        objective=objective)
+
+    candidates, _ = optimize_acqf(
+        acq_function=qEI, bounds=bounds, q=q,
+        num_restarts=num_restarts, raw_samples=raw_samples,
+        options={"batch_limit": batch_limit, "maxiter": maxiter})
+    return candidates.detach()
@@ -0,0 +1,254 @@
+from design_baselines.utils import get_cache_dir
+import tensorflow as tf
+import numpy as np
+import hashlib
+import shutil
+import os
+
+
+class ModelCache(object):
+
+    def __init__(self,
+                 cache_dir=None):
+        """Build a persistent cache of trained models, where the saveables
+        of a trainer are written to a checkpoint after training and are
+        restored instead of training again when the same model is needed
+
+        Args:
+
+        cache_dir: str
+            the directory where every checkpoint is saved, defaults to a
+            directory in the design baselines cache
+        """
+
+        self.cache_dir = cache_dir if cache_dir is not None \
+            else get_cache_dir('models')
+        tf.io.gfile.makedirs(self.cache_dir)
+
+    def get_key(self,
+                seed,
+                **kwargs):
+        """Returns the key of a trained model, which must depend on every
+        argument that changes the model, such as the task, the model and
+        training hyper parameters, and the random seed
+
+        Args:
+
+        seed: int
+            the seed passed to set_seed before the model was trained,
+            which cannot be None since an unseeded model is not
+            determined by its arguments
+        kwargs: dict
+            the arguments that determine the trained model, which must
+            have a deterministic representation
+
+        Returns:
+
+        key: str
+            the hash of the arguments that determine the trained model
+        """
+
+        if seed is None:
+            raise ValueError("a model can only be cached with a seed")
+        return hashlib.sha1(repr(sorted(dict(
+            kwargs, seed=seed).items())).encode('utf-8')).hexdigest()
+
+    def get_path(self,
+                 key):
+        """Returns the directory where the checkpoint of a trained model
+        is saved on the disk
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the trained model
+
+        Returns:
+
+        path: str
+            the path to a checkpoint directory in the cache directory
+        """
+
+        return os.path.join(self.cache_dir, key)
+
+    def launch(self,
+               key,
+               trainer,
+               *args,
+               **kwargs):
+        """Restore the saveables of a trainer from the cache if the model
+        was trained before, and otherwise launch training and save them
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the trained model
+        trainer: tf.Module
+            a trainer that defines launch and get_saveables
+        args: list
+            the positional arguments passed to trainer.launch
+        kwargs: dict
+            the keyword arguments passed to trainer.launch
+
+        Returns:
+
+        hit: bool
+            whether the trainer was restored from the cache
+        """
+
+        path = self.get_path(key)
+        checkpoint = tf.train.Checkpoint(**trainer.get_saveables())
+        if tf.io.gfile.exists(os.path.join(path, 'model.index')):
+
+            # variables that are not yet built are restored once created
+            checkpoint.read(os.path.join(path, 'model')).expect_partial()
+            return True
+
+        trainer.launch(*args, **kwargs)
+
+        # write to a temporary directory so readers never see partial files
+        temp = f"{path}.{os.getpid()}.tmp"
+        checkpoint.write(os.path.join(temp, 'model'))
+        try:
+            os.rename(temp, path)
+        except OSError:
+
+            # another experiment saved the model first so load its copy
+            shutil.rmtree(temp)
+            checkpoint.read(os.path.join(path, 'model')).expect_partial()
+        return False
+
+
+class VAECache(ModelCache):
+
+    def __init__(self,
+                 cache_dir=None):
+        """Build a persistent store of trained sequence VAEs that is shared
+        by every latent space baseline, holding the weights of every VAE
+        together with the encoded dataset and its normalization statistics
+
+        Args:
+
+        cache_dir: str
+            the directory where every VAE is saved, defaults to a
+            directory in the design baselines cache
+        """
+
+        super(VAECache, self).__init__(
+            cache_dir=cache_dir if cache_dir is not None
+            else get_cache_dir('vaes'))
+
+    def load_latents(self,
+                     key):
+        """Load the dataset encoded by a trained VAE and the statistics
+        used to normalize it
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the trained VAE
+
+        Returns:
+
+        latents: dict
+            a dictionary containing the arrays 'x', 'mean', 'standard_dev',
+            and 'x_hash', or None when the dataset was not encoded
+        """
+
+        path = os.path.join(self.get_path(key), 'latents.npz')
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return dict(data)
+
+    def save_latents(self,
+                     key,
+                     x,
+                     mean,
+                     standard_dev,
+                     x_hash):
+        """Save the dataset encoded by a trained VAE and the statistics
+        used to normalize it next to the weights of the VAE
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the trained VAE
+        x: np.ndarray
+            the normalized latent dataset shaped like [num_samples, ...]
+        mean: np.ndarray
+            the mean of the latent dataset shaped like [1, ...]
+        standard_dev: np.ndarray
+            the standard deviation of the latent dataset shaped like [1, ...]
+        x_hash: str
+            the hash of the designs that were encoded, returned by get_hash
+        """
+
+        # write to a temporary file so readers never see partial files
+        path = os.path.join(self.get_path(key), 'latents.npz')
+        temp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp, x=x, mean=mean,
+                 standard_dev=standard_dev, x_hash=x_hash)
+        os.replace(temp, path)
+
+    def get_hash(self,
+                 x):
+        """Returns the hash of the raw bytes of a dataset of designs, which
+        identifies the designs and their order when latents are loaded
+
+        Args:
+
+        x: np.ndarray
+            the designs in the dataset shaped like [num_samples, length]
+
+        Returns:
+
+        x_hash: str
+            the hash of the shape, type, and bytes of the designs
+        """
+
+        x = np.ascontiguousarray(x)
+        x_hash = hashlib.sha1(repr((x.shape, x.dtype.str)).encode('utf-8'))
+        x_hash.update(x.data)
+        return x_hash.hexdigest()
+
+    def encode(self,
+               key,
+               vae_model,
+               x):
+        """Encode a dataset into the latent space of a trained VAE and
+        normalize it, loading the result when the same designs were
+        encoded before, so latents always align with the given designs
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the trained VAE
+        vae_model: SequentialVAE
+            the trained VAE whose encoder maps designs to latent variables
+        x: np.ndarray
+            the designs in the dataset shaped like [num_samples, length]
+
+        Returns:
+
+        x: np.ndarray
+            the normalized latent dataset shaped like [num_samples, ...]
+        mean: np.ndarray
+            the mean of the latent dataset shaped like [1, ...]
+        standard_dev: np.ndarray
+            the standard deviation of the latent dataset shaped like [1, ...]
+        """
+
+        x_hash = self.get_hash(x)
+        latents = self.load_latents(key)
+        if latents is not None and str(latents.get('x_hash')) == x_hash:
+            return latents['x'], latents['mean'], latents['standard_dev']
+
+        # map the x values to latent space
+        x = vae_model.encoder_cnn.predict(x)[0]
+
+        mean = np.mean(x, axis=0, keepdims=True)
+        standard_dev = np.std(x - mean, axis=0, keepdims=True)
+        x = (x - mean) / standard_dev
+        self.save_latents(key, x, mean, standard_dev, x_hash)
+        return x, mean, standard_dev
@@ -786,34 +786,106 @@ def make_table_from_solutions(dir, distribution, percentile, load):
     plt.savefig(f"k-heatmap-{percentile}.png")
 
 
+@cli.command()
+@click.option('--stage', type=str, multiple=True)
+@click.option('--steps', type=int, default=50)
+@click.option('--warmup', type=int, default=2)
+@click.option('--batch-size', type=int, default=128)
+@click.option('--hidden-size', type=int, default=256)
+@click.option('--input-size', type=int, default=64)
+@click.option('--dataset-size', type=int, default=4096)
+@click.option('--seed', type=int, default=0)
+@click.option('--output', type=str, default="bench.json")
+@click.option('--baseline', type=str, default=None)
+@click.option('--cpu/--no-cpu', is_flag=True, default=True)
+@click.option('--jit-compile/--no-jit-compile', is_flag=True, default=False)
+@click.option('--compare-jit/--no-compare-jit', is_flag=True, default=False)
+@click.option('--isolate-stages/--no-isolate-stages',
+              is_flag=True, default=True)
+def bench(stage, steps, warmup, batch_size, hidden_size, input_size,
+          dataset_size, seed, output, baseline, cpu, jit_compile,
+          compare_jit, isolate_stages):
+    """Benchmark the training steps and solvers of every baseline on random
+    inputs of a fixed size, and save the throughput to a json file, which
+    can compare the throughput with and without compiling them with XLA
+    """
+
+    import os
+    import json
+    if cpu:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    from design_baselines.bench import run_benchmarks
+    from design_baselines.bench import compare_reports
+    from design_baselines.bench import compare_jit_compile
+    from design_baselines.bench import save_report
+
+    kwargs = dict(
+        stages=list(stage), steps=steps, warmup=warmup,
+        batch_size=batch_size, hidden_size=hidden_size,
+        input_size=input_size, dataset_size=dataset_size, seed=seed,
+        isolate_stages=isolate_stages)
+
+    if compare_jit:
+
+        # print the speedup of every stage when compiled with xla
+        report = compare_jit_compile(**kwargs)
+        save_report(report, output)
+        for name, speedup in report["speedups"].items():
+            print(f"{name} (xla): {speedup:.3f}x")
+        return
+
+    report = run_benchmarks(jit_compile=jit_compile, **kwargs)
+    save_report(report, output)
+
+    if baseline is not None:
+
+        # print the speedup of every stage relative to an earlier report
+        with open(baseline, "r") as f:
+            speedups = compare_reports(report, json.load(f))
+        for name, speedup in speedups.items():
+            print(f"{name}: {speedup:.3f}x")
+
+
+@cli.command()
+@click.option('--task', type=str, multiple=True)
+@click.option('--index-path', type=str, default=None)
+@click.option('--overwrite/--no-overwrite', is_flag=True, default=False)
+def index_tasks(task, index_path, overwrite):
+    """Compute the statistics of every task used by the reporting commands
+    once, and save them to an index that is read instead of the datasets
+    """
+
+    import json
+    from design_baselines.index import TASK_SPECS
+    from design_baselines.index import get_index_path
+    from design_baselines.index import index_tasks as index_tasks_fn
+
+    tasks = list(task) if len(task) > 0 else list(TASK_SPECS.keys())
+    index = index_tasks_fn(tasks, path=index_path, overwrite=overwrite)
+    print(json.dumps({t: index[t] for t in tasks}, indent=4))
+    print("Saved index to", get_index_path(index_path))
+
+
 @cli.command()
 @click.option('--dir', type=str)
 @click.option('--percentile', type=str, default="100th")
 @click.option('--modifier', type=str, default="")
 @click.option('--group', type=str, default="")
 @click.option('--normalize/--no-normalize', is_flag=True, default=True)
-def make_table(dir, percentile, modifier, group, normalize):
+@click.option('--workers', type=int, default=None)
+@click.option('--index-path', type=str, default=None)
+def make_table(dir, percentile, modifier, group, normalize, workers,
+               index_path):
 
     import glob
     import os
-    import tensorflow as tf
     import tqdm
     import numpy as np
     import pandas as pd
 
-    from design_bench.datasets.discrete.tf_bind_8_dataset import TFBind8Dataset
-    from design_bench.datasets.discrete.tf_bind_10_dataset import TFBind10Dataset
-    from design_bench.datasets.discrete.chembl_dataset import ChEMBLDataset
-    from design_bench.datasets.discrete.cifar_nas_dataset import CIFARNASDataset
-    from design_bench.datasets.discrete.utr_dataset import UTRDataset
-    from design_bench.datasets.discrete.gfp_dataset import GFPDataset
-
-    from design_bench.datasets.continuous.superconductor_dataset import SuperconductorDataset
-    from design_bench.datasets.continuous.ant_morphology_dataset import AntMorphologyDataset
-    from design_bench.datasets.continuous.dkitty_morphology_dataset import DKittyMorphologyDataset
-    from design_bench.datasets.continuous.hopper_controller_dataset import HopperControllerDataset
-
-    import design_bench as db
+    from design_baselines.events import load_scalars
+    from design_baselines.index import TASK_SPECS, get_task_statistics
 
     tasks = [
         "tf-bind-8",
@@ -838,63 +910,14 @@ def make_table(dir, percentile, modifier, group, normalize):
         "dkitty",
     ]
 
-    tf_bind_8_dataset = TFBind8Dataset()
-    tf_bind_10_dataset = TFBind10Dataset()
-    chembl_dataset = ChEMBLDataset(assay_chembl_id="CHEMBL3885882", standard_type="MCHC")
-    cifar_nas_dataset = CIFARNASDataset()
-
-    superconductor_dataset = SuperconductorDataset()
-    ant_dataset = AntMorphologyDataset()
-    dkitty_dataset = DKittyMorphologyDataset()
-
-    utr_dataset = UTRDataset()
-    gfp_dataset = GFPDataset()
-    hopper_controller_dataset = HopperControllerDataset()
-
-    task_to_min = {
-        "tf-bind-8": tf_bind_8_dataset.y.min(),
-        "tf-bind-10": tf_bind_10_dataset.y.min(),
-        "chembl": chembl_dataset.y.min(),
-        "cifar-nas": cifar_nas_dataset.y.min(),
-        "superconductor": superconductor_dataset.y.min(),
-        "ant": ant_dataset.y.min(),
-        "dkitty": dkitty_dataset.y.min(),
-        "utr": utr_dataset.y.min(),
-        "gfp": gfp_dataset.y.min(),
-        "hopper": hopper_controller_dataset.y.min(),
-    }
-
-    task_to_max = {
-        "tf-bind-8": tf_bind_8_dataset.y.max(),
-        "tf-bind-10": tf_bind_10_dataset.y.max(),
-        "chembl": chembl_dataset.y.max(),
-        "cifar-nas": cifar_nas_dataset.y.max(),
-        "superconductor": superconductor_dataset.y.max(),
-        "ant": ant_dataset.y.max(),
-        "dkitty": dkitty_dataset.y.max(),
-        "utr": utr_dataset.y.max(),
-        "gfp": gfp_dataset.y.max(),
-        "hopper": hopper_controller_dataset.y.max(),
-    }
-
-    task_to_best = {
-        "tf-bind-8": db.make("TFBind8-Exact-v0").y.max(),
-        "tf-bind-10": db.make("TFBind10-Exact-v0", dataset_kwargs=dict(max_samples=10000)).y.max(),
-        "chembl": db.make("ChEMBL_MCHC_CHEMBL3885882_MorganFingerprint-RandomForest-v0").y.max(),
-        "cifar-nas": db.make("CIFARNAS-Exact-v0").y.max(),
-        "superconductor": db.make("Superconductor-RandomForest-v0").y.max(),
-        "ant": db.make("AntMorphology-Exact-v0").y.max(),
-        "dkitty": db.make("DKittyMorphology-Exact-v0").y.max(),
-        "gfp": db.make("GFP-Transformer-v0").y.max(),
-        "utr": db.make("UTR-ResNet-v0", relabel=True).y.max(),
-        "hopper": db.make("HopperController-Exact-v0").y.max(),
-    }
+    # read normalization constants from the index instead of loading data
+    statistics = get_task_statistics(list(TASK_SPECS.keys()),
+                                     path=index_path)
+    task_to_min = {t: stats["min"] for t, stats in statistics.items()}
+    task_to_max = {t: stats["max"] for t, stats in statistics.items()}
+    task_to_best = {t: stats["normalized_best"]
+                    for t, stats in statistics.items()}
 
-    for task_name, task_best in task_to_best.items():
-        task_to_best[task_name] = (task_to_best[task_name] -
-                                   task_to_min[task_name]) / (
-                task_to_max[task_name] - task_to_min[task_name])
-        
     print("D(Best) = ", task_to_best)
 
     baselines = [
@@ -936,13 +959,9 @@ def make_table(dir, percentile, modifier, group, normalize):
         "coms": 50
     }
 
-    performance = dict()
+    event_files = dict()
     for task in tqdm.tqdm(tasks):
-        task_min = task_to_min[task]
-        task_max = task_to_max[task]
-        performance[task] = dict()
         for baseline in baselines:
-            performance[task][baseline] = list()
 
             if baseline == "coms":
 
@@ -958,22 +977,34 @@ def make_table(dir, percentile, modifier, group, normalize):
                 dirs = [d for d in glob.glob(
                     os.path.join(dir, dirs)) if os.path.isdir(d)]
 
-            for d in dirs:
-                event_files = (
+            event_files[(task, baseline)] = [
+                f for d in dirs for f in (
                     list(glob.glob(os.path.join(d, '*/events.out*'))) +
-                    list(glob.glob(os.path.join(d, 'events.out*')))
+                    list(glob.glob(os.path.join(d, 'events.out*'))))]
+
+    # decode every event file once using a pool of processes
+    scalars = load_scalars(
+        [f for files in event_files.values() for f in files],
+        tags={t for b in baselines for t in baseline_to_tag[b]},
+        steps=set(baseline_to_iteration.values()), workers=workers)
+
+    performance = dict()
+    for task in tasks:
+        task_min = task_to_min[task]
+        task_max = task_to_max[task]
+        performance[task] = dict()
+        for baseline in baselines:
+            performance[task][baseline] = list()
+
+            rows = scalars[
+                scalars['path'].isin(event_files[(task, baseline)]) &
+                scalars['tag'].isin(baseline_to_tag[baseline]) &
+                (scalars['step'] == baseline_to_iteration[baseline])]
+            for score in rows['value'].tolist():
+                performance[task][baseline].append(
+                    ((score - task_min) / (
+                        task_max - task_min)) if normalize else score
                 )
-                for f in event_files:
-                    for e in tf.compat.v1.train.summary_iterator(f):
-                        for v in e.summary.value:
-
-                            if v.tag in baseline_to_tag[baseline]\
-                                    and e.step == baseline_to_iteration[baseline]:
-                                score = tf.make_ndarray(v.tensor)
-                                performance[task][baseline].append(
-                                    ((score - task_min) / (
-                                        task_max - task_min)) if normalize else score
-                                )
 
     final_data = [[None for t in tasks] for b in baselines]
     final_data_mean = [[None for t in tasks] for b in baselines]
@@ -1044,16 +1075,17 @@ def make_table(dir, percentile, modifier, group, normalize):
 @click.option('--dir', type=str)
 @click.option('--percentile', type=str, default="100th")
 @click.option('--modifier', type=str, default="")
-def stochasticity_table(dir, percentile, modifier):
+@click.option('--workers', type=int, default=None)
+def stochasticity_table(dir, percentile, modifier, workers):
 
     import glob
     import os
-    import tensorflow as tf
     import tqdm
     import numpy as np
     import pandas as pd
     import itertools
     import scipy.stats as stats
+    from design_baselines.events import load_scalars
 
     tasks = [
         "gfp",
@@ -1108,23 +1140,32 @@ def stochasticity_table(dir, percentile, modifier):
         "reinforce": 200
     }
 
-    performance = dict()
+    event_files = dict()
     for task in tqdm.tqdm(tasks):
-        performance[task] = dict()
         for baseline in baselines:
-            performance[task][baseline] = list()
 
             dirs = [d for d in glob.glob(os.path.join(
                 dir, f"{baseline}{modifier}-{task}/*/*")) if os.path.isdir(d)]
 
-            for d in dirs:
-                for f in glob.glob(os.path.join(d, '*/events.out*')):
-                    for e in tf.compat.v1.train.summary_iterator(f):
-                        for v in e.summary.value:
-                            if v.tag == baseline_to_tag[baseline] \
-                                    and e.step == baseline_to_iteration[baseline]:
-                                performance[task][baseline].append(
-                                    tf.make_ndarray(v.tensor))
+            event_files[(task, baseline)] = [
+                f for d in dirs for f in glob.glob(
+                    os.path.join(d, '*/events.out*'))]
+
+    # decode every event file once using a pool of processes
+    scalars = load_scalars(
+        [f for files in event_files.values() for f in files],
+        tags=set(baseline_to_tag.values()),
+        steps=set(baseline_to_iteration.values()), workers=workers)
+
+    performance = dict()
+    for task in tasks:
+        performance[task] = dict()
+        for baseline in baselines:
+            rows = scalars[
+                scalars['path'].isin(event_files[(task, baseline)]) &
+                (scalars['tag'] == baseline_to_tag[baseline]) &
+                (scalars['step'] == baseline_to_iteration[baseline])]
+            performance[task][baseline] = rows['value'].tolist()
 
     final = [[list() for t in tasks] for m in metrics]
     table0_df = [[None for t in tasks] for b in baselines]
@@ -1202,9 +1243,9 @@ def plot_sample_size(dir,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
     import pickle as pkl
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -1274,18 +1315,17 @@ def plot_sample_size(dir,
                 sp_to_score[p["task_kwargs"]["split_percentile"]] = defaultdict(list)
 
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
-
-                            score = tf.make_ndarray(v.tensor).tolist()
-                            if p["task_kwargs"]["split_percentile"] == 20:
-                                data = data.append({
-                                    'Importance sampling iteration': e.step,
-                                    'Algorithm': name,
-                                    ylabel: score}, ignore_index=True)
-                            else:
-                                sp_to_score[p["task_kwargs"]["split_percentile"]][e.step].append(score)
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
+
+                        score = scalar
+                        if p["task_kwargs"]["split_percentile"] == 20:
+                            data = data.append({
+                                'Importance sampling iteration': step,
+                                'Algorithm': name,
+                                ylabel: score}, ignore_index=True)
+                        else:
+                            sp_to_score[p["task_kwargs"]["split_percentile"]][step].append(score)
 
         axis = task_to_axis[task]
 
@@ -1358,9 +1398,9 @@ def plot_two_sweeps(dir1,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
     import pickle as pkl
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -1448,18 +1488,17 @@ def plot_two_sweeps(dir1,
                 lr1_to_score[p["solver_lr"]] = defaultdict(list)
 
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
-
-                            score = tf.make_ndarray(v.tensor).tolist()
-                            if p["solver_lr"] == 0.01:
-                                data = data.append({
-                                    'Gradient ascent steps': e.step,
-                                    'Algorithm': name1,
-                                    ylabel: score}, ignore_index=True)
-                            else:
-                                lr1_to_score[p["solver_lr"]][e.step].append(score)
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
+
+                        score = scalar
+                        if p["solver_lr"] == 0.01:
+                            data = data.append({
+                                'Gradient ascent steps': step,
+                                'Algorithm': name1,
+                                ylabel: score}, ignore_index=True)
+                        else:
+                            lr1_to_score[p["solver_lr"]][step].append(score)
 
         lr2_to_score = dict()
         for d, p in tqdm.tqdm(zip(dir2, params2)):
@@ -1468,18 +1507,17 @@ def plot_two_sweeps(dir1,
                 lr2_to_score[p["solver_lr"]] = defaultdict(list)
 
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
-
-                            score = tf.make_ndarray(v.tensor).tolist()
-                            if p["solver_lr"] == 0.000001:
-                                data = data.append({
-                                    'Gradient ascent steps': e.step,
-                                    'Algorithm': name2,
-                                    ylabel: score}, ignore_index=True)
-                            else:
-                                lr2_to_score[p["solver_lr"]][e.step].append(score)
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
+
+                        score = scalar
+                        if p["solver_lr"] == 0.000001:
+                            data = data.append({
+                                'Gradient ascent steps': step,
+                                'Algorithm': name2,
+                                ylabel: score}, ignore_index=True)
+                        else:
+                            lr2_to_score[p["solver_lr"]][step].append(score)
 
         axis = task_to_axis[task]
 
@@ -1567,8 +1605,8 @@ def plot_two_exp(dir1,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -1617,27 +1655,25 @@ def plot_two_exp(dir1,
 
         for d in tqdm.tqdm(dir1):
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
 
-                            data = data.append({
-                                'Algorithm': name1,
-                                'Gradient ascent steps': e.step,
-                                ylabel: tf.make_ndarray(v.tensor).tolist(),
-                                }, ignore_index=True)
+                        data = data.append({
+                            'Algorithm': name1,
+                            'Gradient ascent steps': step,
+                            ylabel: scalar,
+                            }, ignore_index=True)
 
         for d in tqdm.tqdm(dir2):
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
 
-                            data = data.append({
-                                'Algorithm': name2,
-                                'Gradient ascent steps': e.step,
-                                ylabel: tf.make_ndarray(v.tensor).tolist(),
-                                }, ignore_index=True)
+                        data = data.append({
+                            'Algorithm': name2,
+                            'Gradient ascent steps': step,
+                            ylabel: scalar,
+                            }, ignore_index=True)
 
         axis = task_to_axis[task]
 
@@ -1707,8 +1743,8 @@ def compare_runs(hopper,
     import glob
     import os
     import pandas as pd
-    import tensorflow as tf
     import tqdm
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -1766,14 +1802,12 @@ def compare_runs(hopper,
         for name, task_to_dir_i in name_to_dir.items():
             for d in tqdm.tqdm(task_to_dir_i[task]):
                 for f in glob.glob(os.path.join(d, 'events.out*')):
-                    for e in tf.compat.v1.train.summary_iterator(f):
-                        for v in e.summary.value:
-                            if v.tag == tag and e.step < max_iterations:
-                                data = data.append({
-                                    'Algorithm': name,
-                                    'Gradient ascent steps': e.step,
-                                    ylabel: tf.make_ndarray(
-                                        v.tensor).tolist()}, ignore_index=True)
+                    for step, scalar_tag, scalar in iterate_scalars(f):
+                        if scalar_tag == tag and step < max_iterations:
+                            data = data.append({
+                                'Algorithm': name,
+                                'Gradient ascent steps': step,
+                                ylabel: scalar}, ignore_index=True)
 
         axis = task_to_axis[task]
 
@@ -1837,9 +1871,9 @@ def ablate_beta(hopper,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
     import json
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -1898,14 +1932,13 @@ def ablate_beta(hopper,
                 params = os.path.join(d, 'params.json')
                 with open(params, "r") as pf:
                     params = json.load(pf)
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
-                            data = data.append({
-                                'Beta': f'{params["solver_beta"]}',
-                                'Gradient ascent steps': e.step,
-                                ylabel: tf.make_ndarray(v.tensor).tolist(),
-                                }, ignore_index=True)
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
+                        data = data.append({
+                            'Beta': f'{params["solver_beta"]}',
+                            'Gradient ascent steps': step,
+                            ylabel: scalar,
+                            }, ignore_index=True)
 
         axis = task_to_axis[task]
 
@@ -1981,9 +2014,9 @@ def ablate_tau(hopper,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
     import json
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -2042,14 +2075,13 @@ def ablate_tau(hopper,
                 params = os.path.join(os.path.dirname(f), 'params.json')
                 with open(params, "r") as pf:
                     params = json.load(pf)
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
-                            data = data.append({
-                                'Tau': f'{params["forward_model_overestimation_limit"]}',
-                                'Gradient ascent steps': e.step,
-                                ylabel: tf.make_ndarray(v.tensor).tolist(),
-                                }, ignore_index=True)
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
+                        data = data.append({
+                            'Tau': f'{params["forward_model_overestimation_limit"]}',
+                            'Gradient ascent steps': step,
+                            ylabel: scalar,
+                            }, ignore_index=True)
 
         axis = task_to_axis[task]
 
@@ -2135,8 +2167,8 @@ def ablate_architecture(hopper,
     import re
     import pandas as pd
     import numpy as np
-    import tensorflow as tf
     import tqdm
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -2209,22 +2241,19 @@ def ablate_architecture(hopper,
 
         for d in tqdm.tqdm(task_to_dir[task]):
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag and e.step < max_iterations:
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag and step < max_iterations:
 
-                            data = data.append({
-                                'Gradient ascent steps': e.step,
-                                ylabel: tf.make_ndarray(v.tensor).tolist(),
-                                }, ignore_index=True)
+                        data = data.append({
+                            'Gradient ascent steps': step,
+                            ylabel: scalar,
+                            }, ignore_index=True)
 
-                        if v.tag == evaluator_one and e.step < max_iterations:
-                            it_to_eval_one[e.step].append(
-                                tf.make_ndarray(v.tensor).tolist())
+                    if scalar_tag == evaluator_one and step < max_iterations:
+                        it_to_eval_one[step].append(scalar)
 
-                        if v.tag == evaluator_two and e.step < max_iterations:
-                            it_to_eval_two[e.step].append(
-                                tf.make_ndarray(v.tensor).tolist())
+                    if scalar_tag == evaluator_two and step < max_iterations:
+                        it_to_eval_two[step].append(scalar)
 
         if len(it_to_eval_one.keys()) == 0:
             print(task, 'A')
@@ -2327,12 +2356,12 @@ def plot(dir, tag, xlabel, ylabel, separate_runs,
     import re
     import pickle as pkl
     import pandas as pd
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     import matplotlib
     import matplotlib.pyplot as plt
     import numpy as np
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = False
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -2400,21 +2429,19 @@ def plot(dir, tag, xlabel, ylabel, separate_runs,
     data = pd.DataFrame(columns=['id', xlabel, ylabel] + params_of_variation)
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step < max_iterations:
-                        y_vals = tf.make_ndarray(v.tensor)
-                        y_vals = np.clip(y_vals, lower_limit, upper_limit)
-                        if norm == 'sqrt':
-                            y_vals /= np.sqrt(dim_x)
-                        if norm == 'full':
-                            y_vals /= dim_x
-                        row = {'id': i,
-                               ylabel: y_vals.tolist(),
-                               xlabel: e.step}
-                        for key in params_of_variation:
-                            row[key] = f'{pretty(key)} = {p[key]}'
-                        data = data.append(row, ignore_index=True)
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step < max_iterations:
+                    y_vals = np.clip(scalar, lower_limit, upper_limit)
+                    if norm == 'sqrt':
+                        y_vals /= np.sqrt(dim_x)
+                    if norm == 'full':
+                        y_vals /= dim_x
+                    row = {'id': i,
+                           ylabel: y_vals.tolist(),
+                           xlabel: step}
+                    for key in params_of_variation:
+                        row[key] = f'{pretty(key)} = {p[key]}'
+                    data = data.append(row, ignore_index=True)
 
     if separate_runs:
         params_of_variation.append('id')
@@ -2448,12 +2475,12 @@ def plot_heatmap(dir, tag, xlabel, ylabel, cbar_label,
     import os
     import re
     import pickle as pkl
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     import matplotlib
     import matplotlib.pyplot as plt
     import numpy as np
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -2522,16 +2549,14 @@ def plot_heatmap(dir, tag, xlabel, ylabel, cbar_label,
     p1_keys = set()
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step == iteration:
-                        y_vals = tf.make_ndarray(v.tensor)
-                        y_vals = np.clip(y_vals, lower_limit, upper_limit)
-                        p0_keys.add(p[params_of_variation[0]])
-                        p1_keys.add(p[params_of_variation[1]])
-                        data_dict[(
-                            p[params_of_variation[0]],
-                            p[params_of_variation[1]])].append(y_vals)
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step == iteration:
+                    y_vals = np.clip(scalar, lower_limit, upper_limit)
+                    p0_keys.add(p[params_of_variation[0]])
+                    p1_keys.add(p[params_of_variation[1]])
+                    data_dict[(
+                        p[params_of_variation[0]],
+                        p[params_of_variation[1]])].append(y_vals)
 
     p0_keys = sorted(list(p0_keys))
     p0_map = {p0: i for i, p0 in enumerate(p0_keys)}
@@ -2618,10 +2643,10 @@ def plot_one(dir, tag, xlabel, ylabel, pkey, pval, iteration, legend):
     import re
     import pickle as pkl
     import pandas as pd
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     import matplotlib.pyplot as plt
+    from design_baselines.events import iterate_scalars
 
     sns.set_style("whitegrid")
     sns.set_context("notebook",
@@ -2655,13 +2680,12 @@ def plot_one(dir, tag, xlabel, ylabel, pkey, pval, iteration, legend):
     data = pd.DataFrame(columns=['id', xlabel, ylabel])
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and str(p[pkey]) == pval:
-                        data = data.append({
-                            'id': i,
-                            ylabel: tf.make_ndarray(v.tensor).tolist(),
-                            xlabel: e.step}, ignore_index=True)
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and str(p[pkey]) == pval:
+                    data = data.append({
+                        'id': i,
+                        ylabel: scalar,
+                        xlabel: step}, ignore_index=True)
 
     # get the best sample in the dataset
     import design_bench
@@ -2704,11 +2728,11 @@ def plot_comparison(hopper, tag, param, xlabel, iteration):
     import numpy as np
     import pickle as pkl
     import pandas as pd
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     import matplotlib.pyplot as plt
     import matplotlib
+    from design_baselines.events import iterate_scalars
 
     plt.rcParams['text.usetex'] = True
     matplotlib.rc('font', family='serif', serif='cm10')
@@ -2763,12 +2787,10 @@ def plot_comparison(hopper, tag, param, xlabel, iteration):
         it_to_p = defaultdict(list)
         for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
             for f in glob.glob(os.path.join(d, '*/events.out*')):
-                for e in tf.compat.v1.train.summary_iterator(f):
-                    for v in e.summary.value:
-                        if v.tag == tag:
-                            it_to_tag[e.step].append(
-                                tf.make_ndarray(v.tensor).tolist())
-                            it_to_p[e.step].append(p[param])
+                for step, scalar_tag, scalar in iterate_scalars(f):
+                    if scalar_tag == tag:
+                        it_to_tag[step].append(scalar)
+                        it_to_p[step].append(p[param])
 
         for score, p in zip(it_to_tag[iteration], it_to_p[iteration]):
             data = data.append({
@@ -2813,10 +2835,10 @@ def evaluate_offline_per_seed(dir, tag, eval_tag):
     import re
     import numpy as np
     import pickle as pkl
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     from collections import defaultdict
+    from design_baselines.events import iterate_scalars
 
     sns.set_style("whitegrid")
     sns.set_context("notebook",
@@ -2855,14 +2877,13 @@ def evaluate_offline_per_seed(dir, tag, eval_tag):
         it_to_tag = defaultdict(list)
         it_to_eval_tag = defaultdict(list)
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag not in tag_set:
-                        tag_set.add(v.tag)
-                    if v.tag == tag and e.step < 500:
-                        it_to_tag[e.step].append(tf.make_ndarray(v.tensor).tolist())
-                    if v.tag == eval_tag and e.step < 500:
-                        it_to_eval_tag[e.step].append(tf.make_ndarray(v.tensor).tolist())
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag not in tag_set:
+                    tag_set.add(scalar_tag)
+                if scalar_tag == tag and step < 500:
+                    it_to_tag[step].append(scalar)
+                if scalar_tag == eval_tag and step < 500:
+                    it_to_eval_tag[step].append(scalar)
 
         if len(it_to_eval_tag.keys()) > 0:
             keys, values = zip(*it_to_eval_tag.items())
@@ -2892,10 +2913,10 @@ def evaluate_offline(dir, tag, eval_tag):
     import re
     import numpy as np
     import pickle as pkl
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     from collections import defaultdict
+    from design_baselines.events import iterate_scalars
 
     sns.set_style("whitegrid")
     sns.set_context("notebook",
@@ -2930,12 +2951,11 @@ def evaluate_offline(dir, tag, eval_tag):
     it_to_eval_tag = defaultdict(list)
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step < 500:
-                        it_to_tag[e.step].append(tf.make_ndarray(v.tensor).tolist())
-                    if v.tag == eval_tag and e.step < 500:
-                        it_to_eval_tag[e.step].append(tf.make_ndarray(v.tensor).tolist())
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step < 500:
+                    it_to_tag[step].append(scalar)
+                if scalar_tag == eval_tag and step < 500:
+                    it_to_eval_tag[step].append(scalar)
 
     keys, values = zip(*it_to_eval_tag.items())
     values = [np.mean(vs) for vs in values]
@@ -2959,10 +2979,10 @@ def evaluate_fixed(dir, tag, iteration, confidence):
     import re
     import numpy as np
     import pickle as pkl
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     from collections import defaultdict
+    from design_baselines.events import iterate_scalars
 
     sns.set_style("whitegrid")
     sns.set_context("notebook",
@@ -2996,12 +3016,10 @@ def evaluate_fixed(dir, tag, iteration, confidence):
     it_to_tag = defaultdict(list)
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step < 500:
-                        it_to_tag[e.step].append(tf.make_ndarray(v.tensor).tolist())
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step < 500:
+                    it_to_tag[step].append(scalar)
 
-    import numpy as np
     import scipy.stats
 
     def mean_confidence_interval(data, confidence=0.95):
@@ -3039,10 +3057,10 @@ def evaluate_fixed_distance(dir, tag, distance,
     import re
     import numpy as np
     import pickle as pkl
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     from collections import defaultdict
+    from design_baselines.events import iterate_scalars
 
     sns.set_style("whitegrid")
     sns.set_context("notebook",
@@ -3082,18 +3100,16 @@ def evaluate_fixed_distance(dir, tag, distance,
     it_to_distance = defaultdict(list)
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag:
-                        it_to_tag[e.step].append(
-                            tf.make_ndarray(v.tensor).tolist())
-                    if v.tag == distance_tag:
-                        y_vals = tf.make_ndarray(v.tensor)
-                        if norm == 'sqrt':
-                            y_vals /= np.sqrt(dim_x)
-                        if norm == 'full':
-                            y_vals /= dim_x
-                        it_to_distance[e.step].append(y_vals.tolist())
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag:
+                    it_to_tag[step].append(scalar)
+                if scalar_tag == distance_tag:
+                    y_vals = np.float64(scalar)
+                    if norm == 'sqrt':
+                        y_vals /= np.sqrt(dim_x)
+                    if norm == 'full':
+                        y_vals /= dim_x
+                    it_to_distance[step].append(y_vals.tolist())
 
     iterations, distances = zip(*list(it_to_distance.items()))
     distances = np.array([np.mean(dl) for dl in distances])
@@ -3137,11 +3153,11 @@ def ablation_heatmap(dir, tag, label, pone, ptwo, iterations):
     import re
     import pickle as pkl
     import pandas as pd
-    import tensorflow as tf
     import tqdm
     import seaborn as sns
     import matplotlib.pyplot as plt
     import numpy as np
+    from design_baselines.events import iterate_scalars
 
     def pretty(s):
         return s.replace('_', ' ').title()
@@ -3181,15 +3197,14 @@ def ablation_heatmap(dir, tag, label, pone, ptwo, iterations):
                                  'Solver Steps'])
     for d, p in tqdm.tqdm(zip(dirs, params)):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step in iterations:
-                        data = data.append({
-                            label: tf.make_ndarray(v.tensor).tolist(),
-                            pretty(pone): p[pone],
-                            pretty(ptwo): p[ptwo],
-                            'Solver Steps': e.step
-                            }, ignore_index=True)
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step in iterations:
+                    data = data.append({
+                        label: scalar,
+                        pretty(pone): p[pone],
+                        pretty(ptwo): p[ptwo],
+                        'Solver Steps': step
+                        }, ignore_index=True)
 
     # get the best sample in the dataset
     plt.clf()
@@ -3240,8 +3255,8 @@ def evaluate(dir, tag, iteration):
     import os
     import re
     import numpy as np
-    import tensorflow as tf
     import tqdm
+    from design_baselines.events import iterate_scalars
 
     def pretty(s):
         return s.replace('_', ' ').title()
@@ -3286,12 +3301,11 @@ def evaluate(dir, tag, iteration):
     param_to_scores = defaultdict(list)
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag and e.step == iteration:
-                        for key in params_of_variation:
-                            key = f'{pretty(key)} = {p[key]}'
-                            param_to_scores[key].append(tf.make_ndarray(v.tensor).tolist())
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag and step == iteration:
+                    for key in params_of_variation:
+                        key = f'{pretty(key)} = {p[key]}'
+                        param_to_scores[key].append(scalar)
 
     # return the mean score and standard deviation
     for key in param_to_scores:
@@ -3316,8 +3330,8 @@ def evaluate_distance(dir, tag, distance, distance_tag, norm):
     import os
     import re
     import numpy as np
-    import tensorflow as tf
     import tqdm
+    from design_baselines.events import iterate_scalars
 
     def pretty(s):
         return s.replace('_', ' ').title()
@@ -3368,22 +3382,20 @@ def evaluate_distance(dir, tag, distance, distance_tag, norm):
     param_to_it_distances = defaultdict(lambda: defaultdict(list))
     for i, (d, p) in enumerate(tqdm.tqdm(zip(dirs, params))):
         for f in glob.glob(os.path.join(d, '*/events.out*')):
-            for e in tf.compat.v1.train.summary_iterator(f):
-                for v in e.summary.value:
-                    if v.tag == tag:
-                        for key in params_of_variation:
-                            key = f'{pretty(key)} = {p[key]}'
-                            param_to_it_scores[key][e.step].append(
-                                tf.make_ndarray(v.tensor).tolist())
-                    if v.tag == distance_tag:
-                        for key in params_of_variation:
-                            key = f'{pretty(key)} = {p[key]}'
-                            ds = tf.make_ndarray(v.tensor)
-                            if norm == 'sqrt':
-                                ds /= np.sqrt(dim_x)
-                            if norm == 'full':
-                                ds /= dim_x
-                            param_to_it_distances[key][e.step].append(ds)
+            for step, scalar_tag, scalar in iterate_scalars(f):
+                if scalar_tag == tag:
+                    for key in params_of_variation:
+                        key = f'{pretty(key)} = {p[key]}'
+                        param_to_it_scores[key][step].append(scalar)
+                if scalar_tag == distance_tag:
+                    for key in params_of_variation:
+                        key = f'{pretty(key)} = {p[key]}'
+                        ds = scalar
+                        if norm == 'sqrt':
+                            ds /= np.sqrt(dim_x)
+                        if norm == 'full':
+                            ds /= dim_x
+                        param_to_it_distances[key][step].append(ds)
 
     # return the mean score and standard deviation
     for key in param_to_it_scores:
@@ -1,7 +1,14 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
+from design_baselines.data import get_dataset_key
 from design_baselines.logger import Logger
+from design_baselines.checkpoints import ModelCache
+from design_baselines.checkpoints import VAECache
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.cma_es.trainers import Ensemble, VAETrainer
 from design_baselines.cma_es.nets import ForwardModel, SequentialVAE
+from design_baselines.cma_es.solver import BatchedCMAES
+from design_baselines.utils import set_seed
 from tensorflow_probability import distributions as tfpd
 import tensorflow as tf
 import tensorflow.keras as keras
@@ -20,16 +27,27 @@ def cma_es(config):
         a dictionary of hyper parameters such as the learning rate
     """
 
+    # models are only cached when training is seeded
+    if config.get('seed', None) is not None:
+        set_seed(config['seed'])
+
     # create the training task and logger
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
 
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if task.is_discrete and not config["use_vae"]:
-        task.map_to_logits()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if task.is_discrete and not config["use_vae"] \
+                and config.get('lazy_logits', False):
+            task.map_to_lazy_logits()
+        elif task.is_discrete and not config["use_vae"]:
+            task.map_to_logits()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
@@ -47,7 +65,9 @@ def cma_es(config):
         vae_trainer = VAETrainer(vae_model,
                                  vae_optim=tf.keras.optimizers.Adam,
                                  vae_lr=config['vae_lr'],
-                                 beta=config['vae_beta'])
+                                 beta=config['vae_beta'],
+                                 jit_compile=config.get('jit_compile', False))
+        logger.watch(vae_trainer)
 
         # create the training task and logger
         train_data, val_data = build_pipeline(
@@ -55,34 +75,86 @@ def cma_es(config):
             batch_size=config['vae_batch_size'],
             val_size=config['val_size'])
 
-        # estimate the number of training steps per epoch
-        vae_trainer.launch(train_data, val_data,
-                           logger, config['vae_epochs'])
+        # the dataset key is None when the subsample is not reproducible
+        dataset_key = get_dataset_key(task.task_name, task.task_kwargs,
+                                      seed=task.dataset_seed)
+        if config.get('vae_cache_dir', None) is not None \
+                and config.get('seed', None) is not None \
+                and dataset_key is not None:
+
+            # restore a VAE and latent dataset shared by latent baselines
+            vae_cache = VAECache(config['vae_cache_dir'])
+            vae_key = vae_cache.get_key(
+                dataset=dataset_key,
+                hidden_size=config['vae_hidden_size'],
+                latent_size=config['vae_latent_size'],
+                activation=config['vae_activation'],
+                kernel_size=config['vae_kernel_size'],
+                num_blocks=config['vae_num_blocks'],
+                lr=config['vae_lr'], beta=config['vae_beta'],
+                batch_size=config['vae_batch_size'],
+                val_size=config['val_size'], epochs=config['vae_epochs'],
+                seed=config['seed'])
+            with logger.span('vae'):
+                vae_cache.launch(vae_key, vae_trainer, train_data, val_data,
+                                 logger, config['vae_epochs'])
+            x, mean, standard_dev = vae_cache.encode(vae_key, vae_model, x)
+
+        else:
+
+            # estimate the number of training steps per epoch
+            with logger.span('vae'):
+                vae_trainer.launch(train_data, val_data,
+                                   logger, config['vae_epochs'])
 
-        # map the x values to latent space
-        x = vae_model.encoder_cnn.predict(x)[0]
+            # map the x values to latent space
+            x = vae_model.encoder_cnn.predict(x)[0]
 
-        mean = np.mean(x, axis=0, keepdims=True)
-        standard_dev = np.std(x - mean, axis=0, keepdims=True)
-        x = (x - mean) / standard_dev
+            mean = np.mean(x, axis=0, keepdims=True)
+            standard_dev = np.std(x - mean, axis=0, keepdims=True)
+            x = (x - mean) / standard_dev
 
     input_shape = x.shape[1:]
+    if task.is_lazy_logits:
+        input_shape = list(input_shape) + [task.num_classes - 1]
     input_size = np.prod(input_shape)
 
-    # make several keras neural networks with two hidden layers
-    forward_models = [ForwardModel(
-        input_shape,
-        hidden_size=config['hidden_size'],
-        num_layers=config['num_layers'],
-        initial_max_std=config['initial_max_std'],
-        initial_min_std=config['initial_min_std'])
-        for b in range(config['bootstraps'])]
-
-    # create a trainer for a forward model with a conservative objective
-    ensemble = Ensemble(
-        forward_models,
-        forward_model_optim=tf.keras.optimizers.Adam,
-        forward_model_lr=config['ensemble_lr'])
+    if config.get('stacked_ensemble', False):
+
+        # make one keras neural network that stacks every bootstrap
+        forward_model = StackedForwardModel(
+            input_shape,
+            bootstraps=config['bootstraps'],
+            activations=['leaky_relu'] * config['num_layers'],
+            hidden_size=config['hidden_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+
+        # create a trainer that updates every bootstrap in one step
+        ensemble = StackedEnsemble(
+            forward_model,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+
+    else:
+
+        # make several keras neural networks with two hidden layers
+        forward_models = [ForwardModel(
+            input_shape,
+            hidden_size=config['hidden_size'],
+            num_layers=config['num_layers'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+            for b in range(config['bootstraps'])]
+
+        # create a trainer for a forward model with a conservative objective
+        ensemble = Ensemble(
+            forward_models,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+    logger.watch(ensemble)
 
     # create the training task and logger
     train_data, val_data = build_pipeline(
@@ -90,15 +162,48 @@ def cma_es(config):
         batch_size=config['ensemble_batch_size'],
         val_size=config['val_size'])
 
-    # train the model for an additional number of epochs
-    ensemble.launch(train_data,
-                    val_data,
-                    logger,
-                    config['ensemble_epochs'])
+    if task.is_lazy_logits:
+
+        # convert only the designs in every batch to logits
+        def map_to_logits(x, *rest):
+            return (task.lazy_to_logits(x), *rest)
+
+        train_data = train_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        val_data = val_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    if config.get('model_cache_dir', None) is not None \
+            and config.get('seed', None) is not None \
+            and not config["use_vae"]:
+
+        # restore the ensemble when an identical one was trained before
+        cache = ModelCache(config['model_cache_dir'])
+        key = cache.get_key(seed=config['seed'], model='cma_es', **{
+            name: config.get(name, None) for name in (
+                'task', 'task_kwargs', 'normalize_ys', 'normalize_xs',
+                'lazy_logits', 'stacked_ensemble', 'bootstraps',
+                'hidden_size', 'num_layers', 'initial_max_std',
+                'initial_min_std', 'ensemble_lr', 'ensemble_batch_size',
+                'ensemble_epochs', 'val_size')})
+        with logger.span('ensemble'):
+            cache.launch(key, ensemble, train_data, val_data,
+                         logger, config['ensemble_epochs'])
+
+    else:
+
+        # train the model for an additional number of epochs
+        with logger.span('ensemble'):
+            ensemble.launch(train_data,
+                            val_data,
+                            logger,
+                            config['ensemble_epochs'])
 
     # select the top 1 initial designs from the dataset
     indices = tf.math.top_k(y[:, 0], k=config['solver_samples'])[1]
     initial_x = tf.gather(x, indices, axis=0)
+    if task.is_lazy_logits:
+        initial_x = task.lazy_to_logits(initial_x)
     x = initial_x
 
     # create a fitness function for optimizing the expected task score
@@ -113,22 +218,62 @@ def cma_es(config):
             value = ensemble.get_distribution(input_x).mean()
         return (-value[0].numpy()).tolist()[0]
 
-    import cma
-    result = []
-    for i in range(config['solver_samples']):
-        xi = x[i].numpy().flatten().tolist()
-        es = cma.CMAEvolutionStrategy(xi, config['cma_sigma'])
-        step = 0
-        while not es.stop() and step < config['cma_max_iterations']:
-            solutions = es.ask()
-            es.tell(solutions, [fitness(x) for x in solutions])
-            step += 1
-        result.append(
-            tf.reshape(es.result.xbest, input_shape))
-        print(f"CMA: {i + 1} / {config['solver_samples']}")
-
-    # convert the solution found by CMA-ES to a tensor
-    x = tf.stack(result, axis=0)
+    # create a fitness function that scores a whole population at once
+    def batched_fitness(input_x):
+        input_x = tf.reshape(tf.cast(input_x, tf.float32), [-1, *input_shape])
+        if config["optimize_ground_truth"]:
+            if task.is_discrete and config["use_vae"]:
+                input_x = tf.argmax(vae_model.decoder_cnn.predict(
+                    input_x * standard_dev + mean), axis=2, output_type=tf.int32)
+            value = task.predict(input_x)
+        else:
+            value = ensemble.get_distribution(input_x).mean()
+        return -value[:, 0].numpy()
+
+    with logger.span('solver'):
+        if config.get('cma_batched', False):
+
+            # bound the memory used by the covariance matrix of every restart
+            restarts = config.get('cma_restarts_per_batch',
+                                  max(1, 2 ** 26 // int(input_size) ** 2))
+
+            result = []
+            for i in range(0, config['solver_samples'], restarts):
+                xi = tf.reshape(x[i:i + restarts], [-1, input_size]).numpy()
+
+                # derive the seed of every batch from the seed of the run
+                seed = None if config.get('seed', None) is None else int(
+                    np.random.SeedSequence([config['seed'], i])
+                    .generate_state(1)[0])
+                es = BatchedCMAES(xi, config['cma_sigma'], seed=seed)
+                xbest = es.optimize(batched_fitness,
+                                    config['cma_max_iterations'])
+                result.append(tf.reshape(tf.cast(
+                    xbest, tf.float32), [-1, *input_shape]))
+                print(f"CMA: {i + xi.shape[0]} / {config['solver_samples']}")
+
+            # convert the solution found by CMA-ES to a tensor
+            x = tf.concat(result, axis=0)
+
+        else:
+
+            import cma
+            result = []
+            for i in range(config['solver_samples']):
+                xi = x[i].numpy().flatten().tolist()
+                es = cma.CMAEvolutionStrategy(xi, config['cma_sigma'])
+                step = 0
+                while not es.stop() and step < config['cma_max_iterations']:
+                    solutions = es.ask()
+                    es.tell(solutions, [fitness(x) for x in solutions])
+                    step += 1
+                result.append(
+                    tf.reshape(es.result.xbest, input_shape))
+                print(f"CMA: {i + 1} / {config['solver_samples']}")
+
+            # convert the solution found by CMA-ES to a tensor
+            x = tf.stack(result, axis=0)
+
     solution = x
 
     if task.is_discrete and config["use_vae"]:
@@ -142,7 +287,12 @@ def cma_es(config):
     if config["do_evaluation"]:
 
         # evaluate the found solution
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
         if task.is_normalized_y:
             score = task.denormalize_y(score)
         logger.record("score", score, 0, percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
@@ -0,0 +1,249 @@
+import numpy as np
+
+
+class BatchedCMAES(object):
+
+    def __init__(self,
+                 initial_x,
+                 sigma,
+                 popsize=None,
+                 seed=None):
+        """Build a CMA Evolution Strategy that advances many independent
+        restarts in lockstep, so that every generation of every restart
+        can be scored with a single call to the fitness function
+
+        Args:
+
+        initial_x: np.ndarray
+            the starting mean of every restart, shaped like
+            [num_restarts, num_dimensions]
+        sigma: float
+            the initial step size shared by every restart
+        popsize: int
+            the number of candidates sampled per restart in each
+            generation, defaults to 4 + floor(3 ln(num_dimensions))
+        seed: int
+            an optional seed for the random number generator
+        """
+
+        self.xmean = np.array(initial_x, dtype=np.float64)
+        self.num_restarts, n = self.xmean.shape
+        self.num_dimensions = n
+        self.random = np.random.RandomState(seed)
+
+        # strategy parameters for selection
+        self.popsize = popsize if popsize is not None \
+            else 4 + int(3 * np.log(n))
+        self.mu = self.popsize // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1.0 / np.sum(self.weights ** 2)
+
+        # strategy parameters for adaptation
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff)
+                       / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0.0, np.sqrt(
+            (self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        # dynamic state of every restart
+        r = self.num_restarts
+        self.sigma = np.full([r], sigma, dtype=np.float64)
+        self.pc = np.zeros([r, n])
+        self.ps = np.zeros([r, n])
+        self.B = np.tile(np.eye(n)[np.newaxis], [r, 1, 1])
+        self.D = np.ones([r, n])
+        self.C = np.tile(np.eye(n)[np.newaxis], [r, 1, 1])
+        self.invsqrtC = np.tile(np.eye(n)[np.newaxis], [r, 1, 1])
+        self.counteval = 0
+        self.eigeneval = 0
+
+        # the best candidate evaluated so far by every restart
+        self.xbest = np.array(self.xmean)
+        self.fbest = np.full([r], np.inf)
+
+        # the best fitness of recent generations used to detect stagnation
+        self.history = np.full([10 + int(np.ceil(
+            30 * n / self.popsize)), r], np.nan)
+        self.frange = np.full([r], np.inf)
+
+    def ask(self):
+        """Sample a population of candidates for every restart from the
+        current multivariate normal search distributions
+
+        Returns:
+
+        candidates: np.ndarray
+            a batch of candidates shaped like
+            [num_restarts, popsize, num_dimensions]
+        """
+
+        z = self.random.randn(
+            self.num_restarts, self.popsize, self.num_dimensions)
+        y = np.matmul(z * self.D[:, np.newaxis],
+                      np.transpose(self.B, [0, 2, 1]))
+        return self.xmean[:, np.newaxis] + \
+            self.sigma[:, np.newaxis, np.newaxis] * y
+
+    def stop(self,
+             tolfun=1e-11,
+             tolx=1e-11):
+        """Returns which restarts have converged, using the tolfun and
+        tolx criteria of the reference CMA-ES implementation
+
+        Args:
+
+        tolfun: float
+            a restart stops when the range of the fitness of its current
+            and recent best candidates is smaller than this tolerance
+        tolx: float
+            a restart stops when the standard deviation of its search
+            distribution along every axis is smaller than this tolerance
+
+        Returns:
+
+        stop: np.ndarray
+            a boolean array shaped like [num_restarts] that is true for
+            restarts that should not be advanced further
+        """
+
+        # the fitness no longer changes within recent generations
+        full = ~np.isnan(self.history).any(axis=0)
+        recent = np.where(full, np.ptp(
+            np.nan_to_num(self.history), axis=0), np.inf)
+        stop_fun = np.maximum(recent, self.frange) < tolfun
+
+        # the search distribution has collapsed to a point
+        std = self.sigma[:, np.newaxis] * np.sqrt(
+            np.diagonal(self.C, axis1=1, axis2=2))
+        stop_x = np.all(std < tolx, axis=1) & np.all(
+            self.sigma[:, np.newaxis] * np.abs(self.pc) < tolx, axis=1)
+        return stop_fun | stop_x
+
+    def tell(self, candidates, fitness, active=None):
+        """Update the search distribution of every restart using the
+        fitness of its candidates, where lower fitness is better
+
+        Args:
+
+        candidates: np.ndarray
+            the candidates returned by the previous call to ask shaped
+            like [num_restarts, popsize, num_dimensions]
+        fitness: np.ndarray
+            the fitness of every candidate to be minimized shaped like
+            [num_restarts, popsize]
+        active: np.ndarray
+            an optional boolean array shaped like [num_restarts] where
+            restarts that are not active keep their current state
+        """
+
+        if active is not None and not np.all(active):
+
+            # update every restart and then restore the inactive ones
+            names = ('xmean', 'sigma', 'pc', 'ps', 'B', 'D', 'C',
+                     'invsqrtC', 'xbest', 'fbest', 'frange')
+            state = {k: np.array(getattr(self, k)) for k in names}
+            history = np.array(self.history)
+            fitness = np.where(active[:, np.newaxis], fitness, 0.0)
+            self.tell(candidates, fitness)
+            for k in names:
+                getattr(self, k)[~active] = state[k][~active]
+            self.history[:, ~active] = history[:, ~active]
+            return
+
+        fitness = np.asarray(fitness, dtype=np.float64)
+        self.counteval += self.popsize
+        r = np.arange(self.num_restarts)
+
+        # record the best fitness and the range of this generation
+        self.history = np.roll(self.history, 1, axis=0)
+        self.history[0] = np.min(fitness, axis=1)
+        self.frange = np.max(fitness, axis=1) - np.min(fitness, axis=1)
+
+        # keep track of the best candidate seen by every restart
+        best = np.argmin(fitness, axis=1)
+        improved = fitness[r, best] < self.fbest
+        self.fbest = np.where(improved, fitness[r, best], self.fbest)
+        self.xbest[improved] = candidates[r, best][improved]
+
+        # recombine the best candidates into a new mean
+        order = np.argsort(fitness, axis=1)[:, :self.mu]
+        selected = np.take_along_axis(
+            candidates, order[:, :, np.newaxis], axis=1)
+        xold = self.xmean
+        self.xmean = np.matmul(self.weights, selected)
+        artmp = (selected - xold[:, np.newaxis]) / \
+            self.sigma[:, np.newaxis, np.newaxis]
+        y_w = (self.xmean - xold) / self.sigma[:, np.newaxis]
+
+        # cumulation of the evolution paths
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(
+            self.cs * (2 - self.cs) * self.mueff) * np.matmul(
+            self.invsqrtC, y_w[:, :, np.newaxis])[:, :, 0]
+        ps_norm = np.linalg.norm(self.ps, axis=1)
+        hsig = (ps_norm / np.sqrt(1 - (1 - self.cs) ** (
+            2 * self.counteval / self.popsize)) / self.chi_n
+            < 1.4 + 2 / (self.num_dimensions + 1)).astype(np.float64)
+        self.pc = (1 - self.cc) * self.pc + hsig[:, np.newaxis] * np.sqrt(
+            self.cc * (2 - self.cc) * self.mueff) * y_w
+
+        # rank one and rank mu updates of the covariance matrix
+        rank_one = self.pc[:, :, np.newaxis] * self.pc[:, np.newaxis] + (
+            (1 - hsig) * self.cc * (2 - self.cc)
+        )[:, np.newaxis, np.newaxis] * self.C
+        rank_mu = np.matmul(np.transpose(
+            artmp * self.weights[:, np.newaxis], [0, 2, 1]), artmp)
+        self.C = (1 - self.c1 - self.cmu) * self.C + \
+            self.c1 * rank_one + self.cmu * rank_mu
+
+        # adapt the step size using the conjugate evolution path
+        self.sigma = self.sigma * np.exp(
+            (self.cs / self.damps) * (ps_norm / self.chi_n - 1))
+
+        # the eigen decomposition is only refreshed periodically
+        if self.counteval - self.eigeneval > self.popsize / (
+                self.c1 + self.cmu) / self.num_dimensions / 10:
+            self.eigeneval = self.counteval
+            self.C = (self.C + np.transpose(self.C, [0, 2, 1])) / 2
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+            self.invsqrtC = np.matmul(self.B / self.D[:, np.newaxis],
+                                      np.transpose(self.B, [0, 2, 1]))
+
+    def optimize(self, fitness_fn, iterations):
+        """Run the strategy for at most a number of generations, scoring
+        the candidates of every restart that has not converged together
+        in one call
+
+        Args:
+
+        fitness_fn: Callable
+            a function that accepts candidates shaped like
+            [num_candidates, num_dimensions] and returns their fitness
+            to be minimized shaped like [num_candidates]
+        iterations: int
+            the number of generations to run every restart for
+
+        Returns:
+
+        xbest: np.ndarray
+            the best candidate evaluated by every restart shaped like
+            [num_restarts, num_dimensions]
+        """
+
+        for i in range(iterations):
+
+            # only candidates of restarts that have not converged are scored
+            active = ~self.stop()
+            if not np.any(active):
+                break
+            candidates = self.ask()
+            fitness = np.zeros([self.num_restarts, self.popsize])
+            fitness[active] = np.reshape(fitness_fn(np.reshape(
+                candidates[active], [-1, self.num_dimensions])),
+                [-1, self.popsize])
+            self.tell(candidates, fitness, active=active)
+        return self.xbest
@@ -1,4 +1,5 @@
 from design_baselines.utils import spearman
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow as tf
@@ -9,7 +10,8 @@ class Ensemble(tf.Module):
     def __init__(self,
                  forward_models,
                  forward_model_optim=tf.keras.optimizers.Adam,
-                 forward_model_lr=0.001):
+                 forward_model_lr=0.001,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -21,6 +23,9 @@ class Ensemble(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -32,6 +37,10 @@ class Ensemble(tf.Module):
             forward_model_optim(learning_rate=forward_model_lr)
             for i in range(self.bootstraps)]
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     def get_distribution(self,
                          x,
                          **kwargs):
@@ -222,9 +231,9 @@ class Ensemble(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -248,7 +257,8 @@ class VAETrainer(tf.Module):
     def __init__(self,
                  vae,
                  vae_optim=tf.keras.optimizers.Adam,
-                 vae_lr=0.001, beta=1.0):
+                 vae_lr=0.001, beta=1.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -260,6 +270,9 @@ class VAETrainer(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -269,6 +282,10 @@ class VAETrainer(tf.Module):
         # create optimizers for each model in the ensemble
         self.vae_optim = vae_optim(learning_rate=vae_lr)
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x):
@@ -417,6 +434,21 @@ class VAETrainer(tf.Module):
 
         for e in range(epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+    def get_saveables(self):
+        """Collects and returns stateful objects that are serializeable
+        using the tensorflow checkpoint format
+
+        Returns:
+
+        saveables: dict
+            a dict containing stateful objects compatible with checkpoints
+        """
+
+        saveables = dict()
+        saveables['vae'] = self.vae
+        saveables['vae_optim'] = self.vae_optim
+        return saveables
@@ -1,6 +1,10 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
+from design_baselines.data import get_dataset_key
 from design_baselines.logger import Logger
+from design_baselines.checkpoints import ModelCache
+from design_baselines.checkpoints import VAECache
 from design_baselines.utils import spearman
+from design_baselines.utils import set_seed
 from design_baselines.coms_cleaned.trainers import ConservativeObjectiveModel
 from design_baselines.coms_cleaned.trainers import VAETrainer
 from design_baselines.coms_cleaned.nets import ForwardModel
@@ -17,6 +21,19 @@ import json
               default='coms-cleaned', type=str,
               help='The directory in which tensorboard data is logged '
                    'during the experiment.')
+@click.option('--logger-flush-interval',
+              default=0, type=int,
+              help='The number of records to buffer before computing '
+                   'their statistics together and writing them in bulk, '
+                   'which can be left as zero to write every record.')
+@click.option('--logger-verbosity',
+              default=1, type=int,
+              help='The highest level of records that are written, where '
+                   'zero writes only results and one adds diagnostics.')
+@click.option('--profile-span',
+              default=None, type=str,
+              help='The name of a timing span whose first call is traced '
+                   'by the tensorflow profiler, such as ensemble or solver.')
 @click.option('--task', type=str,
               default='HopperController-Exact-v0',
               help='The name of the design-bench task to use during '
@@ -37,6 +54,52 @@ import json
               help='The empirical distribution to be used when further '
                    'subsampling the training set to the specific '
                    'task_max_samples from the previous run argument.')
+@click.option('--task-dataset-cache-dir',
+              default=None, type=str,
+              help='An optional directory where the relabelled and '
+                   'subsampled training set is saved and shared between '
+                   'runs with the same task arguments.')
+@click.option('--task-dataset-seed',
+              default=None, type=int,
+              help='An optional random seed set before subsampling the '
+                   'training set, which is part of the dataset cache key.')
+@click.option('--oracle-cache-size',
+              default=0, type=int,
+              help='The number of oracle scores to memoize in memory, '
+                   'which can be left as zero to score every design '
+                   'with the oracle.')
+@click.option('--oracle-cache-dir',
+              default=None, type=str,
+              help='An optional directory where memoized oracle scores '
+                   'are saved so they persist between experiments.')
+@click.option('--oracle-workers',
+              default=0, type=int,
+              help='The number of worker processes that score designs '
+                   'with the oracle in parallel, which can be left as zero '
+                   'to score designs in the main process.')
+@click.option('--oracle-chunk-size',
+              default=None, type=int,
+              help='The number of designs sent to an oracle worker at '
+                   'once, which can be left as None to split every batch '
+                   'evenly between the workers.')
+@click.option('--pipeline-by-index/--no-pipeline-by-index',
+              default=False, type=bool,
+              help='Whether to shuffle only indices into the data set and '
+                   'gather every batch in place instead of copying it.')
+@click.option('--lazy-logits/--no-lazy-logits',
+              default=False, type=bool,
+              help='Whether to keep discrete designs as compact integers '
+                   'and convert every batch to logits when it is read.')
+@click.option('--model-cache-dir',
+              default=None, type=str,
+              help='An optional directory where the trained forward model '
+                   'is saved and restored by runs that only change the '
+                   'evaluation of the solver.')
+@click.option('--seed',
+              default=None, type=int,
+              help='An optional random seed for tensorflow and numpy, '
+                   'which is required to save the trained forward model '
+                   'and vae in a cache.')
 @click.option('--normalize-ys/--no-normalize-ys',
               default=True, type=bool,
               help='Whether to normalize the y values in the Offline MBO '
@@ -84,6 +147,11 @@ import json
 @click.option('--vae-epochs',
               default=10, type=int,
               help='The number of epochs to train the VAE.')
+@click.option('--vae-cache-dir',
+              default=None, type=str,
+              help='An optional directory where the trained VAE and the '
+                   'encoded training set are shared by every latent '
+                   'space baseline with the same task and VAE arguments.')
 @click.option('--particle-lr',
               default=0.05, type=float,
               help='The learning rate used in the COMs inner loop.')
@@ -139,15 +207,39 @@ import json
               default=128, type=int,
               help='The samples to generate when solving the model-based '
                    'optimization problem.')
+@click.option('--trajectory-evaluation/--no-trajectory-evaluation',
+              default=True, type=bool,
+              help='Whether to solve the evaluation trajectory and its '
+                   'lookahead in a single compiled loop, reusing later '
+                   'steps of the trajectory as the lookahead, which is '
+                   'only exact and only used when the particle entropy '
+                   'coefficient is zero')
+@click.option('--jit-compile/--no-jit-compile',
+              default=False, type=bool,
+              help='Whether to compile the training and optimization '
+                   'steps of the forward model and vae with XLA.')
 @click.option('--fast/--not-fast',
               default=True, type=bool,
               help='Whether to run experiment quickly and only log once.')
 def coms_cleaned(
         logging_dir,
+        logger_flush_interval,
+        logger_verbosity,
+        profile_span,
         task,
         task_relabel,
         task_max_samples,
         task_distribution,
+        task_dataset_cache_dir,
+        task_dataset_seed,
+        oracle_cache_size,
+        oracle_cache_dir,
+        oracle_workers,
+        oracle_chunk_size,
+        pipeline_by_index,
+        lazy_logits,
+        model_cache_dir,
+        seed,
         normalize_ys,
         normalize_xs,
         in_latent_space,
@@ -161,6 +253,7 @@ def coms_cleaned(
         vae_batch_size,
         vae_val_size,
         vae_epochs,
+        vae_cache_dir,
         particle_lr,
         particle_train_gradient_steps,
         particle_evaluate_gradient_steps,
@@ -177,6 +270,8 @@ def coms_cleaned(
         forward_model_val_size,
         forward_model_epochs,
         evaluation_samples,
+        trajectory_evaluation,
+        jit_compile,
         fast):
     """Solve a Model-Based Optimization problem using the method:
     Conservative Objective Models (COMs).
@@ -186,10 +281,23 @@ def coms_cleaned(
     # store the command line params in a dictionary
     params = dict(
         logging_dir=logging_dir,
+        logger_flush_interval=logger_flush_interval,
+        logger_verbosity=logger_verbosity,
+        profile_span=profile_span,
         task=task,
         task_relabel=task_relabel,
         task_max_samples=task_max_samples,
         task_distribution=task_distribution,
+        task_dataset_cache_dir=task_dataset_cache_dir,
+        task_dataset_seed=task_dataset_seed,
+        oracle_cache_size=oracle_cache_size,
+        oracle_cache_dir=oracle_cache_dir,
+        oracle_workers=oracle_workers,
+        oracle_chunk_size=oracle_chunk_size,
+        pipeline_by_index=pipeline_by_index,
+        lazy_logits=lazy_logits,
+        model_cache_dir=model_cache_dir,
+        seed=seed,
         normalize_ys=normalize_ys,
         normalize_xs=normalize_xs,
         in_latent_space=in_latent_space,
@@ -203,6 +311,7 @@ def coms_cleaned(
         vae_batch_size=vae_batch_size,
         vae_val_size=vae_val_size,
         vae_epochs=vae_epochs,
+        vae_cache_dir=vae_cache_dir,
         particle_lr=particle_lr,
         particle_train_gradient_steps=
         particle_train_gradient_steps,
@@ -223,25 +332,41 @@ def coms_cleaned(
         forward_model_val_size=forward_model_val_size,
         forward_model_epochs=forward_model_epochs,
         evaluation_samples=evaluation_samples,
+        trajectory_evaluation=trajectory_evaluation,
+        jit_compile=jit_compile,
         fast=fast)
 
     # create the logger and export the experiment parameters
-    logger = Logger(logging_dir)
+    logger = Logger(logging_dir, flush_interval=logger_flush_interval,
+                    verbosity=logger_verbosity, profile_span=profile_span)
     with open(os.path.join(logging_dir, "params.json"), "w") as f:
         json.dump(params, f, indent=4)
 
+    # models are only cached when training is seeded
+    if seed is not None:
+        set_seed(seed)
+
     # create a model-based optimization task
-    task = StaticGraphTask(task, relabel=task_relabel,
-                           dataset_kwargs=dict(
-                               max_samples=task_max_samples,
-                               distribution=task_distribution))
-
-    if normalize_ys:
-        task.map_normalize_y()
-    if task.is_discrete and not in_latent_space:
-        task.map_to_logits()
-    if normalize_xs:
-        task.map_normalize_x()
+    with logger.span('task'):
+        task = StaticGraphTask(task, relabel=task_relabel,
+                               oracle_cache_size=oracle_cache_size,
+                               oracle_cache_dir=oracle_cache_dir,
+                               oracle_workers=oracle_workers,
+                               oracle_chunk_size=oracle_chunk_size,
+                               dataset_cache_dir=task_dataset_cache_dir,
+                               dataset_seed=task_dataset_seed,
+                               dataset_kwargs=dict(
+                                   max_samples=task_max_samples,
+                                   distribution=task_distribution))
+
+        if normalize_ys:
+            task.map_normalize_y()
+        if task.is_discrete and not in_latent_space and lazy_logits:
+            task.map_to_lazy_logits()
+        elif task.is_discrete and not in_latent_space:
+            task.map_to_logits()
+        if normalize_xs:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
@@ -255,25 +380,51 @@ def coms_cleaned(
 
         vae_trainer = VAETrainer(
             vae_model, optim=tf.keras.optimizers.Adam,
-            lr=vae_lr, beta=vae_beta)
+            lr=vae_lr, beta=vae_beta, jit_compile=jit_compile)
+        logger.watch(vae_trainer)
 
         # create the training task and logger
         train_data, val_data = build_pipeline(
             x=x, y=y, batch_size=vae_batch_size,
-            val_size=vae_val_size)
-
-        # estimate the number of training steps per epoch
-        vae_trainer.launch(train_data, val_data,
-                           logger, vae_epochs)
-
-        # map the x values to latent space
-        x = vae_model.encoder_cnn.predict(x)[0]
-
-        mean = np.mean(x, axis=0, keepdims=True)
-        standard_dev = np.std(x - mean, axis=0, keepdims=True)
-        x = (x - mean) / standard_dev
+            val_size=vae_val_size, by_index=pipeline_by_index)
+
+        # the dataset key is None when the subsample is not reproducible
+        dataset_key = get_dataset_key(task.task_name, task.task_kwargs,
+                                      seed=task.dataset_seed)
+        if vae_cache_dir is not None and seed is not None \
+                and dataset_key is not None:
+
+            # restore a VAE and latent dataset shared by latent baselines
+            vae_cache = VAECache(vae_cache_dir)
+            vae_key = vae_cache.get_key(
+                dataset=dataset_key,
+                hidden_size=vae_hidden_size, latent_size=vae_latent_size,
+                activation=vae_activation, kernel_size=vae_kernel_size,
+                num_blocks=vae_num_blocks, lr=vae_lr, beta=vae_beta,
+                batch_size=vae_batch_size, val_size=vae_val_size,
+                epochs=vae_epochs, seed=seed)
+            with logger.span('vae'):
+                vae_cache.launch(vae_key, vae_trainer, train_data, val_data,
+                                 logger, vae_epochs)
+            x, mean, standard_dev = vae_cache.encode(vae_key, vae_model, x)
+
+        else:
+
+            # estimate the number of training steps per epoch
+            with logger.span('vae'):
+                vae_trainer.launch(train_data, val_data,
+                                   logger, vae_epochs)
+
+            # map the x values to latent space
+            x = vae_model.encoder_cnn.predict(x)[0]
+
+            mean = np.mean(x, axis=0, keepdims=True)
+            standard_dev = np.std(x - mean, axis=0, keepdims=True)
+            x = (x - mean) / standard_dev
 
     input_shape = x.shape[1:]
+    if task.is_lazy_logits:
+        input_shape = list(input_shape) + [task.num_classes - 1]
 
     # compute the normalized learning rate of the model
     particle_lr = particle_lr * np.sqrt(np.prod(input_shape))
@@ -292,20 +443,60 @@ def coms_cleaned(
         overestimation_limit=forward_model_overestimation_limit,
         particle_lr=particle_lr, noise_std=forward_model_noise_std,
         particle_gradient_steps=particle_train_gradient_steps,
-        entropy_coefficient=particle_entropy_coefficient)
+        entropy_coefficient=particle_entropy_coefficient,
+        jit_compile=jit_compile)
+    logger.watch(trainer)
 
     # create a data set
     train_data, validate_data = build_pipeline(
         x=x, y=y, batch_size=forward_model_batch_size,
-        val_size=forward_model_val_size)
-
-    # train the forward model
-    trainer.launch(train_data, validate_data,
-                   logger, forward_model_epochs)
+        val_size=forward_model_val_size, by_index=pipeline_by_index)
+
+    if task.is_lazy_logits:
+
+        # convert only the designs in every batch to logits
+        def map_to_logits(x, *rest):
+            return (task.lazy_to_logits(x), *rest)
+
+        train_data = train_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        validate_data = validate_data.map(
+            map_to_logits, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    if model_cache_dir is not None and seed is not None \
+            and not in_latent_space:
+
+        # restore the forward model when an identical one was trained before
+        cache = ModelCache(model_cache_dir)
+        key = cache.get_key(seed=seed, model='coms_cleaned', **{
+            name: params[name] for name in (
+                'task', 'task_relabel', 'task_max_samples',
+                'task_distribution', 'task_dataset_seed', 'normalize_ys',
+                'normalize_xs', 'lazy_logits', 'particle_lr',
+                'particle_train_gradient_steps',
+                'particle_entropy_coefficient',
+                'forward_model_activations', 'forward_model_hidden_size',
+                'forward_model_final_tanh', 'forward_model_lr',
+                'forward_model_alpha', 'forward_model_alpha_lr',
+                'forward_model_overestimation_limit',
+                'forward_model_noise_std', 'forward_model_batch_size',
+                'forward_model_val_size', 'forward_model_epochs')})
+        with logger.span('ensemble'):
+            cache.launch(key, trainer, train_data, validate_data,
+                         logger, forward_model_epochs)
+
+    else:
+
+        # train the forward model
+        with logger.span('ensemble'):
+            trainer.launch(train_data, validate_data,
+                           logger, forward_model_epochs)
 
     # select the top k initial designs from the dataset
     indices = tf.math.top_k(y[:, 0], k=evaluation_samples)[1]
     initial_x = tf.gather(x, indices, axis=0)
+    if task.is_lazy_logits:
+        initial_x = task.lazy_to_logits(initial_x)
     initial_y = tf.gather(y, indices, axis=0)
     xt = initial_x
 
@@ -320,7 +511,8 @@ def coms_cleaned(
             logits = vae_model.decoder_cnn.predict(solution)
             solution = tf.argmax(logits, axis=2, output_type=tf.int32)
 
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
 
         if normalize_ys:
             initial_y = task.denormalize_y(initial_y)
@@ -329,15 +521,42 @@ def coms_cleaned(
         logger.record(f"dataset_score", initial_y, 0, percentile=True)
         logger.record(f"score", score, 0, percentile=True)
 
+    # the entropy bonus pairs particles randomly at every step, so later
+    # steps of the trajectory only equal the lookahead without it
+    trajectory_evaluation = trajectory_evaluation and \
+        particle_entropy_coefficient == 0.0
+
+    if trajectory_evaluation:
+
+        # solve for every solution particle and the lookahead in one loop,
+        # the lookahead from step t is the trajectory at step t + train steps
+        with logger.span('solver'):
+            xs, all_predictions = trainer.optimize_trajectory(
+                initial_x, particle_evaluate_gradient_steps +
+                particle_train_gradient_steps, training=False)
+
     for step in range(1, 1 + particle_evaluate_gradient_steps):
 
         # update the set of solution particles
-        xt = trainer.optimize(xt, 1, training=False)
-        final_xt = trainer.optimize(
-            xt, particle_train_gradient_steps, training=False)
+        if trajectory_evaluation:
+            xt = xs[step]
+        else:
+            with logger.span('solver'):
+                xt = trainer.optimize(xt, 1, training=False)
 
         if not fast or step == particle_evaluate_gradient_steps:
 
+            if trajectory_evaluation:
+                prediction = all_predictions[step].numpy()
+                final_prediction = all_predictions[
+                    step + particle_train_gradient_steps].numpy()
+            else:
+                final_xt = trainer.optimize(
+                    xt, particle_train_gradient_steps, training=False)
+                prediction = forward_model(xt, training=False).numpy()
+                final_prediction = forward_model(
+                    final_xt, training=False).numpy()
+
             solution = xt
             if task.is_discrete and in_latent_space:
                 solution = solution * standard_dev + mean
@@ -347,9 +566,8 @@ def coms_cleaned(
             np.save(os.path.join(logging_dir, "solution.npy"), solution)
 
             # evaluate the solutions found by the model
-            score = task.predict(solution)
-            prediction = forward_model(xt, training=False).numpy()
-            final_prediction = forward_model(final_xt, training=False).numpy()
+            with logger.span('oracle'):
+                score = task.predict(solution)
 
             if normalize_ys:
                 score = task.denormalize_y(score)
@@ -380,6 +598,17 @@ def coms_cleaned(
             np.save(os.path.join(logging_dir, "predictions.npy"),
                     np.stack(predictions, axis=1))
 
+    if task.oracle_cache is not None:
+
+        # record how many oracle calls were avoided by the cache
+        for name, value in task.oracle_cache.get_statistics().items():
+            logger.record(f"oracle_cache/{name}", float(value),
+                          particle_evaluate_gradient_steps)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
+
 
 # run COMs using the command line interface
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 from design_baselines.utils import spearman
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow_probability as tfp
@@ -14,7 +15,8 @@ class ConservativeObjectiveModel(tf.Module):
                  alpha_opt=tf.keras.optimizers.Adam,
                  alpha_lr=0.01, overestimation_limit=0.5,
                  particle_lr=0.05, particle_gradient_steps=50,
-                 entropy_coefficient=0.9, noise_std=0.0):
+                 entropy_coefficient=0.9, noise_std=0.0,
+                 jit_compile=False):
         """A trainer class for building a conservative objective model
         by optimizing a model to make conservative predictions
 
@@ -53,6 +55,9 @@ class ConservativeObjectiveModel(tf.Module):
         noise_std: float
             the standard deviation of the gaussian noise added to
             designs when training the forward model
+        jit_compile: bool
+            whether to compile the training and optimization steps
+            with XLA, which fuses the small operations of the model
         """
 
         super().__init__()
@@ -72,6 +77,10 @@ class ConservativeObjectiveModel(tf.Module):
         self.entropy_coefficient = entropy_coefficient
         self.noise_std = noise_std
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'optimize', 'optimize_trajectory', 'train_step',
+                        'validate_step', jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def optimize(self, x, steps, **kwargs):
         """Using gradient descent find adversarial versions of x
@@ -95,30 +104,95 @@ class ConservativeObjectiveModel(tf.Module):
 
         # gradient ascent on the conservatism
         def gradient_step(xt):
-            with tf.GradientTape() as tape:
-                tape.watch(xt)
+            return self.particle_step(xt, **kwargs)[0],
 
-                # shuffle the designs for calculating entropy
-                shuffled_xt = tf.gather(
-                    xt, tf.random.shuffle(tf.range(tf.shape(xt)[0])))
+        # use a while loop to perform gradient ascent on the score
+        return tf.while_loop(
+            lambda xt: True, gradient_step, (x,),
+            maximum_iterations=steps)[0]
 
-                # entropy using the gaussian kernel
-                entropy = tf.reduce_mean((xt - shuffled_xt) ** 2)
+    @tf.function(experimental_relax_shapes=True)
+    def optimize_trajectory(self, x, steps, **kwargs):
+        """Using gradient descent find adversarial versions of x and
+        record every intermediate design and its predicted score
 
-                # the predicted score according to the forward model
-                score = self.forward_model(xt, **kwargs)
+        Args:
 
-                # the conservatism of the current set of particles
-                loss = self.entropy_coefficient * entropy + score
+        x: tf.Tensor
+            the starting point for the optimizer that will be
+            updated using gradient ascent
+        steps: int
+            the number of gradient ascent steps to take in order to
+            find x that maximizes conservatism
 
-            # update the particles to maximize the conservatism
-            return tf.stop_gradient(
-                xt + self.particle_lr * tape.gradient(loss, xt)),
+        Returns:
+
+        xs: tf.Tensor
+            the designs visited by the optimizer shaped like
+            [steps + 1, batch_size, channels], starting with x
+        predictions: tf.Tensor
+            the score predicted for every visited design shaped like
+            [steps + 1, batch_size, 1]
+        """
+
+        # record the design and score before every gradient step
+        def gradient_step(i, xt, xs, predictions):
+            next_xt, score = self.particle_step(xt, **kwargs)
+            return i + 1, next_xt, \
+                xs.write(i, xt), predictions.write(i, score)
+
+        xs = tf.TensorArray(x.dtype, size=steps + 1)
+        predictions = tf.TensorArray(tf.float32, size=steps + 1)
 
         # use a while loop to perform gradient ascent on the score
-        return tf.while_loop(
-            lambda xt: True, gradient_step, (x,),
-            maximum_iterations=steps)[0]
+        i, xt, xs, predictions = tf.while_loop(
+            lambda i, xt, xs, predictions: True, gradient_step,
+            (tf.constant(0), x, xs, predictions),
+            maximum_iterations=steps)
+
+        # record the design reached by the final gradient step
+        xs = xs.write(steps, xt)
+        predictions = predictions.write(
+            steps, self.forward_model(xt, **kwargs))
+        return xs.stack(), predictions.stack()
+
+    def particle_step(self, xt, **kwargs):
+        """Take a single step of gradient ascent on the conservatism
+        of a batch of solution particles
+
+        Args:
+
+        xt: tf.Tensor
+            the current solution particles that will be updated
+            using gradient ascent
+
+        Returns:
+
+        next_xt: tf.Tensor
+            the solution particles after one gradient ascent step
+        score: tf.Tensor
+            the score predicted by the forward model for xt
+        """
+
+        with tf.GradientTape() as tape:
+            tape.watch(xt)
+
+            # shuffle the designs for calculating entropy
+            shuffled_xt = tf.gather(
+                xt, tf.random.shuffle(tf.range(tf.shape(xt)[0])))
+
+            # entropy using the gaussian kernel
+            entropy = tf.reduce_mean((xt - shuffled_xt) ** 2)
+
+            # the predicted score according to the forward model
+            score = self.forward_model(xt, **kwargs)
+
+            # the conservatism of the current set of particles
+            loss = self.entropy_coefficient * entropy + score
+
+        # update the particles to maximize the conservatism
+        return tf.stop_gradient(
+            xt + self.particle_lr * tape.gradient(loss, xt)), score
 
     @tf.function(experimental_relax_shapes=True)
     def train_step(self, x, y):
@@ -287,9 +361,26 @@ class ConservativeObjectiveModel(tf.Module):
 
         for e in range(epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+    def get_saveables(self):
+        """Collects and returns stateful objects that are serializeable
+        using the tensorflow checkpoint format
+
+        Returns:
+
+        saveables: dict
+            a dict containing stateful objects compatible with checkpoints
+        """
+
+        saveables = dict()
+        saveables['forward_model'] = self.forward_model
+        saveables['forward_model_opt'] = self.forward_model_opt
+        saveables['log_alpha'] = self.log_alpha
+        saveables['alpha_opt'] = self.alpha_opt
+        return saveables
 
 
 class VAETrainer(tf.Module):
@@ -297,7 +388,8 @@ class VAETrainer(tf.Module):
     def __init__(self,
                  vae,
                  optim=tf.keras.optimizers.Adam,
-                 lr=0.001, beta=1.0):
+                 lr=0.001, beta=1.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -309,6 +401,9 @@ class VAETrainer(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -318,6 +413,10 @@ class VAETrainer(tf.Module):
         # create optimizers for each model in the ensemble
         self.vae_optim = optim(learning_rate=lr)
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x):
@@ -466,6 +565,21 @@ class VAETrainer(tf.Module):
 
         for e in range(epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+    def get_saveables(self):
+        """Collects and returns stateful objects that are serializeable
+        using the tensorflow checkpoint format
+
+        Returns:
+
+        saveables: dict
+            a dict containing stateful objects compatible with checkpoints
+        """
+
+        saveables = dict()
+        saveables['vae'] = self.vae
+        saveables['vae_optim'] = self.vae_optim
+        return saveables
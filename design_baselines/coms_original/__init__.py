@@ -21,8 +21,12 @@ def coms_original(config):
     """
 
     # create the training task and logger
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
 
     # save the initial dataset statistics for safe keeping
     x = task.x
@@ -93,7 +97,8 @@ def coms_original(config):
         solver_steps=config['solver_steps'],
         constraint_type=config['constraint_type'],
         entropy_coefficient=config['entropy_coefficient'],
-        continuous_noise_std=config.get('continuous_noise_std', 0.0))
+        continuous_noise_std=config.get('continuous_noise_std', 0.0),
+        jit_compile=config.get('jit_compile', False))
 
     # make a neural network to predict scores
     validation_models = [ForwardModel(
@@ -110,6 +115,7 @@ def coms_original(config):
         continuous_noise_std=config.get('continuous_noise_std', 0.0),
         logger_prefix=f"validation_model_{i}")
         for i, model in enumerate(validation_models)]
+    logger.watch(trainer, *validation_trainers)
 
     # create a data set
     train_data, validate_data = task.build(
@@ -118,8 +124,9 @@ def coms_original(config):
         val_size=config['val_size'])
 
     # train the validation models
-    for t in validation_trainers:
-        t.launch(train_data, validate_data, logger, 100)
+    with logger.span('ensemble'):
+        for t in validation_trainers:
+            t.launch(train_data, validate_data, logger, 100)
 
     # select the top k initial designs from the dataset
     indices = tf.math.top_k(y[:, 0], k=config['batch_size'])[1]
@@ -163,7 +170,8 @@ def coms_original(config):
             if config['is_discrete']:
                 solution = tf.math.softmax(
                     tf.pad(solution, [[0, 0], [0, 0], [1, 0]]) / 0.001)
-            score = task.score(solution)
+            with logger.span('oracle'):
+                score = task.score(solution)
             logger.record("score", score, evaluations, percentile=True)
             logger.record(f"rank_corr/model_to_real",
                           spearman(model[:, 0], score[:, 0]), evaluations)
@@ -178,39 +186,44 @@ def coms_original(config):
     predictions = []
 
     # train model for many epochs with conservatism
-    for e in range(config['epochs']):
-
-        statistics = defaultdict(list)
-        for x, y in train_data:
-            for name, tensor in trainer.train_step(x, y).items():
-                statistics[name].append(tensor)
-
-            # evaluate the current solution
-            if tf.logical_and(
-                    tf.equal(tf.math.mod(trainer.step, interval), 0),
-                    tf.math.greater_equal(trainer.step, warmup)):
-                score, model = evaluate_solution(trainer.solution)
-                scores.append(score)
-                predictions.append(model.numpy())
-
-        for name in statistics.keys():
-            logger.record(
-                name, tf.concat(statistics[name], axis=0), e)
-
-        statistics = defaultdict(list)
-        for x, y in validate_data:
-            for name, tensor in trainer.validate_step(x, y).items():
-                statistics[name].append(tensor)
-
-        for name in statistics.keys():
-            logger.record(
-                name, tf.concat(statistics[name], axis=0), e)
-
-        if tf.reduce_all(trainer.done):
-            break
+    with logger.span('solver'):
+        for e in range(config['epochs']):
+
+            statistics = defaultdict(list)
+            for x, y in train_data:
+                for name, tensor in trainer.train_step(x, y).items():
+                    statistics[name].append(tensor)
+
+                # evaluate the current solution
+                if tf.logical_and(
+                        tf.equal(tf.math.mod(trainer.step, interval), 0),
+                        tf.math.greater_equal(trainer.step, warmup)):
+                    score, model = evaluate_solution(trainer.solution)
+                    scores.append(score)
+                    predictions.append(model.numpy())
+
+            for name in statistics.keys():
+                logger.record(
+                    name, tf.concat(statistics[name], axis=0), e)
+
+            statistics = defaultdict(list)
+            for x, y in validate_data:
+                for name, tensor in trainer.validate_step(x, y).items():
+                    statistics[name].append(tensor)
+
+            for name in statistics.keys():
+                logger.record(
+                    name, tf.concat(statistics[name], axis=0), e)
+
+            if tf.reduce_all(trainer.done):
+                break
 
     # save the model predictions and scores to be aggregated later
     np.save(os.path.join(config['logging_dir'], "scores.npy"),
             np.concatenate(scores, axis=1))
     np.save(os.path.join(config['logging_dir'], "predictions.npy"),
             np.stack(predictions, axis=1))
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
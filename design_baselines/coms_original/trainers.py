@@ -1,5 +1,6 @@
 from design_baselines.utils import spearman
 from design_baselines.utils import cont_noise
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 import tensorflow_probability as tfp
 import tensorflow as tf
@@ -26,7 +27,8 @@ class ConservativeMaximumLikelihood(tf.Module):
                  solver_steps=1,
                  constraint_type="mix",
                  entropy_coefficient=0.9,
-                 continuous_noise_std=0.0):
+                 continuous_noise_std=0.0,
+                 jit_compile=False):
         """Build a trainer for an conservative forward model trained using
         an adversarial negative sampling procedure.
 
@@ -83,6 +85,9 @@ class ConservativeMaximumLikelihood(tf.Module):
         continuous_noise_std: float
             standard deviation of gaussian noise added to the design variable
             x while training the forward model
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -121,6 +126,10 @@ class ConservativeMaximumLikelihood(tf.Module):
         self.particle_constraint = None
         self.done = None
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'lookahead', 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def lookahead(self,
                   x,
@@ -218,7 +227,9 @@ class ConservativeMaximumLikelihood(tf.Module):
 
             multiplier_loss = 0.0
             last_weight = self.forward_model.trainable_variables[-1]
-            if tf.shape(tf.reshape(last_weight, [-1]))[0] == 1:
+
+            # check the static shape so that no branch is traced for xla
+            if last_weight.shape.num_elements() == 1:
                 statistics[f'train/tanh_multipier'] = \
                     self.forward_model.trainable_variables[-1]
 
@@ -344,7 +355,8 @@ class TransformedMaximumLikelihood(tf.Module):
                  forward_model_optim=tf.keras.optimizers.Adam,
                  forward_model_lr=0.001,
                  logger_prefix="",
-                 continuous_noise_std=0.0):
+                 continuous_noise_std=0.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -356,6 +368,9 @@ class TransformedMaximumLikelihood(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -365,6 +380,10 @@ class TransformedMaximumLikelihood(tf.Module):
         self.forward_model_optim = \
             forward_model_optim(learning_rate=forward_model_lr)
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x,
@@ -402,7 +421,9 @@ class TransformedMaximumLikelihood(tf.Module):
 
             multiplier_loss = 0.0
             last_weight = self.forward_model.trainable_variables[-1]
-            if tf.shape(tf.reshape(last_weight, [-1]))[0] == 1:
+
+            # check the static shape so that no branch is traced for xla
+            if last_weight.shape.num_elements() == 1:
                 statistics[f'{self.logger_prefix}/train/tanh_multipier'] = \
                     self.forward_model.trainable_variables[-1]
 
@@ -525,6 +546,6 @@ class TransformedMaximumLikelihood(tf.Module):
 
         for e in range(epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
@@ -1,12 +1,24 @@
 from design_bench.task import Task
 from design_bench import make
 from tensorflow.data import Dataset
+from design_baselines.utils import get_cache_dir
+from design_baselines.synthetic import SYNTHETIC_TASKS, make_synthetic
+from design_baselines.synthetic import ArrayTask, SyntheticDataset
+from design_baselines.synthetic import get_statistics
+from collections import OrderedDict
 import tensorflow as tf
 import numpy as np
+import multiprocessing
+import hashlib
+import shutil
+import json
+import math
+import os
 
 
 def build_pipeline(x, y, w=None, val_size=200, batch_size=128,
-                   bootstraps=0, bootstraps_noise=None, buffer=None):
+                   bootstraps=0, bootstraps_noise=None, buffer=None,
+                   by_index=False):
     """Split a model-based optimization dataset consisting of a set of design
     values x and prediction values y into a training and validation set,
     supporting bootstrapping and importance weighting
@@ -34,6 +46,10 @@ def build_pipeline(x, y, w=None, val_size=200, batch_size=128,
     bootstraps_noise: float
         the standard deviation of zero mean gaussian noise independently
         sampled and added to each bootstrap of the dataset
+    by_index: bool
+        whether to leave x, y, and w in place as numpy or memory mapped
+        arrays and shuffle only a permutation of indices, gathering every
+        batch from the arrays when it is read
 
     Returns:
 
@@ -46,6 +62,12 @@ def build_pipeline(x, y, w=None, val_size=200, batch_size=128,
 
     """
 
+    if by_index:
+        return build_index_pipeline(
+            x, y, w=w, val_size=val_size, batch_size=batch_size,
+            bootstraps=bootstraps, bootstraps_noise=bootstraps_noise,
+            buffer=buffer)
+
     # shuffle the dataset using a common set of indices
     indices = np.arange(x.shape[0])
     np.random.shuffle(indices)
@@ -89,6 +111,804 @@ def build_pipeline(x, y, w=None, val_size=200, batch_size=128,
             validation_dataset.prefetch(tf.data.experimental.AUTOTUNE))
 
 
+def build_index_pipeline(x, y, w=None, val_size=200, batch_size=128,
+                         bootstraps=0, bootstraps_noise=None, buffer=None):
+    """Split a model-based optimization dataset into a training and
+    validation set without copying it, where only a permutation of int32
+    indices is shuffled and every batch is gathered from x and y by index
+
+    Args:
+
+    x: np.ndarray
+        an array containing design values from a model-based optimization
+        dataset, which may be memory mapped from the disk
+    y: np.ndarray
+        an array containing prediction values from a model-based
+        optimization dataset, which may be memory mapped from the disk
+    w: None or np.ndarray
+        an optional array of the same shape as y that specifies the
+        importance weight of samples in a model-based optimization dataset
+    val_size: int
+        the number of samples randomly chosen to be in the validation set
+        returned by the function
+    batch_size: int
+        the number of samples to load in every batch when drawing samples
+        from the training and validation sets
+    bootstraps: int
+        the number of copies of the dataset to draw with replacement
+        for training an ensemble of forward models
+    bootstraps_noise: float
+        the standard deviation of zero mean gaussian noise independently
+        sampled and added to each bootstrap of the dataset
+    buffer: int
+        the size of the shuffle buffer of training indices, where None
+        reshuffles every training index each epoch
+
+    Returns:
+
+    training_dataset: tf.data.Dataset
+        a tensorflow dataset that has been batched and prefetched
+        with an optional importance weight and optional bootstrap included
+    validation_dataset: tf.data.Dataset
+        a tensorflow dataset that has been batched and prefetched
+
+    """
+
+    # convert tensors without copying arrays that are already numpy
+    x = x.numpy() if isinstance(x, tf.Tensor) else x
+    y = y.numpy() if isinstance(y, tf.Tensor) else y
+    w = w.numpy() if isinstance(w, tf.Tensor) else w
+
+    # shuffle the dataset using a common set of indices
+    indices = np.arange(x.shape[0], dtype=np.int32)
+    np.random.shuffle(indices)
+    train_indices = indices[val_size:]
+    size = x.shape[0] - val_size
+
+    columns = []
+    if bootstraps > 0:
+
+        # sample the data set with replacement
+        columns.append(tf.stack([
+            tf.math.bincount(tf.random.uniform([size], minval=0,
+                                               maxval=size, dtype=tf.int32),
+                             minlength=size, dtype=tf.float32)
+            for b in range(bootstraps)], axis=1))
+
+        # add noise to the labels to increase diversity
+        if bootstraps_noise is not None:
+            columns.append(bootstraps_noise *
+                           tf.random.normal([size, bootstraps]))
+
+    def gather(arrays, i):
+        # read the rows of every array in place, sorted for locality
+        order = np.argsort(i, kind='stable')
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(order.shape[0])
+        return tuple(a[i[order]][inverse] for a in arrays)
+
+    def gather_fn(arrays):
+        def fn(i):
+            batch = tf.numpy_function(
+                lambda j: gather(arrays, j), [i],
+                [tf.as_dtype(a.dtype) for a in arrays])
+            for tensor, a in zip(batch, arrays):
+                tensor.set_shape([None, *a.shape[1:]])
+            return batch
+        return fn
+
+    arrays = [x, y] if w is None else [x, y, w]
+    gather_train = gather_fn(arrays)
+    gather_validate = gather_fn([x, y])
+
+    def map_train(position):
+        batch = gather_train(tf.gather(train_indices, position))
+        return (*batch[:2], *[tf.gather(c, position)
+                              for c in columns], *batch[2:])
+
+    # shuffle only the positions of training samples every epoch
+    training_dataset = Dataset.range(size).shuffle(
+        size if buffer is None else buffer).batch(batch_size).map(
+        map_train, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    validation_dataset = Dataset.from_tensor_slices(
+        indices[:val_size]).batch(batch_size).map(
+        gather_validate, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    return (training_dataset.prefetch(tf.data.experimental.AUTOTUNE),
+            validation_dataset.prefetch(tf.data.experimental.AUTOTUNE))
+
+
+class DesignStore(tf.Module):
+
+    def __init__(self,
+                 x,
+                 y,
+                 capacity=None):
+        """Build an append only store of designs and scores in device
+        memory whose capacity doubles when it fills, so that growing a
+        model-based optimization dataset costs time proportional to the
+        number of new samples rather than the size of the dataset
+
+        Args:
+
+        x: tf.Tensor
+            a tensor containing the initial design values shaped like
+            [num_samples, ...], typically taken from task.x
+        y: tf.Tensor
+            a tensor containing the initial prediction values shaped like
+            [num_samples, 1], typically taken from task.y
+        capacity: int
+            the number of samples to allocate memory for initially,
+            which defaults to twice the number of initial samples
+        """
+
+        super(DesignStore, self).__init__()
+        x = tf.convert_to_tensor(x)
+        y = tf.convert_to_tensor(y)
+        size = int(x.shape[0])
+        capacity = max(capacity or 2 * size, size, 1)
+
+        # preallocate storage with a leading dimension that can grow
+        self.xs = tf.Variable(tf.zeros([capacity, *x.shape[1:]], x.dtype),
+                              shape=[None, *x.shape[1:]], trainable=False)
+        self.ys = tf.Variable(tf.zeros([capacity, *y.shape[1:]], y.dtype),
+                              shape=[None, *y.shape[1:]], trainable=False)
+
+        # mirror the scores on the host for the importance weights
+        self.ys_numpy = np.zeros([capacity, *y.shape[1:]],
+                                 y.dtype.as_numpy_dtype)
+        self.capacity = capacity
+        self.size = 0
+        self.append(x, y)
+
+    @property
+    def x(self):
+        """Returns the design values of every sample in the store as a
+        tensor shaped like [size, ...]
+        """
+
+        return self.xs[:self.size]
+
+    @property
+    def y(self):
+        """Returns the prediction values of every sample in the store as
+        a tensor shaped like [size, 1]
+        """
+
+        return self.ys[:self.size]
+
+    @property
+    def y_numpy(self):
+        """Returns a view of the prediction values of every sample in
+        the store as a numpy array shaped like [size, 1], which is valid
+        until the next sample is appended
+        """
+
+        return self.ys_numpy[:self.size]
+
+    def append(self, x, y):
+        """Write a batch of samples after the last sample in the store,
+        doubling the capacity of the store when the batch does not fit
+
+        Args:
+
+        x: tf.Tensor
+            a tensor containing new design values shaped like
+            [batch_size, ...]
+        y: tf.Tensor
+            a tensor containing new prediction values shaped like
+            [batch_size, 1]
+        """
+
+        batch_size = int(x.shape[0])
+        if self.size + batch_size > self.capacity:
+
+            # amortize reallocation by growing geometrically
+            capacity = self.capacity
+            while self.size + batch_size > capacity:
+                capacity *= 2
+            for variable in (self.xs, self.ys):
+                variable.assign(tf.concat([variable, tf.zeros(
+                    [capacity - self.capacity, *variable.shape[1:]],
+                    variable.dtype)], axis=0))
+            self.ys_numpy = np.concatenate([self.ys_numpy, np.zeros(
+                [capacity - self.capacity, *self.ys_numpy.shape[1:]],
+                self.ys_numpy.dtype)], axis=0)
+            self.capacity = capacity
+
+        # write only the new samples into the live prefix
+        self.xs[self.size:self.size + batch_size].assign(
+            tf.cast(x, self.xs.dtype))
+        self.ys[self.size:self.size + batch_size].assign(
+            tf.cast(y, self.ys.dtype))
+        self.ys_numpy[self.size:self.size + batch_size] = np.asarray(y)
+        self.size += batch_size
+
+    def rewind(self, size):
+        """Discard every sample written after the first size samples,
+        which is used to remove temporary samples from the store
+
+        Args:
+
+        size: int
+            the number of samples to keep at the front of the store
+        """
+
+        self.size = min(self.size, size)
+
+    def build_pipeline(self, w=None, val_size=200,
+                       batch_size=128, buffer=None):
+        """Split the samples in the store into a training and validation
+        set whose batches are gathered from the store when they are read,
+        so that no copy of the dataset is made
+
+        Args:
+
+        w: None or tf.Tensor
+            an optional tensor shaped like [size, 1] that specifies the
+            importance weight of every sample in the store
+        val_size: int
+            the number of samples randomly chosen to be in the validation set
+            returned by the function
+        batch_size: int
+            the number of samples to load in every batch when drawing samples
+            from the training and validation sets
+        buffer: int
+            the size of the shuffle buffer for the training set, where
+            None shuffles every training sample
+
+        Returns:
+
+        training_dataset: tf.data.Dataset
+            a tensorflow dataset that has been batched and prefetched
+            with an optional importance weight included
+        validation_dataset: tf.data.Dataset
+            a tensorflow dataset that has been batched and prefetched
+        """
+
+        # shuffle the live prefix of the store using indices only
+        indices = np.arange(self.size)
+        np.random.shuffle(indices)
+        size = self.size - val_size
+        w = None if w is None else tf.convert_to_tensor(w, tf.float32)
+
+        def gather_train(i):
+            batch = (tf.gather(self.xs, i), tf.gather(self.ys, i))
+            return batch if w is None else (*batch, tf.gather(w, i))
+
+        def gather_validate(i):
+            return tf.gather(self.xs, i), tf.gather(self.ys, i)
+
+        # build the parallel tensorflow data loading pipeline
+        training_dataset = Dataset.from_tensor_slices(indices[val_size:])
+        validation_dataset = Dataset.from_tensor_slices(indices[:val_size])
+        training_dataset = training_dataset.shuffle(
+            size if buffer is None else buffer)
+
+        # batch the indices and gather each batch from the store
+        training_dataset = training_dataset.batch(batch_size).map(
+            gather_train, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        validation_dataset = validation_dataset.batch(batch_size).map(
+            gather_validate, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        return (training_dataset.prefetch(tf.data.experimental.AUTOTUNE),
+                validation_dataset.prefetch(tf.data.experimental.AUTOTUNE))
+
+
+class OracleCache(object):
+
+    def __init__(self,
+                 max_size=100000,
+                 cache_dir=None):
+        """Build a content addressed cache of scores returned by an
+        expensive oracle, where designs are identified by a hash of their
+        bytes and the most recently used scores are kept in memory
+
+        Args:
+
+        max_size: int
+            the maximum number of scores kept in memory before the least
+            recently used scores are evicted
+        cache_dir: str
+            an optional directory where every score is also saved so that
+            it persists between experiments
+        """
+
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            tf.io.gfile.makedirs(cache_dir)
+
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_path(self,
+                 key):
+        """Returns the path where a single score is persisted on the disk,
+        sharded by the first characters of its key
+
+        Args:
+
+        key: str
+            the hash of a design and the state of the task
+
+        Returns:
+
+        path: str
+            the path to a numpy file in the cache directory
+        """
+
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def lookup(self,
+               key):
+        """Find the score of a single design in memory or on the disk,
+        and mark the score as recently used
+
+        Args:
+
+        key: str
+            the hash of a design and the state of the task
+
+        Returns:
+
+        y: np.ndarray
+            the cached score of the design, or None on a cache miss
+        """
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.cache_dir is not None and os.path.exists(self.get_path(key)):
+            y = np.load(self.get_path(key))
+            self.insert(key, y, persist=False)
+            return y
+        return None
+
+    def insert(self,
+               key,
+               y,
+               persist=True):
+        """Store the score of a single design in memory and optionally on
+        the disk, evicting the least recently used scores
+
+        Args:
+
+        key: str
+            the hash of a design and the state of the task
+        y: np.ndarray
+            the score of the design returned by the oracle
+        persist: bool
+            whether to also save the score in the cache directory
+        """
+
+        self.entries[key] = y
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+        if persist and self.cache_dir is not None:
+            path = self.get_path(key)
+            tf.io.gfile.makedirs(os.path.dirname(path))
+            temp = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(temp, y)
+            os.replace(temp, path)
+
+    def predict(self,
+                predict_fn,
+                x_batch,
+                namespace="",
+                key_batch=None):
+        """Score a batch of designs by sending only the designs missing
+        from the cache to the oracle and scattering the scores back
+
+        Args:
+
+        predict_fn: Callable
+            the oracle that accepts a batch of designs and returns a
+            batch of scores shaped like [batch_size, 1]
+        x_batch: np.ndarray
+            a batch of designs shaped like [batch_size, ...]
+        namespace: str
+            a string that identifies the oracle and the state of the task
+            which is hashed together with every design
+        key_batch: np.ndarray
+            an optional batch of the same designs in the format that is
+            hashed, such as the original format of the dataset, which
+            defaults to x_batch
+
+        Returns:
+
+        y_batch: np.ndarray
+            a batch of scores shaped like [batch_size, 1]
+        """
+
+        key_batch = key_batch if key_batch is not None else x_batch
+        keys = [hashlib.sha1(namespace.encode('utf-8') + str(
+            x.dtype).encode('utf-8') + np.ascontiguousarray(
+            x).tobytes()).hexdigest() for x in key_batch]
+
+        # find which designs need to be scored by the oracle
+        y_batch = [self.lookup(key) for key in keys]
+        missing = OrderedDict()
+        for i, (key, y) in enumerate(zip(keys, y_batch)):
+            if y is None:
+                missing.setdefault(key, []).append(i)
+
+        self.hits += len(keys) - sum(len(v) for v in missing.values())
+        self.misses += sum(len(v) for v in missing.values())
+
+        if len(missing) > 0:
+
+            # score each unique missing design exactly once
+            indices = [v[0] for v in missing.values()]
+            new_y = predict_fn(x_batch[indices])
+            for (key, positions), y in zip(missing.items(), new_y):
+                self.insert(key, y)
+                for i in positions:
+                    y_batch[i] = y
+
+        if len(y_batch) == 0:
+            return predict_fn(x_batch)
+        return np.stack(y_batch, axis=0)
+
+    def get_statistics(self):
+        """Returns counters that describe how effective the cache has been
+        at avoiding calls to the oracle
+
+        Returns:
+
+        statistics: dict
+            a dictionary containing the number of hits, misses, and the
+            number of scores currently held in memory
+        """
+
+        return dict(hits=self.hits, misses=self.misses,
+                    size=len(self.entries))
+
+
+def get_dataset_key(task_name, task_kwargs, seed=None):
+    """Returns a key that identifies the dataset of a task, which depends
+    on the task, whether it is relabelled, how it is subsampled, and the
+    random seed, but not on how the arguments are spelled
+
+    Args:
+
+    task_name: str
+        the name to a valid task using design_bench.make(task_name)
+    task_kwargs: dict
+        additional keyword arguments that are passed to design_bench.make
+    seed: int
+        the seed of the random number generator used when subsampling
+
+    Returns:
+
+    key: str
+        the hash of the arguments that determine the dataset, or None when
+        the dataset is subsampled at random without a seed and so cannot
+        be reproduced by another experiment
+    """
+
+    dataset_kwargs = task_kwargs.get('dataset_kwargs', None) or {}
+    if dataset_kwargs.get('max_samples', None) is not None and seed is None:
+        return None
+
+    # arguments such as the oracle or synthetic dataset also matter
+    other_kwargs = sorted((k, v) for k, v in task_kwargs.items()
+                          if k not in ('relabel', 'dataset_kwargs'))
+    return hashlib.sha1(repr((
+        task_name, bool(task_kwargs.get('relabel', False)),
+        dataset_kwargs.get('max_samples', None),
+        dataset_kwargs.get('distribution', None),
+        dataset_kwargs.get('min_percentile', 0.0),
+        dataset_kwargs.get('max_percentile', 100.0),
+        seed, other_kwargs)).encode('utf-8')).hexdigest()
+
+
+class DatasetCache(object):
+
+    def __init__(self,
+                 cache_dir=None):
+        """Build a persistent cache of the designs and scores of relabelled
+        and subsampled task datasets, saved as arrays on the disk that are
+        memory mapped when they are loaded
+
+        Args:
+
+        cache_dir: str
+            the directory where every dataset is saved, defaults to a
+            directory in the design baselines cache
+        """
+
+        self.cache_dir = cache_dir if cache_dir is not None \
+            else get_cache_dir('datasets')
+        tf.io.gfile.makedirs(self.cache_dir)
+
+    def get_key(self,
+                task_name,
+                task_kwargs,
+                seed=None):
+        """Returns the key of a dataset, which depends on the task, whether
+        it is relabelled, how it is subsampled, and the random seed
+
+        Args:
+
+        task_name: str
+            the name to a valid task using design_bench.make(task_name)
+        task_kwargs: dict
+            additional keyword arguments that are passed to design_bench.make
+        seed: int
+            the seed of the random number generator used when subsampling
+
+        Returns:
+
+        key: str
+            the hash of the arguments that determine the dataset, or None
+            when the dataset cannot be reproduced
+        """
+
+        return get_dataset_key(task_name, task_kwargs, seed=seed)
+
+    def load(self,
+             key):
+        """Load the designs and scores of a dataset as memory mapped arrays
+        together with the metadata and normalization statistics of its task
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the dataset
+
+        Returns:
+
+        entry: dict
+            the memory mapped designs 'x' and scores 'y', the task
+            'metadata', and the 'statistics' of the dataset, or None
+            on a cache miss
+        """
+
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.exists(os.path.join(path, 'metadata.json')):
+            return None
+        with open(os.path.join(path, 'metadata.json'), 'r') as f:
+            metadata = json.load(f)
+        with np.load(os.path.join(path, 'statistics.npz')) as data:
+            statistics = {name: data[name] for name in data.files}
+        return dict(x=np.load(os.path.join(path, 'x.npy'), mmap_mode='r'),
+                    y=np.load(os.path.join(path, 'y.npy'), mmap_mode='r'),
+                    metadata=metadata, statistics=statistics)
+
+    def save(self,
+             key,
+             task):
+        """Save the designs and scores of a freshly made task together with
+        its metadata and normalization statistics, so that experiments
+        which share the same arguments can load them without the task
+
+        Args:
+
+        key: str
+            the hash of the arguments that determine the dataset
+        task: design_bench.task.Task
+            a task whose designs are integers or unnormalized and whose
+            scores are unnormalized
+        """
+
+        num_classes = task.num_classes if task.is_discrete else None
+        soft_interpolation = getattr(
+            task.dataset, 'soft_interpolation', 0.6)
+        metadata = dict(
+            num_classes=num_classes,
+            soft_interpolation=soft_interpolation,
+            oracle_name=task.oracle_name,
+            dataset_name=task.dataset_name,
+            x_name=task.x_name, y_name=task.y_name,
+            dataset_max_percentile=float(task.dataset_max_percentile),
+            dataset_min_percentile=float(task.dataset_min_percentile),
+            dataset_max_output=float(task.dataset_max_output),
+            dataset_min_output=float(task.dataset_min_output))
+
+        # the statistics used when the designs and scores are normalized
+        statistics = dict()
+        statistics['y_mean'], statistics['y_standard_dev'] = \
+            get_statistics(task.y)
+        if task.is_discrete:
+            converter = SyntheticDataset(
+                None, None, num_classes=num_classes,
+                soft_interpolation=soft_interpolation)
+            statistics['logits_mean'], statistics['logits_standard_dev'] = \
+                get_statistics(task.x, transform=converter.to_logits)
+        else:
+            statistics['x_mean'], statistics['x_standard_dev'] = \
+                get_statistics(task.x)
+
+        # write to a temporary directory so readers never see partial files
+        path = os.path.join(self.cache_dir, key)
+        temp = f"{path}.{os.getpid()}.tmp"
+        tf.io.gfile.makedirs(temp)
+        np.save(os.path.join(temp, 'x.npy'), task.x)
+        np.save(os.path.join(temp, 'y.npy'), task.y)
+        np.savez(os.path.join(temp, 'statistics.npz'), **statistics)
+        with open(os.path.join(temp, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+        # the first experiment to finish keeps its copy of the dataset
+        try:
+            os.rename(temp, path)
+        except OSError:
+            shutil.rmtree(temp)
+
+
+# the oracle held by a worker process when scoring in parallel
+WORKER_TASK = None
+
+
+def make_task(task_name, dataset_seed=None, **task_kwargs):
+    """Make a task using the design_bench registry, or a synthetic task
+    with a random dataset when the name is registered in SYNTHETIC_TASKS
+
+    Args:
+
+    task_name: str
+        the name of a design_bench task such as 'HopperController-Exact-v0'
+        or a synthetic task such as 'Synthetic-MLP-v0'
+    dataset_seed: int
+        an optional seed for the random number generator used when the
+        dataset is subsampled
+    task_kwargs: dict
+        additional keyword arguments that are passed to the task
+
+    Returns:
+
+    task: design_bench.task.Task
+        a task with a dataset and an oracle that scores designs
+    """
+
+    if task_name in SYNTHETIC_TASKS:
+        return make_synthetic(task_name, **task_kwargs)
+    if dataset_seed is None:
+        return make(task_name, **task_kwargs)
+
+    # design_bench subsamples with the global random number generator
+    # so its state is restored once the task is made
+    state = np.random.get_state()
+    np.random.seed(dataset_seed)
+    try:
+        return make(task_name, **task_kwargs)
+    finally:
+        np.random.set_state(state)
+
+
+def initialize_worker(task_name, task_kwargs):
+    """Create a private copy of a design_bench task inside a worker
+    process, so the cost of building the oracle is paid once per worker
+
+    Args:
+
+    task_name: str
+        the name to a valid task using design_bench.make(task_name)
+    task_kwargs: dict
+        additional keyword arguments that are passed to design_bench.make
+    """
+
+    # workers only score designs so the dataset is never relabelled
+    global WORKER_TASK
+    WORKER_TASK = make_task(task_name, **dict(task_kwargs, relabel=False))
+
+
+def predict_worker(x_batch):
+    """Score a chunk of designs in their original dataset format using
+    the oracle held by the current worker process
+
+    Args:
+
+    x_batch: np.ndarray
+        a chunk of design values 'x' in the format of the dataset
+
+    Returns:
+
+    y_batch: np.ndarray
+        a chunk of prediction values 'y' made by the oracle model
+    """
+
+    return WORKER_TASK.predict(x_batch)
+
+
+class CachedTask(ArrayTask):
+
+    def __init__(self,
+                 task_name,
+                 task_kwargs,
+                 entry):
+        """A task whose dataset is loaded from a DatasetCache without
+        making the original task, which is only made the first time its
+        oracle is needed to score designs
+
+        Args:
+
+        task_name: str
+            the name of a design_bench task such as
+            'HopperController-Exact-v0' or a synthetic task
+        task_kwargs: dict
+            additional keyword arguments that are passed to the task
+        entry: dict
+            the designs, scores, metadata, and statistics of the dataset
+            returned by DatasetCache.load
+        """
+
+        metadata = entry['metadata']
+        super(CachedTask, self).__init__(
+            SyntheticDataset(
+                entry['x'], entry['y'],
+                num_classes=metadata['num_classes'],
+                soft_interpolation=metadata['soft_interpolation'],
+                statistics=entry['statistics']),
+            metadata['oracle_name'], metadata['dataset_name'],
+            x_name=metadata['x_name'], y_name=metadata['y_name'])
+
+        self.task_name = task_name
+        self.task_kwargs = task_kwargs
+        self.metadata = metadata
+        self.oracle_task = None
+
+    def get_oracle_task(self):
+        """Returns the original task, which is made the first time that
+        designs are scored and is never relabelled or normalized
+
+        Returns:
+
+        task: design_bench.task.Task
+            a task with an oracle that scores designs in the original
+            format of the dataset
+        """
+
+        if self.oracle_task is None:
+            self.oracle_task = make_task(self.task_name, **dict(
+                self.task_kwargs, relabel=False))
+        return self.oracle_task
+
+    def oracle_predict(self,
+                       x):
+        """Score designs in the original format of the dataset using the
+        oracle of the original task
+
+        Args:
+
+        x: np.ndarray
+            a batch of designs shaped like [batch_size, *design_shape]
+
+        Returns:
+
+        y: np.ndarray
+            a batch of scores shaped like [batch_size, 1]
+        """
+
+        return self.get_oracle_task().predict(x)
+
+    @property
+    def dataset_max_percentile(self):
+        return self.metadata['dataset_max_percentile']
+
+    @property
+    def dataset_min_percentile(self):
+        return self.metadata['dataset_min_percentile']
+
+    @property
+    def dataset_max_output(self):
+        return self.metadata['dataset_max_output']
+
+    @property
+    def dataset_min_output(self):
+        return self.metadata['dataset_min_output']
+
+    def __getattr__(self, name):
+
+        # attributes such as env_name are read from the original task
+        if name.startswith('_') or name in (
+                'task_name', 'task_kwargs', 'metadata', 'oracle_task'):
+            raise AttributeError(name)
+        return getattr(self.get_oracle_task(), name)
+
+
 class StaticGraphTask(Task):
     """A container class for model-based optimization problems where a
     dataset is paired with a ground truth score function such as a
@@ -266,6 +1086,9 @@ class StaticGraphTask(Task):
         a function that processes the dataset corresponding to this
         model-based optimization problem, and converts integers to a
         floating point representation as logits
+    map_to_lazy_logits():
+        a function that marks the dataset as logits while the designs stay
+        compact integers that are converted one batch at a time
     map_to_integers():
         a function that processes the dataset corresponding to this
         model-based optimization problem, and converts a floating point
@@ -273,7 +1096,10 @@ class StaticGraphTask(Task):
 
     """
 
-    def __init__(self,  task_name, **task_kwargs):
+    def __init__(self,  task_name, oracle_cache_size=0,
+                 oracle_cache_dir=None, oracle_workers=0,
+                 oracle_chunk_size=None, dataset_cache_dir=None,
+                 dataset_seed=None, **task_kwargs):
         """An interface to a static-graph task which includes a validation
         set and a non differentiable score function
 
@@ -281,7 +1107,26 @@ class StaticGraphTask(Task):
 
         task_name: str
             the name to a valid task using design_bench.make(task_name)
-            such as 'HopperController-Exact-v0'
+            such as 'HopperController-Exact-v0', or a synthetic task
+            such as 'Synthetic-MLP-v0'
+        oracle_cache_size: int
+            the number of oracle scores to memoize in memory, where zero
+            disables the cache and every design is scored by the oracle
+        oracle_cache_dir: str
+            an optional directory where memoized oracle scores persist
+            between experiments, which may be shared by many tasks
+        oracle_workers: int
+            the number of worker processes that each hold an oracle and
+            score designs in parallel, where zero scores in this process
+        oracle_chunk_size: int
+            the number of designs sent to a worker at once, which defaults
+            to splitting every batch evenly between the workers
+        dataset_cache_dir: str
+            an optional directory where relabelled and subsampled datasets
+            are saved, so the oracle only relabels a dataset once
+        dataset_seed: int
+            an optional seed for the random number generator used when the
+            dataset is subsampled, which is part of the cache key
         **task_kwargs: dict
             additional keyword arguments that are passed to the design_bench task
             when it is created using design_bench.make
@@ -289,7 +1134,61 @@ class StaticGraphTask(Task):
         """
 
         # use the design_bench registry to make a task
-        self.wrapped_task = make(task_name, **task_kwargs)
+        self.task_name = task_name
+        self.task_kwargs = task_kwargs
+        self.dataset_seed = dataset_seed
+        if dataset_cache_dir is None:
+            self.wrapped_task = make_task(
+                task_name, dataset_seed=dataset_seed, **task_kwargs)
+        else:
+            self.wrapped_task = self.make_cached(
+                DatasetCache(cache_dir=dataset_cache_dir))
+
+        # optionally memoize the scores returned by the oracle
+        self.oracle_cache = None
+        if oracle_cache_size > 0:
+            self.oracle_cache = OracleCache(
+                max_size=oracle_cache_size, cache_dir=oracle_cache_dir)
+
+        # the worker pool is created the first time designs are scored
+        self.oracle_workers = oracle_workers
+        self.oracle_chunk_size = oracle_chunk_size
+        self.oracle_pool = None
+
+        # discrete designs may be kept as integers and converted lazily
+        self.is_lazy_logits = False
+        self.is_lazy_normalized_x = False
+        self.lazy_x_mean = None
+        self.lazy_x_standard_dev = None
+        self.compact_x = None
+
+    def make_cached(self, cache):
+        """Make the task using a dataset cache, where a cached dataset is
+        loaded without making the task or relabelling it with the oracle
+
+        Args:
+
+        cache: DatasetCache
+            the persistent cache of relabelled and subsampled datasets
+
+        Returns:
+
+        task: design_bench.task.Task
+            a task whose dataset matches the cached dataset
+        """
+
+        key = cache.get_key(self.task_name, self.task_kwargs,
+                            seed=self.dataset_seed)
+        entry = cache.load(key) if key is not None else None
+        if entry is not None:
+            return CachedTask(self.task_name, self.task_kwargs, entry)
+
+        # the cache is missing, or the dataset cannot be reproduced
+        task = make_task(self.task_name, dataset_seed=self.dataset_seed,
+                         **self.task_kwargs)
+        if key is not None:
+            cache.save(key, task)
+        return task
 
     @property
     def is_discrete(self):
@@ -443,10 +1342,17 @@ class StaticGraphTask(Task):
     @property
     def x(self):
         """the design values 'x' for a model-based optimization problem
-        represented as a numpy array of arbitrary type
+        represented as a numpy array of arbitrary type, which are compact
+        integers when logits are computed lazily
 
         """
 
+        if self.is_lazy_logits:
+            if self.compact_x is None:
+                x = self.wrapped_task.x
+                self.compact_x = x.astype(np.uint8) \
+                    if self.num_classes <= 256 else x
+            return self.compact_x
         return self.wrapped_task.x
 
     @property
@@ -465,7 +1371,8 @@ class StaticGraphTask(Task):
 
         """
 
-        return self.wrapped_task.is_normalized_x
+        return self.is_lazy_normalized_x or \
+            self.wrapped_task.is_normalized_x
 
     @property
     def is_normalized_y(self):
@@ -484,7 +1391,7 @@ class StaticGraphTask(Task):
 
         """
 
-        return self.wrapped_task.is_logits
+        return self.is_lazy_logits or self.wrapped_task.is_logits
 
     @property
     def num_classes(self):
@@ -581,7 +1488,24 @@ class StaticGraphTask(Task):
 
         """
 
-        self.wrapped_task.map_normalize_x()
+        if not self.is_lazy_logits:
+            return self.wrapped_task.map_normalize_x()
+
+        # accumulate statistics of the logits one chunk at a time
+        x, total, total_sq = self.x, 0.0, 0.0
+        for i in range(0, x.shape[0], 4096):
+            logits = self.wrapped_task.to_logits(
+                x[i:i + 4096].astype(np.int32)).astype(np.float64)
+            total = total + logits.sum(axis=0, keepdims=True)
+            total_sq = total_sq + np.square(logits).sum(axis=0, keepdims=True)
+
+        mean = total / x.shape[0]
+        standard_dev = np.sqrt(np.maximum(
+            total_sq / x.shape[0] - np.square(mean), 0.0))
+        standard_dev = np.where(standard_dev == 0.0, 1.0, standard_dev)
+        self.lazy_x_mean = mean.astype(np.float32)
+        self.lazy_x_standard_dev = standard_dev.astype(np.float32)
+        self.is_lazy_normalized_x = True
 
     @tf.function
     def map_normalize_x(self):
@@ -615,7 +1539,10 @@ class StaticGraphTask(Task):
 
         """
 
-        self.wrapped_task.map_denormalize_x()
+        if self.is_lazy_normalized_x:
+            self.is_lazy_normalized_x = False
+        else:
+            self.wrapped_task.map_denormalize_x()
 
     @tf.function
     def map_denormalize_x(self):
@@ -650,7 +1577,12 @@ class StaticGraphTask(Task):
 
         """
 
-        self.wrapped_task.map_to_integers()
+        if self.is_lazy_logits:
+            self.is_lazy_logits = False
+            self.is_lazy_normalized_x = False
+            self.compact_x = None
+        else:
+            self.wrapped_task.map_to_integers()
 
     @tf.function
     def map_to_integers(self):
@@ -681,6 +1613,40 @@ class StaticGraphTask(Task):
 
         tf.numpy_function(self.map_to_logits_numpy, [], [])
 
+    def map_to_lazy_logits(self):
+        """a function that marks the dataset corresponding to this
+        model-based optimization problem as logits while keeping the
+        designs stored as compact integers, which are converted one batch
+        at a time using lazy_to_logits
+
+        """
+
+        self.is_lazy_logits = True
+
+    def lazy_to_logits(self, x):
+        """A helper function that accepts a batch of compact integer designs
+        from the dataset and converts them to the same floating point
+        logits, normalized when requested, that map_to_logits would store
+
+        Arguments:
+
+        x: tf.Tensor
+            a batch of design values represented as integers, typically
+            a batch of rows gathered from task.x
+
+        Returns:
+
+        x: tf.Tensor
+            a batch of design values represented as floating point logits
+            of a certain probability distribution
+
+        """
+
+        x = self.to_logits(tf.cast(x, tf.int32))
+        if self.is_lazy_normalized_x:
+            x = (x - self.lazy_x_mean) / self.lazy_x_standard_dev
+        return x
+
     def normalize_x_numpy(self, x):
         """a function that standardizes the design values 'x' to have
         zero empirical mean and unit empirical variance
@@ -701,6 +1667,9 @@ class StaticGraphTask(Task):
 
         """
 
+        if self.is_lazy_normalized_x:
+            return ((x - self.lazy_x_mean) /
+                    self.lazy_x_standard_dev).astype(np.float32)
         return self.wrapped_task.normalize_x(x)
 
     @tf.function
@@ -795,6 +1764,9 @@ class StaticGraphTask(Task):
 
         """
 
+        if self.is_lazy_normalized_x:
+            return (x * self.lazy_x_standard_dev +
+                    self.lazy_x_mean).astype(np.float32)
         return self.wrapped_task.denormalize_x(x)
 
     @tf.function
@@ -890,6 +1862,11 @@ class StaticGraphTask(Task):
 
         """
 
+        if self.is_lazy_logits:
+
+            # the first class has an implicit logit of zero
+            return np.argmax(np.pad(x, [[0, 0]] * (len(x.shape) - 1) +
+                                    [[1, 0]]), axis=-1).astype(np.int32)
         return self.wrapped_task.to_integers(x)
 
     @tf.function
@@ -989,7 +1966,99 @@ class StaticGraphTask(Task):
 
         """
 
-        return self.wrapped_task.predict(x_batch)
+        # designs are scored as integers when logits are lazy, and only
+        # lazily normalized logits need to be denormalized first
+        if self.is_lazy_logits and \
+                np.issubdtype(x_batch.dtype, np.floating):
+            if self.is_lazy_normalized_x:
+                x_batch = self.denormalize_x_numpy(x_batch)
+            x_batch = self.to_integers_numpy(x_batch)
+        elif self.is_lazy_logits:
+            x_batch = x_batch.astype(np.int32)
+
+        predict_fn = self.wrapped_task.predict
+        if self.oracle_workers > 0:
+            predict_fn = self.predict_parallel_numpy
+        if self.oracle_cache is None:
+            return predict_fn(x_batch)
+
+        # designs are hashed in the original format of the dataset
+        raw_x_batch = x_batch
+        if self.wrapped_task.is_normalized_x:
+            raw_x_batch = self.wrapped_task.denormalize_x(raw_x_batch)
+        if self.is_discrete and self.wrapped_task.is_logits:
+            raw_x_batch = self.wrapped_task.to_integers(raw_x_batch)
+        raw_x_batch = raw_x_batch.astype(
+            np.int32 if self.is_discrete else np.float32)
+
+        def predict_raw_fn(x):
+            y = predict_fn(x)
+            if self.is_normalized_y:
+                y = self.wrapped_task.denormalize_y(y)
+            return y.astype(np.float32)
+
+        # scores are stored unnormalized so they are shared by experiments
+        # that subsample, relabel, and normalize the dataset differently
+        namespace = repr((self.task_name, sorted(
+            (k, v) for k, v in self.task_kwargs.items()
+            if k not in ('relabel', 'dataset_kwargs'))))
+        y_batch = self.oracle_cache.predict(
+            predict_raw_fn, x_batch, namespace=namespace,
+            key_batch=raw_x_batch)
+        if self.is_normalized_y:
+            y_batch = self.wrapped_task.normalize_y(y_batch)
+        return y_batch.astype(np.float32)
+
+    def predict_parallel_numpy(self, x_batch):
+        """a function that accepts a batch of design values 'x' as input and
+        scores chunks of the batch in parallel using a persistent pool of
+        worker processes that each hold a copy of the oracle
+
+        Arguments:
+
+        x_batch: np.ndarray
+            a batch of design values 'x' that will be given as input to the
+            oracle model in order to obtain a prediction value 'y' for
+            each 'x' which is then returned
+
+        Returns:
+
+        y_batch: np.ndarray
+            a batch of prediction values 'y' made by the oracle model,
+            corresponding to the ground truth score for each design
+            value 'x' in a model-based optimization problem
+
+        """
+
+        if x_batch.shape[0] == 0:
+            return self.wrapped_task.predict(x_batch)
+
+        if self.oracle_pool is None:
+
+            # spawn fresh interpreters since tensorflow is not fork safe
+            from concurrent.futures import ProcessPoolExecutor
+            self.oracle_pool = ProcessPoolExecutor(
+                max_workers=self.oracle_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=initialize_worker,
+                initargs=(self.task_name, self.task_kwargs))
+
+        # workers hold unmapped tasks so convert to the dataset format
+        if self.wrapped_task.is_normalized_x:
+            x_batch = self.wrapped_task.denormalize_x(x_batch)
+        if self.is_discrete and self.wrapped_task.is_logits:
+            x_batch = self.wrapped_task.to_integers(x_batch)
+
+        # split the batch into chunks and reassemble them in order
+        chunk_size = self.oracle_chunk_size or max(
+            1, int(math.ceil(x_batch.shape[0] / self.oracle_workers)))
+        y_batch = np.concatenate(list(self.oracle_pool.map(
+            predict_worker, [x_batch[i:i + chunk_size] for i in range(
+                0, x_batch.shape[0], chunk_size)])), axis=0)
+
+        if self.is_normalized_y:
+            y_batch = self.wrapped_task.normalize_y(y_batch)
+        return y_batch.astype(np.float32)
 
     @tf.function
     def predict(self, x):
@@ -0,0 +1,516 @@
+from design_baselines.utils import spearman
+from design_baselines.utils import disc_noise
+from design_baselines.utils import cont_noise
+from design_baselines.utils import pad_batch
+from design_baselines.utils import unpad_statistics
+from design_baselines.utils import get_fixed_step
+from design_baselines.utils import check_retracing
+from design_baselines.utils import configure_steps
+from collections import defaultdict
+from tensorflow_probability import distributions as tfpd
+import tensorflow as tf
+import numpy as np
+
+
+def get_activation(name):
+    """Look up an activation function by name, matching the names that
+    are accepted by the forward models of the individual baselines
+
+    Args:
+
+    name: str
+        the name of an activation function such as 'relu', 'leaky_relu'
+        or 'cos' that is applied elementwise to a tensor
+
+    Returns:
+
+    activation: Callable
+        a function that applies the activation to a tensor
+    """
+
+    if name == 'leaky_relu':
+        return tf.keras.layers.LeakyReLU()
+    if name == 'cos':
+        return tf.math.cos
+    return tf.keras.activations.get(name)
+
+
+class StackedForwardModel(tf.keras.Model):
+    """An ensemble of fully connected networks whose weights are stacked
+    along a leading bootstrap axis and evaluated with one einsum per layer"""
+
+    distribution = tfpd.Normal
+
+    def __init__(self, input_shape, bootstraps=5,
+                 activations=('leaky_relu',), hidden_size=50,
+                 num_classes=None, embedding_size=50,
+                 initial_max_std=1.5, initial_min_std=0.5):
+        """Create a stacked fully connected architecture that processes
+        designs with every member of an ensemble at once and predicts a
+        gaussian distribution over scores for every member
+
+        Args:
+
+        input_shape: List[int]
+            the shape of a single design, excluding the batch axis
+        bootstraps: int
+            the number of members in the ensemble
+        activations: List[str]
+            the names of the activation function for every hidden layer,
+            shared by all members of the ensemble
+        hidden_size: int
+            the global hidden size of the neural network
+        num_classes: int
+            if designs are integers, the number of classes embedded by
+            a learned embedding matrix, otherwise None
+        embedding_size: int
+            the size of the embedding matrix for discrete tasks
+        initial_max_std: float
+            the starting upper bound of the standard deviation
+        initial_min_std: float
+            the starting lower bound of the standard deviation
+
+        """
+
+        super(StackedForwardModel, self).__init__()
+        self.bootstraps = bootstraps
+        self.design_shape = list(input_shape)
+        self.num_classes = num_classes
+        self.activations = [get_activation(act) for act in activations]
+
+        self.max_logstd = tf.Variable(tf.fill([bootstraps, 1, 1], np.log(
+            initial_max_std).astype(np.float32)), trainable=True)
+        self.min_logstd = tf.Variable(tf.fill([bootstraps, 1, 1], np.log(
+            initial_min_std).astype(np.float32)), trainable=True)
+
+        # designs that are integers are embedded before the first layer
+        input_size = int(np.prod(input_shape))
+        if num_classes is not None:
+            self.embedding = tf.Variable(tf.random.uniform(
+                [bootstraps, num_classes, embedding_size],
+                minval=-0.05, maxval=0.05), trainable=True)
+            input_size = input_size * embedding_size
+
+        # glorot uniform initialization computed separately per member
+        self.kernels = []
+        self.biases = []
+        sizes = [input_size] + [hidden_size] * len(activations) + [2]
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            limit = np.sqrt(6.0 / (fan_in + fan_out))
+            self.kernels.append(tf.Variable(tf.random.uniform(
+                [bootstraps, fan_in, fan_out],
+                minval=-limit, maxval=limit), trainable=True))
+            self.biases.append(tf.Variable(tf.zeros(
+                [bootstraps, 1, fan_out]), trainable=True))
+
+    def call(self, inputs, training=False):
+        """Evaluate every member of the ensemble on a batch of designs,
+        which are either shared by all members or given per member
+
+        Args:
+
+        inputs: tf.Tensor
+            a batch of designs shaped like [batch_size, *input_shape]
+            or [bootstraps, batch_size, *input_shape]
+
+        Returns:
+
+        prediction: tf.Tensor
+            the unconstrained mean and log standard deviation predicted
+            by every member shaped like [bootstraps, batch_size, 2]
+        """
+
+        # determine whether each member receives its own designs
+        stacked = len(inputs.shape) == len(self.design_shape) + 2
+
+        if self.num_classes is not None:
+            h = tf.gather(self.embedding, inputs,
+                          axis=1, batch_dims=1 if stacked else 0)
+            stacked = True
+        else:
+            h = tf.cast(inputs, tf.float32)
+
+        # the first layer avoids tiling designs shared by all members
+        if stacked:
+            h = tf.reshape(h, [self.bootstraps, tf.shape(h)[1], -1])
+            h = tf.einsum('bni,bio->bno', h, self.kernels[0])
+        else:
+            h = tf.reshape(h, [tf.shape(h)[0], -1])
+            h = tf.einsum('ni,bio->bno', h, self.kernels[0])
+        h = h + self.biases[0]
+
+        for act, kernel, bias in zip(
+                self.activations, self.kernels[1:], self.biases[1:]):
+            h = tf.einsum('bni,bio->bno', act(h), kernel) + bias
+
+        return h
+
+    def get_params(self, inputs, **kwargs):
+        """Return a dictionary of parameters for a particular distribution
+        family such as the mean and variance of a gaussian
+
+        Args:
+
+        inputs: tf.Tensor
+            a batch of training inputs shaped like [batch_size, channels]
+
+        Returns:
+
+        parameters: dict
+            a dictionary that contains 'loc' and 'scale' keys shaped
+            like [bootstraps, batch_size, 1]
+        """
+
+        prediction = self(inputs, **kwargs)
+        mean, logstd = tf.split(prediction, 2, axis=-1)
+        logstd = self.max_logstd - tf.nn.softplus(self.max_logstd - logstd)
+        logstd = self.min_logstd + tf.nn.softplus(logstd - self.min_logstd)
+        return {"loc": mean, "scale": tf.math.exp(logstd)}
+
+    def get_distribution(self, inputs, **kwargs):
+        """Return a distribution over the outputs of every member of this
+        model, for example a batch of Gaussian Distributions
+
+        Args:
+
+        inputs: tf.Tensor
+            a batch of training inputs shaped like [batch_size, channels]
+
+        Returns:
+
+        distribution: tfp.distribution.Distribution
+            a tensorflow probability distribution over outputs of the model
+        """
+
+        return self.distribution(**self.get_params(inputs, **kwargs))
+
+
+class StackedEnsemble(tf.Module):
+
+    def __init__(self,
+                 forward_model,
+                 forward_model_optim=tf.keras.optimizers.Adam,
+                 forward_model_lr=0.001,
+                 is_discrete=False,
+                 noise_std=0.0,
+                 keep=1.0,
+                 temp=None,
+                 fixed_batch_size=None,
+                 debug_retracing=False,
+                 jit_compile=False):
+        """Build a trainer for a stacked ensemble of probabilistic neural
+        networks that updates every member with one backward pass
+
+        Args:
+
+        forward_model: StackedForwardModel
+            a stacked model that predicts distributions over scores
+            using every member of the ensemble at once
+        forward_model_optim: __class__
+            the optimizer class to use for optimizing the stacked model
+        forward_model_lr: float
+            the learning rate for the stacked model optimizer
+        is_discrete: bool
+            a boolean that indicates whether the designs x are discrete
+            samples represented as probabilities
+        noise_std: float
+            if designs x are continuous this specifies the standard
+            deviation of gaussian noise added to real samples
+        keep: float
+            if designs x are discrete this specifies the amount of
+            probability mass of the on location
+        temp: float
+            if designs x are discrete this specifies the temperature
+            of the discrete noise, which is disabled when None
+        fixed_batch_size, debug_retracing, jit_compile:
+            how the step functions are traced and compiled, as
+            described by configure_steps in design_baselines.utils
+        """
+
+        super().__init__()
+        self.forward_model = forward_model
+        self.bootstraps = forward_model.bootstraps
+        self.is_discrete = is_discrete
+        self.noise_std = noise_std
+        self.keep = keep
+        self.temp = temp
+
+        # a single optimizer updates the stacked weights of every member
+        # which matches one optimizer per member for elementwise updates
+        self.forward_model_optim = \
+            forward_model_optim(learning_rate=forward_model_lr)
+
+        # trace and compile the step functions as requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        fixed_batch_size=fixed_batch_size,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
+
+    def get_distribution(self,
+                         x,
+                         **kwargs):
+        """Build the mixture distribution implied by the set of oracles
+        that are trained in this module
+
+        Args:
+
+        x: tf.Tensor
+            a batch of training inputs shaped like [batch_size, channels]
+
+        Returns:
+
+        distribution: tfpd.Distribution
+            the mixture of gaussian distributions implied by the oracles
+        """
+
+        # move the member axis to the component axis of the mixture
+        params = self.forward_model.get_params(x, **kwargs)
+        for key, val in params.items():
+            params[key] = tf.transpose(val, [1, 2, 0])
+
+        # build the mixture distribution using the family of component one
+        weights = tf.fill([self.bootstraps], 1 / self.bootstraps)
+        return tfpd.MixtureSameFamily(tfpd.Categorical(
+            probs=weights), self.forward_model.distribution(**params))
+
+    def corrupt(self, x):
+        """Add independent noise to the designs seen by each member of
+        the ensemble, if noise is enabled for this ensemble
+
+        Args:
+
+        x: tf.Tensor
+            a batch of training inputs shaped like [batch_size, channels]
+
+        Returns:
+
+        x: tf.Tensor
+            a batch of inputs shaped like [bootstraps, batch_size, channels]
+            or the original batch when noise is disabled
+        """
+
+        if self.is_discrete and self.temp is not None:
+            x = tf.tile(x[tf.newaxis], [self.bootstraps] + [1] * len(x.shape))
+            return disc_noise(x, keep=self.keep, temp=self.temp)
+        elif not self.is_discrete and self.noise_std > 0:
+            x = tf.tile(x[tf.newaxis], [self.bootstraps] + [1] * len(x.shape))
+            return cont_noise(x, self.noise_std)
+        return x
+
+    @tf.function(experimental_relax_shapes=True)
+    def train_step(self,
+                   x,
+                   y,
+                   b,
+                   w=None,
+                   size=None):
+        """Perform a training step of gradient descent on an ensemble
+        using bootstrap weights for each model in the ensemble
+
+        Args:
+
+        x: tf.Tensor
+            a batch of training inputs shaped like [batch_size, channels]
+        y: tf.Tensor
+            a batch of training labels shaped like [batch_size, 1]
+        b: tf.Tensor
+            bootstrap indicators shaped like [batch_size, num_oracles]
+        w: tf.Tensor
+            optional importance weights shaped like [batch_size, 1]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
+
+        Returns:
+
+        statistics: dict
+            a dictionary that contains logging information
+        """
+
+        statistics = dict()
+
+        # the bootstrap mask for every member and optional importance weight
+        mask = tf.transpose(b)
+        weight = mask if w is None else mask * w[tf.newaxis, :, 0]
+
+        with tf.GradientTape() as tape:
+
+            # calculate the prediction error and accuracy of every model
+            d = self.forward_model.get_distribution(
+                self.corrupt(x), training=True)
+            nll = -d.log_prob(y)[:, :, 0]
+
+            # build the total loss and weight by the bootstrap
+            total_loss = tf.reduce_sum(tf.math.divide_no_nan(
+                tf.reduce_sum(weight * nll, axis=1),
+                tf.reduce_sum(mask, axis=1)))
+
+        var_list = self.forward_model.trainable_variables
+        self.forward_model_optim.apply_gradients(zip(
+            tape.gradient(total_loss, var_list), var_list))
+
+        for i in range(self.bootstraps):
+            statistics[f'oracle_{i}/train/nll'] = nll[i]
+
+            # evaluate how correct the rank fo the model predictions are
+            statistics[f'oracle_{i}/train/rank_corr'] = \
+                spearman(y[:, 0], d.mean()[i, :, 0], size=size)
+
+        return statistics
+
+    @tf.function(experimental_relax_shapes=True)
+    def validate_step(self,
+                      x,
+                      y,
+                      size=None):
+        """Perform a validation step on an ensemble of models
+        without using bootstrapping weights
+
+        Args:
+
+        x: tf.Tensor
+            a batch of validation inputs shaped like [batch_size, channels]
+        y: tf.Tensor
+            a batch of validation labels shaped like [batch_size, 1]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
+
+        Returns:
+
+        statistics: dict
+            a dictionary that contains logging information
+        """
+
+        statistics = dict()
+
+        # calculate the prediction error and accuracy of every model
+        d = self.forward_model.get_distribution(
+            self.corrupt(x), training=False)
+        nll = -d.log_prob(y)[:, :, 0]
+
+        for i in range(self.bootstraps):
+            statistics[f'oracle_{i}/validate/nll'] = nll[i]
+
+            # evaluate how correct the rank fo the model predictions are
+            statistics[f'oracle_{i}/validate/rank_corr'] = \
+                spearman(y[:, 0], d.mean()[i, :, 0], size=size)
+
+        return statistics
+
+    def train(self,
+              dataset):
+        """Perform training using gradient descent on an ensemble
+        using bootstrap weights for each model in the ensemble
+
+        Args:
+
+        dataset: tf.data.Dataset
+            the training dataset already batched and prefetched, which
+            yields x, y, b and optionally importance weights w
+
+        Returns:
+
+        loss_dict: dict
+            a dictionary mapping names to loss values for logging
+        """
+
+        statistics = defaultdict(list)
+        for batch in dataset:
+            step, size = self.train_step, int(batch[0].shape[0])
+            args = tuple(batch)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and mask the padding out of the loss
+                # where unit importance weights keep the size positional
+                mask, batch = pad_batch(self.fixed_batch_size, *batch)
+                if len(batch) < 4:
+                    batch.append(tf.ones_like(batch[1]))
+                args = (batch[0], batch[1], batch[2] * mask,
+                        batch[3], tf.constant(size))
+                step = get_fixed_step(self, 'train_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
+                statistics[name].append(tensor)
+        for name in statistics.keys():
+            statistics[name] = tf.concat(statistics[name], axis=0)
+        return statistics
+
+    def validate(self,
+                 dataset):
+        """Perform validation on an ensemble of models without
+        using bootstrapping weights
+
+        Args:
+
+        dataset: tf.data.Dataset
+            the validation dataset already batched and prefetched
+
+        Returns:
+
+        loss_dict: dict
+            a dictionary mapping names to loss values for logging
+        """
+
+        statistics = defaultdict(list)
+        for x, y in dataset:
+            step, size = self.validate_step, int(x.shape[0])
+            args = (x, y)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and remove padding from statistics
+                _, (x, y) = pad_batch(self.fixed_batch_size, x, y)
+                args = (x, y, tf.constant(size))
+                step = get_fixed_step(self, 'validate_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
+                statistics[name].append(tensor)
+        for name in statistics.keys():
+            statistics[name] = tf.concat(statistics[name], axis=0)
+        return statistics
+
+    def launch(self,
+               train_data,
+               validate_data,
+               logger,
+               epochs,
+               start_epoch=0):
+        """Launch training and validation for the model for the specified
+        number of epochs, and log statistics
+
+        Args:
+
+        train_data: tf.data.Dataset
+            the training dataset already batched and prefetched
+        validate_data: tf.data.Dataset
+            the validation dataset already batched and prefetched
+        logger: Logger
+            an instance of the logger used for writing to tensor board
+        epochs: int
+            the number of epochs through the data sets to take
+        """
+
+        for e in range(start_epoch, start_epoch + epochs):
+            for name, loss in self.train(train_data).items():
+                logger.record(name, loss, e, level=1)
+            for name, loss in self.validate(validate_data).items():
+                logger.record(name, loss, e, level=1)
+
+            # fail when a step function is traced again after one epoch
+            if self.debug_retracing:
+                check_retracing(self)
+
+    def get_saveables(self):
+        """Collects and returns stateful objects that are serializeable
+        using the tensorflow checkpoint format
+
+        Returns:
+
+        saveables: dict
+            a dict containing stateful objects compatible with checkpoints
+        """
+
+        saveables = dict()
+        saveables['forward_model'] = self.forward_model
+        saveables['forward_model_optim'] = self.forward_model_optim
+        return saveables
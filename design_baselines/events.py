@@ -0,0 +1,401 @@
+from design_baselines.utils import get_cache_dir
+import tensorflow as tf
+import numpy as np
+import hashlib
+import struct
+import os
+
+
+def get_scalar(value):
+    """Extract a single number from a summary value written either by
+    tf.summary.scalar or by the legacy simple value protocol
+
+    Args:
+
+    value: tf.compat.v1.Summary.Value
+        a summary value decoded from a tensorboard event file
+
+    Returns:
+
+    scalar: float
+        the number stored in the summary value, or None when the
+        summary value is not a numeric scalar
+    """
+
+    if value.HasField('simple_value'):
+        return float(value.simple_value)
+    if value.HasField('tensor') and \
+            len(value.tensor.tensor_shape.dim) == 0:
+        dtype = tf.as_dtype(value.tensor.dtype)
+        if dtype.is_floating or dtype.is_integer:
+            return float(tf.make_ndarray(value.tensor))
+    return None
+
+
+def read_scalars(path, offset=0, tags=None):
+    """Parse every scalar summary in a tensorboard event file, starting
+    from a byte offset so that appended events can be read incrementally
+
+    Args:
+
+    path: str
+        the path to a tensorboard event file on the disk
+    offset: int
+        the byte offset of the first record to parse in the file
+    tags: set of str
+        an optional set of tags to keep, others are skipped before
+        their tensors are decoded
+
+    Returns:
+
+    steps: np.ndarray
+        the step of every scalar shaped like [num_scalars]
+    names: list of str
+        the tag of every scalar with length num_scalars
+    values: np.ndarray
+        the value of every scalar shaped like [num_scalars]
+    offset: int
+        the byte offset after the last complete record in the file
+    """
+
+    steps, names, values = [], [], []
+    with tf.io.gfile.GFile(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+
+            # every record is a length, a crc, the data, and a crc
+            header = f.read(12)
+            if len(header) < 12:
+                break
+            length = struct.unpack('<Q', header[:8])[0]
+            data = f.read(length + 4)
+            if len(data) < length + 4:
+                break
+            offset += 16 + length
+
+            event = tf.compat.v1.Event.FromString(data[:length])
+            for v in event.summary.value:
+                if tags is not None and v.tag not in tags:
+                    continue
+                value = get_scalar(v)
+                if value is not None:
+                    steps.append(event.step)
+                    names.append(v.tag)
+                    values.append(value)
+
+    return np.array(steps, dtype=np.int64), names, \
+        np.array(values, dtype=np.float64), offset
+
+
+class ScalarStore(object):
+
+    def __init__(self,
+                 cache_dir=None):
+        """Build a columnar cache of the scalars in tensorboard event
+        files, where every event file is parsed once and is only read
+        again from where it left off when new events are appended
+
+        Args:
+
+        cache_dir: str
+            the directory where the columns of every event file are
+            saved, defaults to a directory in the design baselines cache
+        """
+
+        self.cache_dir = cache_dir if cache_dir is not None \
+            else get_cache_dir('scalars')
+        tf.io.gfile.makedirs(self.cache_dir)
+
+    def get_shard(self,
+                  path):
+        """Returns the path where the columns of a single event file
+        are cached, which is keyed by the absolute path of the file
+
+        Args:
+
+        path: str
+            the path to a tensorboard event file on the disk
+
+        Returns:
+
+        shard: str
+            the path to a numpy archive in the cache directory
+        """
+
+        return os.path.join(self.cache_dir, hashlib.sha1(
+            os.path.abspath(path).encode('utf-8')).hexdigest() + '.npz')
+
+    def load(self,
+             path,
+             tags=None):
+        """Load the columns of a single event file from the cache and
+        parse only the events that are missing from the cache
+
+        Args:
+
+        path: str
+            the path to a tensorboard event file on the disk
+        tags: set of str
+            an optional set of tags to keep, others are skipped before
+            their tensors are decoded, although the columns may contain
+            other tags that were cached by earlier queries
+
+        Returns:
+
+        columns: dict
+            a dictionary containing the arrays 'steps', 'tags', and
+            'values' that each have one element per scalar
+        """
+
+        stat = tf.io.gfile.stat(path)
+        shard = self.get_shard(path)
+        tags = None if tags is None else set(tags)
+
+        columns = None
+        if os.path.exists(shard):
+            with np.load(shard) as data:
+                columns = dict(data)
+
+            # a shard filtered by tags can only answer queries for a
+            # subset of its tags, otherwise parse the file for both
+            cached_tags = None if not columns.get('filtered', False) \
+                else set(columns['filter_tags'].tolist())
+            if cached_tags is not None and \
+                    (tags is None or not tags <= cached_tags):
+                tags = None if tags is None else tags | cached_tags
+                columns = None
+            else:
+                tags = cached_tags
+
+        if columns is not None and columns['size'] == stat.length and \
+                columns['mtime'] == stat.mtime_nsec:
+            return columns
+
+        # event files are append only, so read from the previous offset
+        # unless the file was replaced by a smaller or rewritten file
+        if columns is not None and columns['size'] >= stat.length:
+            columns = None
+        offset = 0 if columns is None else int(columns['offset'])
+        steps, names, values, offset = read_scalars(
+            path, offset=offset, tags=tags)
+
+        if columns is not None:
+            steps = np.concatenate([columns['steps'], steps], axis=0)
+            names = columns['tags'].tolist() + names
+            values = np.concatenate([columns['values'], values], axis=0)
+
+        columns = dict(
+            steps=steps, tags=np.array(names, dtype=np.str_),
+            values=values, offset=np.int64(offset),
+            size=np.int64(stat.length), mtime=np.int64(stat.mtime_nsec),
+            filtered=np.bool_(tags is not None),
+            filter_tags=np.array(sorted(tags or []), dtype=np.str_))
+
+        # write to a temporary file so readers never see partial shards
+        temp = f"{shard}.{os.getpid()}.tmp.npz"
+        np.savez(temp, **columns)
+        os.replace(temp, shard)
+        return columns
+
+    def iterate(self,
+                path,
+                tags=None):
+        """Iterate over the scalars in a single event file in the order
+        they were written, parsing the file only when necessary
+
+        Args:
+
+        path: str
+            the path to a tensorboard event file on the disk
+        tags: set of str
+            an optional set of tags to keep, others are skipped
+
+        Returns:
+
+        scalars: Iterable[Tuple[int, str, float]]
+            an iterable of the step, tag, and value of every scalar
+        """
+
+        columns = self.load(path, tags=tags)
+        for step, tag, value in zip(columns['steps'].tolist(),
+                                    columns['tags'].tolist(),
+                                    columns['values'].tolist()):
+            if tags is None or tag in tags:
+                yield step, tag, value
+
+    def select(self,
+               path,
+               tags=None,
+               steps=None):
+        """Load the columns of a single event file and keep only the
+        scalars with the requested tags and steps
+
+        Args:
+
+        path: str
+            the path to a tensorboard event file on the disk
+        tags: set of str
+            an optional set of tags to keep, others are skipped
+        steps: set of int
+            an optional set of steps to keep, others are skipped
+
+        Returns:
+
+        columns: dict
+            a dictionary containing the arrays 'steps', 'tags', and
+            'values' that each have one element per selected scalar
+        """
+
+        columns = self.load(path, tags=tags)
+        mask = np.ones(columns['steps'].shape, dtype=np.bool_)
+        if tags is not None:
+            mask &= np.isin(columns['tags'], list(tags))
+        if steps is not None:
+            mask &= np.isin(columns['steps'], list(steps))
+        return dict(steps=columns['steps'][mask],
+                    tags=columns['tags'][mask],
+                    values=columns['values'][mask])
+
+    def frame(self,
+              paths,
+              tags=None,
+              steps=None,
+              workers=1):
+        """Query the scalars from many event files as a single data
+        frame with one row per scalar, decoding event files that are
+        missing from the cache across a pool of processes
+
+        Args:
+
+        paths: list of str
+            a list of paths to tensorboard event files on the disk
+        tags: set of str
+            an optional set of tags to keep, others are skipped
+        steps: set of int
+            an optional set of steps to keep, others are skipped
+        workers: int
+            the number of processes used to decode event files, where
+            None uses every available core and 1 uses no pool
+
+        Returns:
+
+        frame: pd.DataFrame
+            a data frame with the columns 'path', 'run', 'tag', 'step',
+            and 'value' where run is the directory of the event file
+        """
+
+        import pandas as pd
+        paths = list(paths)
+        tags = None if tags is None else frozenset(tags)
+        steps = None if steps is None else frozenset(steps)
+
+        if workers == 1 or len(paths) <= 1:
+            results = [self.select(
+                path, tags=tags, steps=steps) for path in paths]
+
+        else:
+
+            # spawn fresh interpreters since tensorflow is not fork safe
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')) as pool:
+                results = list(pool.map(
+                    select_scalars, [self.cache_dir] * len(paths), paths,
+                    [tags] * len(paths), [steps] * len(paths),
+                    chunksize=max(1, len(paths) // (
+                        4 * (workers or os.cpu_count() or 1)))))
+
+        lengths = [columns['steps'].shape[0] for columns in results]
+        if len(results) == 0:
+            return pd.DataFrame(
+                columns=['path', 'run', 'tag', 'step', 'value'])
+        return pd.DataFrame(dict(
+            path=np.repeat(paths, lengths),
+            run=np.repeat([os.path.dirname(p) for p in paths], lengths),
+            tag=np.concatenate([c['tags'] for c in results], axis=0),
+            step=np.concatenate([c['steps'] for c in results], axis=0),
+            value=np.concatenate([c['values'] for c in results], axis=0)))
+
+
+def select_scalars(cache_dir, path, tags=None, steps=None):
+    """Load the columns of a single event file in a worker process and
+    keep only the scalars with the requested tags and steps
+
+    Args:
+
+    cache_dir: str
+        the directory where the columns of every event file are saved
+    path: str
+        the path to a tensorboard event file on the disk
+    tags: set of str
+        an optional set of tags to keep, others are skipped
+    steps: set of int
+        an optional set of steps to keep, others are skipped
+
+    Returns:
+
+    columns: dict
+        a dictionary containing the arrays 'steps', 'tags', and
+        'values' that each have one element per selected scalar
+    """
+
+    return ScalarStore(cache_dir).select(path, tags=tags, steps=steps)
+
+
+# a store shared by every command in the current process
+DEFAULT_STORE = None
+
+
+def iterate_scalars(path, tags=None):
+    """Iterate over the scalars in a single event file in the order they
+    were written using the default columnar cache
+
+    Args:
+
+    path: str
+        the path to a tensorboard event file on the disk
+    tags: set of str
+        an optional set of tags to keep, others are skipped
+
+    Returns:
+
+    scalars: Iterable[Tuple[int, str, float]]
+        an iterable of the step, tag, and value of every scalar
+    """
+
+    global DEFAULT_STORE
+    if DEFAULT_STORE is None:
+        DEFAULT_STORE = ScalarStore()
+    return DEFAULT_STORE.iterate(path, tags=tags)
+
+
+def load_scalars(paths, tags=None, steps=None, workers=None):
+    """Query the scalars from many event files as a single data frame
+    using the default columnar cache and a pool of processes
+
+    Args:
+
+    paths: list of str
+        a list of paths to tensorboard event files on the disk
+    tags: set of str
+        an optional set of tags to keep, others are skipped
+    steps: set of int
+        an optional set of steps to keep, others are skipped
+    workers: int
+        the number of processes used to decode event files, where
+        None uses every available core and 1 uses no pool
+
+    Returns:
+
+    frame: pd.DataFrame
+        a data frame with the columns 'path', 'run', 'tag', 'step',
+        and 'value' where run is the directory of the event file
+    """
+
+    global DEFAULT_STORE
+    if DEFAULT_STORE is None:
+        DEFAULT_STORE = ScalarStore()
+    return DEFAULT_STORE.frame(
+        paths, tags=tags, steps=steps, workers=workers)
@@ -1,10 +1,16 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
+from design_baselines.data import get_dataset_key
 from design_baselines.logger import Logger
+from design_baselines.checkpoints import ModelCache
+from design_baselines.checkpoints import VAECache
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.utils import spearman
 from design_baselines.gradient_ascent.trainers import MaximumLikelihood
 from design_baselines.gradient_ascent.trainers import Ensemble, VAETrainer
 from design_baselines.gradient_ascent.nets import ForwardModel, SequentialVAE
-import tensorflow_probability as tfp
+from design_baselines.gradient_ascent.solver import GradientAscentSolver
+from design_baselines.utils import set_seed
 import tensorflow as tf
 import numpy as np
 import os
@@ -20,16 +26,27 @@ def gradient_ascent(config):
         a dictionary of hyper parameters such as the learning rate
     """
 
+    # models are only cached when training is seeded
+    if config.get('seed', None) is not None:
+        set_seed(config['seed'])
+
     # create the training task and logger
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
 
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if task.is_discrete and not config["use_vae"]:
-        task.map_to_logits()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if task.is_discrete and not config["use_vae"] \
+                and config.get('lazy_logits', False):
+            task.map_to_lazy_logits()
+        elif task.is_discrete and not config["use_vae"]:
+            task.map_to_logits()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
@@ -47,7 +64,9 @@ def gradient_ascent(config):
         vae_trainer = VAETrainer(vae_model,
                                  vae_optim=tf.keras.optimizers.Adam,
                                  vae_lr=config['vae_lr'],
-                                 beta=config['vae_beta'])
+                                 beta=config['vae_beta'],
+                                 jit_compile=config.get('jit_compile', False))
+        logger.watch(vae_trainer)
 
         # create the training task and logger
         train_data, val_data = build_pipeline(
@@ -55,119 +74,208 @@ def gradient_ascent(config):
             batch_size=config['vae_batch_size'],
             val_size=config['val_size'])
 
-        # estimate the number of training steps per epoch
-        vae_trainer.launch(train_data, val_data,
-                           logger, config['vae_epochs'])
+        # the dataset key is None when the subsample is not reproducible
+        dataset_key = get_dataset_key(task.task_name, task.task_kwargs,
+                                      seed=task.dataset_seed)
+        if config.get('vae_cache_dir', None) is not None \
+                and config.get('seed', None) is not None \
+                and dataset_key is not None:
+
+            # restore a VAE and latent dataset shared by latent baselines
+            vae_cache = VAECache(config['vae_cache_dir'])
+            vae_key = vae_cache.get_key(
+                dataset=dataset_key,
+                hidden_size=config['vae_hidden_size'],
+                latent_size=config['vae_latent_size'],
+                activation=config['vae_activation'],
+                kernel_size=config['vae_kernel_size'],
+                num_blocks=config['vae_num_blocks'],
+                lr=config['vae_lr'], beta=config['vae_beta'],
+                batch_size=config['vae_batch_size'],
+                val_size=config['val_size'], epochs=config['vae_epochs'],
+                seed=config['seed'])
+            with logger.span('vae'):
+                vae_cache.launch(vae_key, vae_trainer, train_data, val_data,
+                                 logger, config['vae_epochs'])
+            x, mean, standard_dev = vae_cache.encode(vae_key, vae_model, x)
+
+        else:
+
+            # estimate the number of training steps per epoch
+            with logger.span('vae'):
+                vae_trainer.launch(train_data, val_data,
+                                   logger, config['vae_epochs'])
 
-        # map the x values to latent space
-        x = vae_model.encoder_cnn.predict(x)[0]
+            # map the x values to latent space
+            x = vae_model.encoder_cnn.predict(x)[0]
 
-        mean = np.mean(x, axis=0, keepdims=True)
-        standard_dev = np.std(x - mean, axis=0, keepdims=True)
-        x = (x - mean) / standard_dev
+            mean = np.mean(x, axis=0, keepdims=True)
+            standard_dev = np.std(x - mean, axis=0, keepdims=True)
+            x = (x - mean) / standard_dev
 
     input_shape = x.shape[1:]
+    if task.is_lazy_logits:
+        input_shape = list(input_shape) + [task.num_classes - 1]
     input_size = np.prod(input_shape)
 
-    # make several keras neural networks with different architectures
-    forward_models = [ForwardModel(
-        input_shape,
-        activations=activations,
-        hidden_size=config['hidden_size'],
-        initial_max_std=config['initial_max_std'],
-        initial_min_std=config['initial_min_std'])
-        for activations in config['activations']]
-
     # scale the learning rate based on the number of channels in x
-    config['solver_lr'] *= np.sqrt(np.prod(x.shape[1:]))
+    config['solver_lr'] *= np.sqrt(input_size)
+
+    def map_to_logits(x, *rest):
+        return (task.lazy_to_logits(x), *rest)
+
+    def get_pipeline(**kwargs):
+        train_data, validate_data = build_pipeline(x=x, y=y, **kwargs)
+        if task.is_lazy_logits:
 
-    trs = []
-    for i, fm in enumerate(forward_models):
+            # convert only the designs in every batch to logits
+            train_data = train_data.map(
+                map_to_logits,
+                num_parallel_calls=tf.data.experimental.AUTOTUNE)
+            validate_data = validate_data.map(
+                map_to_logits,
+                num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        return train_data, validate_data
 
-        # create a bootstrapped data set
-        train_data, validate_data = build_pipeline(
-            x=x, y=y, batch_size=config['batch_size'],
-            val_size=config['val_size'], bootstraps=1)
+    def launch(trainer, member, *args, **kwargs):
+        logger.watch(trainer)
+        if config.get('model_cache_dir', None) is None \
+                or config.get('seed', None) is None \
+                or config["use_vae"]:
+            with logger.span('ensemble'):
+                return trainer.launch(*args, **kwargs)
 
-        # create a trainer for a forward model with a conservative objective
-        trainer = MaximumLikelihood(
-            fm,
+        # restore the model when an identical one was trained before
+        cache = ModelCache(config['model_cache_dir'])
+        key = cache.get_key(
+            seed=config['seed'], model='gradient_ascent', member=member,
+            **{name: config.get(name, None) for name in (
+                'task', 'task_kwargs', 'normalize_ys', 'normalize_xs',
+                'lazy_logits', 'stacked_ensemble', 'activations',
+                'hidden_size', 'initial_max_std', 'initial_min_std',
+                'forward_model_lr', 'batch_size', 'val_size', 'epochs',
+                'model_noise_std')})
+        with logger.span('ensemble'):
+            cache.launch(key, trainer, *args, **kwargs)
+
+    if config.get('stacked_ensemble', False):
+
+        # stacking members requires that they share one architecture
+        if any(list(activations) != list(config['activations'][0])
+               for activations in config['activations']):
+            raise ValueError("a stacked ensemble requires every "
+                             "member to use the same activations")
+
+        # make one keras neural network that stacks every member
+        forward_model = StackedForwardModel(
+            input_shape,
+            bootstraps=len(config['activations']),
+            activations=config['activations'][0],
+            hidden_size=config['hidden_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+
+        # create a bootstrapped data set with one column per member
+        train_data, validate_data = get_pipeline(
+            batch_size=config['batch_size'],
+            val_size=config['val_size'],
+            bootstraps=len(config['activations']))
+
+        # create a trainer that updates every member in one step
+        trainer = StackedEnsemble(
+            forward_model,
             forward_model_optim=tf.keras.optimizers.Adam,
             forward_model_lr=config['forward_model_lr'],
-            noise_std=config.get('model_noise_std', 0.0))
+            noise_std=config.get('model_noise_std', 0.0),
+            jit_compile=config.get('jit_compile', False))
 
         # train the model for an additional number of epochs
-        trs.append(trainer)
-        trainer.launch(train_data, validate_data, logger,
-                       config['epochs'], header=f'oracle_{i}/')
+        launch(trainer, None, train_data, validate_data,
+               logger, config['epochs'])
+
+        def get_predictions(xt):
+            return forward_model.get_distribution(xt).mean()
+
+    else:
+
+        # make several keras neural networks with different architectures
+        forward_models = [ForwardModel(
+            input_shape,
+            activations=activations,
+            hidden_size=config['hidden_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+            for activations in config['activations']]
+
+        trs = []
+        for i, fm in enumerate(forward_models):
+
+            # create a bootstrapped data set
+            train_data, validate_data = get_pipeline(
+                batch_size=config['batch_size'],
+                val_size=config['val_size'], bootstraps=1)
+
+            # create a trainer for a forward model with a conservative objective
+            trainer = MaximumLikelihood(
+                fm,
+                forward_model_optim=tf.keras.optimizers.Adam,
+                forward_model_lr=config['forward_model_lr'],
+                noise_std=config.get('model_noise_std', 0.0),
+                jit_compile=config.get('jit_compile', False))
+
+            # train the model for an additional number of epochs
+            trs.append(trainer)
+            launch(trainer, i, train_data, validate_data, logger,
+                   config['epochs'], header=f'oracle_{i}/')
+
+        def get_predictions(xt):
+            return tf.stack([fm.get_distribution(
+                xt).mean() for fm in forward_models], axis=0)
 
     # select the top k initial designs from the dataset
-    mean_x = tf.reduce_mean(x, axis=0, keepdims=True)
+    if task.is_lazy_logits:
+        mean_x = tf.add_n([tf.reduce_sum(task.lazy_to_logits(
+            x[i:i + 4096]), axis=0, keepdims=True)
+            for i in range(0, x.shape[0], 4096)]) / x.shape[0]
+    else:
+        mean_x = tf.reduce_mean(x, axis=0, keepdims=True)
     indices = tf.math.top_k(y[:, 0], k=config['solver_samples'])[1]
     initial_x = tf.gather(x, indices, axis=0)
+    if task.is_lazy_logits:
+        initial_x = task.lazy_to_logits(initial_x)
     x = initial_x
 
-    # evaluate the starting point
-    solution = x
+    # perform gradient ascent on the score through the forward model
+    solver = GradientAscentSolver(
+        get_predictions, solver_lr=config['solver_lr'],
+        aggregation_method=config['aggregation_method'],
+        jit_compile=config.get('jit_compile', False))
+    with logger.span('solver'):
+        solution, diagnostics = solver.solve(
+            initial_x, mean_x, config['solver_steps'])
+
+    # evaluate the designs using the forward model
+    preds = diagnostics['predictions']
     if task.is_normalized_y:
-        preds = [task.denormalize_y(
-            fm.get_distribution(solution).mean())
-            for fm in forward_models]
-    else:
-        preds = [fm.get_distribution(solution).mean()
-                 for fm in forward_models]
-
-    # record the prediction and score to the logger
-    logger.record("distance/travelled", tf.linalg.norm(solution - initial_x), 0)
-    logger.record("distance/from_mean", tf.linalg.norm(solution - mean_x), 0)
-    for n, prediction_i in enumerate(preds):
-        logger.record(f"oracle_{n}/prediction", prediction_i, 0)
-        if n > 0:
-            logger.record(f"rank_corr/0_to_{n}",
-                          spearman(preds[0][:, 0], prediction_i[:, 0]), 0)
+        preds = task.denormalize_y(preds)
 
-    # perform gradient ascent on the score through the forward model
-    for i in range(1, config['solver_steps'] + 1):
-        # back propagate through the forward model
-        with tf.GradientTape() as tape:
-            tape.watch(x)
-            predictions = []
-            for fm in forward_models:
-                solution = x
-                predictions.append(fm.get_distribution(solution).mean())
-            if config['aggregation_method'] == 'mean':
-                score = tf.reduce_min(predictions, axis=0)
-            if config['aggregation_method'] == 'min':
-                score = tf.reduce_min(predictions, axis=0)
-            if config['aggregation_method'] == 'random':
-                score = predictions[np.random.randint(len(predictions))]
-        grads = tape.gradient(score, x)
-
-        # use the conservative optimizer to update the solution
-        x = x + config['solver_lr'] * grads
-        solution = x
-
-        # evaluate the design using the oracle and the forward model
-        if task.is_normalized_y:
-            preds = [task.denormalize_y(
-                fm.get_distribution(solution).mean())
-                for fm in forward_models]
-        else:
-            preds = [fm.get_distribution(solution).mean()
-                     for fm in forward_models]
-
-        # record the prediction and score to the logger
-        logger.record("distance/travelled", tf.linalg.norm(solution - initial_x), i)
-        logger.record("distance/from_mean", tf.linalg.norm(solution - mean_x), i)
-        for n, prediction_i in enumerate(preds):
-            logger.record(f"oracle_{n}/prediction", prediction_i, i)
-            logger.record(f"oracle_{n}/grad_norm", tf.linalg.norm(
-                tf.reshape(grads[n], [-1, input_size]), axis=-1), i)
+    # record the prediction and score to the logger on a stride
+    log_every = config.get('solver_log_every', 1)
+    for i in sorted(set(range(0, config['solver_steps'] + 1, log_every))
+                    | {config['solver_steps']}):
+        logger.record("distance/travelled", diagnostics['travelled'][i], i)
+        logger.record("distance/from_mean", diagnostics['from_mean'][i], i)
+        for n in range(preds.shape[1]):
+            logger.record(f"oracle_{n}/prediction", preds[i, n], i)
+            if i > 0:
+                logger.record(f"oracle_{n}/grad_norm",
+                              diagnostics['grad_norm'][i - 1, n], i)
             if n > 0:
-                logger.record(f"rank_corr/0_to_{n}",
-                              spearman(preds[0][:, 0], prediction_i[:, 0]), i)
-                logger.record(f"grad_corr/0_to_{n}", tfp.stats.correlation(
-                    grads[0], grads[n], sample_axis=0, event_axis=None), i)
+                logger.record(f"rank_corr/0_to_{n}", spearman(
+                    preds[i, 0, :, 0], preds[i, n, :, 0]), i)
+            if n > 0 and i > 0:
+                logger.record(f"grad_corr/0_to_{n}",
+                              diagnostics['grad_corr'][i - 1, n - 1], i)
 
     if task.is_discrete and config["use_vae"]:
         solution = solution * standard_dev + mean
@@ -180,7 +288,12 @@ def gradient_ascent(config):
     if config["do_evaluation"]:
 
         # evaluate the found solution and record a video
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
         if task.is_normalized_y:
             score = task.denormalize_y(score)
         logger.record("score", score, config['solver_steps'], percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
@@ -0,0 +1,144 @@
+from design_baselines.utils import configure_steps
+import tensorflow_probability as tfp
+import tensorflow as tf
+
+
+class GradientAscentSolver(tf.Module):
+
+    def __init__(self,
+                 get_predictions,
+                 solver_lr=0.001,
+                 aggregation_method='min',
+                 jit_compile=False):
+        """Build a solver that performs gradient ascent on designs through
+        an ensemble of forward models, where the whole trajectory is
+        compiled into a single static graph
+
+        Args:
+
+        get_predictions: Callable
+            a function that accepts a batch of designs and returns the
+            predictions of every ensemble member stacked in a tensor
+            shaped like [num_members, batch_size, 1]
+        solver_lr: float
+            the learning rate used when updating designs
+        aggregation_method: str
+            the method used to aggregate predictions of the ensemble into
+            a score, either 'min' or 'random', where 'mean' is treated
+            the same as 'min' to match the eager solver
+        jit_compile: bool
+            whether to compile the whole trajectory with XLA, which
+            fuses the small operations of every gradient step
+        """
+
+        super().__init__()
+        self.get_predictions = get_predictions
+        self.solver_lr = solver_lr
+        self.aggregation_method = aggregation_method
+
+        # compile the solver with XLA when requested
+        configure_steps(self, 'solve', jit_compile=jit_compile)
+
+    @tf.function(experimental_relax_shapes=True)
+    def solve(self,
+              initial_x,
+              mean_x,
+              steps):
+        """Perform gradient ascent on a batch of designs for a fixed number
+        of steps, collecting diagnostics for every step
+
+        Args:
+
+        initial_x: tf.Tensor
+            a batch of starting designs shaped like [batch_size, channels]
+        mean_x: tf.Tensor
+            the mean design in the dataset shaped like [1, channels]
+        steps: int
+            the number of gradient ascent steps to perform
+
+        Returns:
+
+        x: tf.Tensor
+            the final batch of designs shaped like [batch_size, channels]
+        diagnostics: dict
+            a dictionary of tensors with one leading entry per step,
+            containing 'predictions' shaped like
+            [steps + 1, num_members, batch_size, 1], 'travelled' and
+            'from_mean' shaped like [steps + 1], 'grad_norm' shaped like
+            [steps, num_members] with the norm of the gradient of every
+            member, and 'grad_corr' shaped like [steps, num_members - 1]
+            with the correlation between the gradients of the first
+            member and every other member
+        """
+
+        predictions_ta = tf.TensorArray(tf.float32, size=steps + 1)
+        travelled_ta = tf.TensorArray(tf.float32, size=steps + 1)
+        from_mean_ta = tf.TensorArray(tf.float32, size=steps + 1)
+        grad_norm_ta = tf.TensorArray(tf.float32, size=steps)
+        grad_corr_ta = tf.TensorArray(tf.float32, size=steps)
+
+        def gradient_step(i, x, predictions_ta, travelled_ta,
+                          from_mean_ta, grad_norm_ta, grad_corr_ta):
+
+            # back propagate through the forward model
+            with tf.GradientTape(persistent=True) as tape:
+                tape.watch(x)
+                predictions = self.get_predictions(x)
+                num_members = predictions.shape[0]
+                if self.aggregation_method == 'random':
+                    score = predictions[tf.random.uniform(
+                        [], maxval=num_members, dtype=tf.int32)]
+                else:
+                    score = tf.reduce_min(predictions, axis=0)
+                member_score = tf.reduce_sum(predictions, axis=[1, 2])
+            grads = tape.gradient(score, x)
+
+            # designs are independent so the gradient of the sum of the
+            # predictions of a member is its gradient for every design
+            member_grads = tf.reshape(tape.jacobian(
+                member_score, x), [num_members, -1])
+            del tape
+
+            # record the predictions made for the current designs
+            predictions_ta = predictions_ta.write(i, predictions)
+            travelled_ta = travelled_ta.write(
+                i, tf.linalg.norm(x - initial_x))
+            from_mean_ta = from_mean_ta.write(
+                i, tf.linalg.norm(x - mean_x))
+
+            # record the gradient norm of every member and how well the
+            # gradient of every member agrees with the first member
+            grad_norm_ta = grad_norm_ta.write(
+                i, tf.linalg.norm(member_grads, axis=-1))
+            grad_corr = [tfp.stats.correlation(
+                member_grads[0], member_grads[n],
+                sample_axis=0, event_axis=None)
+                for n in range(1, num_members)]
+            grad_corr_ta = grad_corr_ta.write(i, tf.stack(
+                grad_corr, axis=0) if grad_corr else tf.zeros([0]))
+
+            # use the conservative optimizer to update the solution
+            return (i + 1, x + self.solver_lr * grads, predictions_ta,
+                    travelled_ta, from_mean_ta, grad_norm_ta, grad_corr_ta)
+
+        # run the entire trajectory inside one while loop
+        (i, x, predictions_ta, travelled_ta, from_mean_ta,
+         grad_norm_ta, grad_corr_ta) = tf.while_loop(
+            lambda i, *rest: True, gradient_step,
+            (tf.constant(0), initial_x, predictions_ta, travelled_ta,
+             from_mean_ta, grad_norm_ta, grad_corr_ta),
+            maximum_iterations=steps)
+
+        # record the predictions made for the final designs
+        predictions_ta = predictions_ta.write(
+            steps, self.get_predictions(x))
+        travelled_ta = travelled_ta.write(
+            steps, tf.linalg.norm(x - initial_x))
+        from_mean_ta = from_mean_ta.write(
+            steps, tf.linalg.norm(x - mean_x))
+
+        return x, dict(predictions=predictions_ta.stack(),
+                       travelled=travelled_ta.stack(),
+                       from_mean=from_mean_ta.stack(),
+                       grad_norm=grad_norm_ta.stack(),
+                       grad_corr=grad_corr_ta.stack())
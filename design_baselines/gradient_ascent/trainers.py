@@ -1,6 +1,7 @@
 from design_baselines.utils import spearman
 from design_baselines.utils import soft_noise
 from design_baselines.utils import cont_noise
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow as tf
@@ -12,7 +13,8 @@ class Ensemble(tf.Module):
                  forward_models,
                  forward_model_optim=tf.keras.optimizers.Adam,
                  forward_model_lr=0.001,
-                 noise_std=0.0):
+                 noise_std=0.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -24,6 +26,9 @@ class Ensemble(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -36,6 +41,10 @@ class Ensemble(tf.Module):
             forward_model_optim(learning_rate=forward_model_lr)
             for i in range(self.bootstraps)]
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     def get_distribution(self,
                          x,
                          **kwargs):
@@ -232,9 +241,9 @@ class Ensemble(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -259,7 +268,8 @@ class MaximumLikelihood(tf.Module):
                  forward_model,
                  forward_model_optim=tf.keras.optimizers.Adam,
                  forward_model_lr=0.001,
-                 noise_std=0.0):
+                 noise_std=0.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -271,6 +281,9 @@ class MaximumLikelihood(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -279,6 +292,10 @@ class MaximumLikelihood(tf.Module):
             learning_rate=forward_model_lr)
         self.noise_std = noise_std
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x,
@@ -440,9 +457,9 @@ class MaximumLikelihood(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(header + name, loss, e)
+                logger.record(header + name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(header + name, loss, e)
+                logger.record(header + name, loss, e, level=1)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -466,7 +483,8 @@ class VAETrainer(tf.Module):
     def __init__(self,
                  vae,
                  vae_optim=tf.keras.optimizers.Adam,
-                 vae_lr=0.001, beta=1.0):
+                 vae_lr=0.001, beta=1.0,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -478,6 +496,9 @@ class VAETrainer(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -487,6 +508,10 @@ class VAETrainer(tf.Module):
         # create optimizers for each model in the ensemble
         self.vae_optim = vae_optim(learning_rate=vae_lr)
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    x):
@@ -635,6 +660,21 @@ class VAETrainer(tf.Module):
 
         for e in range(epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
+
+    def get_saveables(self):
+        """Collects and returns stateful objects that are serializeable
+        using the tensorflow checkpoint format
+
+        Returns:
+
+        saveables: dict
+            a dict containing stateful objects compatible with checkpoints
+        """
+
+        saveables = dict()
+        saveables['vae'] = self.vae
+        saveables['vae_optim'] = self.vae_optim
+        return saveables
@@ -0,0 +1,209 @@
+from design_baselines.utils import get_cache_dir
+import importlib
+import json
+import os
+import numpy as np
+
+
+# the full dataset and the task used to find the best design of every task
+TASK_SPECS = {
+    "tf-bind-8": dict(
+        dataset=("design_bench.datasets.discrete.tf_bind_8_dataset",
+                 "TFBind8Dataset", dict()),
+        task=("TFBind8-Exact-v0", dict())),
+    "tf-bind-10": dict(
+        dataset=("design_bench.datasets.discrete.tf_bind_10_dataset",
+                 "TFBind10Dataset", dict()),
+        task=("TFBind10-Exact-v0", dict(
+            dataset_kwargs=dict(max_samples=10000)))),
+    "chembl": dict(
+        dataset=("design_bench.datasets.discrete.chembl_dataset",
+                 "ChEMBLDataset", dict(assay_chembl_id="CHEMBL3885882",
+                                       standard_type="MCHC")),
+        task=("ChEMBL_MCHC_CHEMBL3885882_MorganFingerprint-RandomForest-v0",
+              dict())),
+    "cifar-nas": dict(
+        dataset=("design_bench.datasets.discrete.cifar_nas_dataset",
+                 "CIFARNASDataset", dict()),
+        task=("CIFARNAS-Exact-v0", dict())),
+    "superconductor": dict(
+        dataset=("design_bench.datasets.continuous.superconductor_dataset",
+                 "SuperconductorDataset", dict()),
+        task=("Superconductor-RandomForest-v0", dict())),
+    "ant": dict(
+        dataset=("design_bench.datasets.continuous.ant_morphology_dataset",
+                 "AntMorphologyDataset", dict()),
+        task=("AntMorphology-Exact-v0", dict())),
+    "dkitty": dict(
+        dataset=("design_bench.datasets.continuous.dkitty_morphology_dataset",
+                 "DKittyMorphologyDataset", dict()),
+        task=("DKittyMorphology-Exact-v0", dict())),
+    "gfp": dict(
+        dataset=("design_bench.datasets.discrete.gfp_dataset",
+                 "GFPDataset", dict()),
+        task=("GFP-Transformer-v0", dict())),
+    "utr": dict(
+        dataset=("design_bench.datasets.discrete.utr_dataset",
+                 "UTRDataset", dict()),
+        task=("UTR-ResNet-v0", dict(relabel=True))),
+    "hopper": dict(
+        dataset=("design_bench.datasets.continuous.hopper_controller_dataset",
+                 "HopperControllerDataset", dict()),
+        task=("HopperController-Exact-v0", dict())),
+}
+
+
+# the percentiles of the full dataset stored in the index
+PERCENTILES = [0, 50, 80, 90, 100]
+
+
+def get_index_path(path=None):
+    """Returns the path to the json file that stores the statistics of
+    every task, defaulting to a file in the design baselines cache
+
+    Args:
+
+    path: str
+        the path to an index file, or None to use the default path
+
+    Returns:
+
+    path: str
+        the path to the index file
+    """
+
+    return path if path is not None else os.path.join(
+        get_cache_dir('index'), 'tasks.json')
+
+
+def compute_task_statistics(name):
+    """Load the full dataset and the task associated with a short task
+    name and compute the statistics used when reporting results
+
+    Args:
+
+    name: str
+        the short name of a task, which must be a key of TASK_SPECS
+
+    Returns:
+
+    statistics: dict
+        a dictionary containing the min, max, mean, standard deviation,
+        percentiles, and size of the full dataset, and the best score
+        in the task dataset normalized by the full dataset
+    """
+
+    import design_bench as db
+
+    module, class_name, dataset_kwargs = TASK_SPECS[name]["dataset"]
+    dataset = getattr(importlib.import_module(
+        module), class_name)(**dataset_kwargs)
+    y = np.asarray(dataset.y, dtype=np.float64)
+
+    task_name, task_kwargs = TASK_SPECS[name]["task"]
+    task = db.make(task_name, **task_kwargs)
+    best = float(np.max(task.y))
+
+    y_min, y_max = float(y.min()), float(y.max())
+    return dict(min=y_min,
+                max=y_max,
+                mean=float(y.mean()),
+                standard_dev=float(y.std()),
+                percentiles={str(p): float(v) for p, v in zip(
+                    PERCENTILES, np.percentile(y, PERCENTILES))},
+                size=int(y.shape[0]),
+                best=best,
+                normalized_best=(best - y_min) / (y_max - y_min),
+                task_size=int(task.y.shape[0]))
+
+
+def load_task_index(path=None):
+    """Load the statistics of every task that was indexed before
+
+    Args:
+
+    path: str
+        the path to an index file, or None to use the default path
+
+    Returns:
+
+    index: dict
+        a dictionary mapping short task names to their statistics
+    """
+
+    path = get_index_path(path)
+    if not os.path.exists(path):
+        return dict()
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_task_index(index,
+                    path=None):
+    """Save the statistics of every task to the disk, writing to a
+    temporary file first so readers never see a partial index
+
+    Args:
+
+    index: dict
+        a dictionary mapping short task names to their statistics
+    path: str
+        the path to an index file, or None to use the default path
+    """
+
+    path = get_index_path(path)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as f:
+        json.dump(index, f, indent=4, sort_keys=True)
+    os.replace(temp, path)
+
+
+def index_tasks(names,
+                path=None,
+                overwrite=False):
+    """Compute the statistics of several tasks and add them to the index,
+    skipping tasks that are already indexed unless asked to overwrite
+
+    Args:
+
+    names: list of str
+        the short names of the tasks to index
+    path: str
+        the path to an index file, or None to use the default path
+    overwrite: bool
+        whether to compute the statistics of tasks that are indexed
+
+    Returns:
+
+    index: dict
+        a dictionary mapping short task names to their statistics
+    """
+
+    index = load_task_index(path)
+    missing = [n for n in names if overwrite or n not in index]
+    for name in missing:
+        index[name] = compute_task_statistics(name)
+        save_task_index(index, path)
+    return index
+
+
+def get_task_statistics(names,
+                        path=None):
+    """Returns the statistics of several tasks, which are read from the
+    index when possible and are otherwise computed and indexed
+
+    Args:
+
+    names: list of str
+        the short names of the tasks to return statistics for
+    path: str
+        the path to an index file, or None to use the default path
+
+    Returns:
+
+    statistics: dict
+        a dictionary mapping short task names to their statistics
+    """
+
+    index = index_tasks(names, path=path)
+    return {name: index[name] for name in names}
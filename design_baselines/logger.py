@@ -1,11 +1,79 @@
+from design_baselines.utils import get_peak_rss
+from design_baselines.utils import get_tracing_count
+from collections import OrderedDict
 import tensorflow as tf
 import tensorflow_probability as tfp
+import contextlib
+import functools
+import json
+import time
+import os
+
+
+# the percentiles and moments computed for every buffered tensor
+PERCENTILES = (('100th', 100.0), ('90th', 90.0),
+               ('80th', 80.0), ('50th', 50.0))
+MOMENTS = ('max', 'mean', 'min', 'std')
+
+# marks a summary as a scalar so that tensorboard can display it
+SCALAR_METADATA = tf.compat.v1.SummaryMetadata(
+    plugin_data=tf.compat.v1.SummaryMetadata.PluginData(
+        plugin_name='scalars')).SerializeToString()
+
+
+@tf.function(experimental_relax_shapes=True)
+def summarize(values, lengths):
+    """Compute the percentiles and moments of many flattened tensors
+    at once, where every tensor is a contiguous segment of values
+
+    Arguments:
+
+    values: tf.Tensor
+        the concatenation of every flattened tensor shaped like [total]
+    lengths: tf.Tensor
+        the number of elements in every tensor shaped like [num_tensors]
+
+    Returns:
+
+    statistics: tf.Tensor
+        the statistics of every tensor shaped like [num_tensors, 8] in
+        the order of PERCENTILES followed by MOMENTS
+    """
+
+    num_segments = tf.shape(lengths)[0]
+    segments = tf.repeat(tf.range(num_segments), lengths)
+    offsets = tf.cumsum(lengths, exclusive=True)
+
+    # sort values within each segment using two stable sorts
+    order = tf.argsort(values, stable=True)
+    order = tf.gather(order, tf.argsort(
+        tf.gather(segments, order), stable=True))
+    sorted_values = tf.gather(values, order)
+
+    # nearest rank percentiles matching tfp.stats.percentile
+    percentiles = [tf.gather(sorted_values, offsets + tf.cast(tf.round(
+        tf.cast(lengths - 1, tf.float32) * q / 100.0), tf.int32))
+        for name, q in PERCENTILES]
+
+    # moments matching the tf.math reductions
+    mean = tf.math.unsorted_segment_mean(values, segments, num_segments)
+    std = tf.sqrt(tf.math.unsorted_segment_mean((values - tf.gather(
+        mean, segments)) ** 2, segments, num_segments))
+    moments = [tf.math.unsorted_segment_max(values, segments, num_segments),
+               mean,
+               tf.math.unsorted_segment_min(values, segments, num_segments),
+               std]
+
+    return tf.stack(percentiles + moments, axis=1)
 
 
 class Logger(object):
 
     def __init__(self,
-                 logging_dir):
+                 logging_dir,
+                 flush_interval=0,
+                 verbosity=1,
+                 profile_span=None):
         """Creates a logging interface to a tensorboard file for
         visualizing in the tensorboard web interface; note that
         mean, max, min, and std are recorded
@@ -14,16 +82,39 @@ class Logger(object):
 
         logging_dir: str
             the path on the disk to save records to
+        flush_interval: int
+            the number of records to buffer on device before computing
+            their statistics together and writing them in bulk, where
+            zero writes every record immediately
+        verbosity: int
+            the highest level of records that are written, where level
+            zero is reserved for results and level one for diagnostics
+        profile_span: str
+            the name of a timing span whose first call is traced with
+            the tensorflow profiler and written to the logging dir
         """
 
         tf.io.gfile.makedirs(logging_dir)
+        self.logging_dir = logging_dir
         self.writer = tf.summary.create_file_writer(logging_dir)
+        self.flush_interval = flush_interval
+        self.verbosity = verbosity
+
+        # wall clock statistics of every timing span
+        self.timing = OrderedDict()
+        self.watched = []
+        self.profile_span = profile_span
+
+        # records waiting to be written when buffering is enabled, which
+        # are written by close at the end of every experiment
+        self.buffer = []
 
     def record(self,
                key,
                value,
                step,
-               percentile=False):
+               percentile=False,
+               level=0):
         """Log statistics about training data to tensorboard
         log files for visualization later
 
@@ -38,8 +129,50 @@ class Logger(object):
         step: int
             the total number of environment steps collected so far
             typically on intervals of 10000
+        percentile: bool
+            whether to record percentiles instead of moments
+        level: int
+            the verbosity level of this record, which is dropped when
+            the level is greater than the verbosity of the logger
         """
 
+        if level > self.verbosity:
+            return
+
+        start = time.perf_counter()
+        self.write_record(key, value, step, percentile)
+        self.add_time('logging', time.perf_counter() - start)
+
+    def write_record(self,
+                     key,
+                     value,
+                     step,
+                     percentile):
+        """Buffer a record or write its statistics to tensorboard, which
+        is called by record after filtering by the verbosity level
+
+        Arguments:
+
+        key: str
+            the string name to use when logging data in tensorboard
+        value: tf.tensor
+            the tensor of values to record statistics about
+        step: int
+            the total number of environment steps collected so far
+        percentile: bool
+            whether to record percentiles instead of moments
+        """
+
+        if self.flush_interval > 0:
+
+            # keep the raw values on device until the next flush
+            value = tf.reshape(tf.cast(value, tf.float32), [-1])
+            if value.shape[0] > 0:
+                self.buffer.append((key, value, int(step), percentile))
+            if len(self.buffer) >= self.flush_interval:
+                self.flush()
+            return
+
         step = tf.cast(tf.convert_to_tensor(step), tf.int64)
         with self.writer.as_default():
 
@@ -79,3 +212,196 @@ class Logger(object):
                 tf.summary.scalar(key + '/std',
                                   tf.math.reduce_std(value),
                                   step=step)
+
+    def flush(self):
+        """Compute the statistics of every buffered record in a single
+        fused operation and write them to tensorboard in bulk
+        """
+
+        if len(self.buffer) == 0:
+            return
+        buffer, self.buffer = self.buffer, []
+
+        # select which statistics are written for every record
+        tags, indices, steps = [], [], []
+        for i, (key, value, step, percentile) in enumerate(buffer):
+            if value.shape[0] == 1:
+                names = [(key, len(PERCENTILES) + MOMENTS.index('mean'))]
+            elif percentile:
+                names = [(f'{key}/{name}', j)
+                         for j, (name, q) in enumerate(PERCENTILES)]
+            else:
+                names = [(f'{key}/{name}', len(PERCENTILES) + j)
+                         for j, name in enumerate(MOMENTS)]
+            for tag, j in names:
+                tags.append(tag)
+                indices.append([i, j])
+                steps.append(step)
+
+        # compute statistics for every record on device
+        statistics = summarize(
+            tf.concat([value for key, value, step, p in buffer], axis=0),
+            tf.stack([tf.size(value) for key, value, step, p in buffer]))
+        self.write_scalars(tf.constant(tags),
+                           tf.gather_nd(statistics, indices),
+                           tf.constant(steps, dtype=tf.int64))
+        self.writer.flush()
+
+    @tf.function(experimental_relax_shapes=True)
+    def write_scalars(self, tags, values, steps):
+        """Write many scalar summaries to tensorboard inside a single
+        static graph rather than one eager operation per summary
+
+        Arguments:
+
+        tags: tf.Tensor
+            the string name of every summary shaped like [num_summaries]
+        values: tf.Tensor
+            the value of every summary shaped like [num_summaries]
+        steps: tf.Tensor
+            the step of every summary shaped like [num_summaries]
+        """
+
+        with self.writer.as_default():
+            for i in tf.range(tf.shape(tags)[0]):
+                tf.summary.write(tags[i], values[i], step=steps[i],
+                                 metadata=SCALAR_METADATA)
+
+    def watch(self,
+              *objects):
+        """Count the traces of the tf.functions of several objects such
+        as trainers, which are recorded by every timing span
+
+        Arguments:
+
+        objects: list
+            a list of tf.functions and objects whose methods are
+            decorated with tf.function
+        """
+
+        self.watched.extend(objects)
+
+    def add_time(self,
+                 name,
+                 seconds,
+                 traces=0):
+        """Add a call of a timing span to its cumulative statistics
+
+        Arguments:
+
+        name: str
+            the name of the timing span
+        seconds: float
+            the wall clock duration of the call in seconds
+        traces: int
+            the number of tf.function traces during the call
+
+        Returns:
+
+        statistics: dict
+            the cumulative statistics of the timing span
+        """
+
+        statistics = self.timing.setdefault(name, dict(
+            calls=0, total_seconds=0.0, max_seconds=0.0,
+            traces=0, peak_rss_mb=0.0))
+        statistics['calls'] += 1
+        statistics['total_seconds'] += seconds
+        statistics['max_seconds'] = max(statistics['max_seconds'], seconds)
+        statistics['traces'] += traces
+        statistics['peak_rss_mb'] = get_peak_rss()
+        return statistics
+
+    @contextlib.contextmanager
+    def span(self,
+             name,
+             step=None):
+        """Measure the wall clock time of a phase of an experiment and
+        record it as timing scalars, where spans may be nested and
+        every span includes the time of the spans inside it
+
+        Arguments:
+
+        name: str
+            the name of the timing span such as 'ensemble' or 'solver'
+        step: int
+            the step of the timing scalars, which defaults to the number
+            of previous calls of this span
+        """
+
+        # trace the first call of one span with the profiler
+        profile = name == self.profile_span
+        if profile:
+            self.profile_span = None
+            tf.profiler.experimental.start(self.logging_dir)
+
+        traces = get_tracing_count(*self.watched)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profile:
+                tf.profiler.experimental.stop()
+
+            statistics = self.add_time(
+                name, seconds, get_tracing_count(*self.watched) - traces)
+            step = statistics['calls'] - 1 if step is None else step
+            self.record(f'timing/{name}/seconds', seconds, step, level=1)
+            for key in ('total_seconds', 'traces', 'peak_rss_mb'):
+                self.record(f'timing/{name}/{key}',
+                            float(statistics[key]), step, level=1)
+
+    def timed(self,
+              name):
+        """Returns a decorator that measures every call of a function
+        using a timing span with the given name
+
+        Arguments:
+
+        name: str
+            the name of the timing span such as 'ensemble' or 'solver'
+
+        Returns:
+
+        decorator: Callable
+            a decorator that wraps a function in a timing span
+        """
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapped(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def save_timing(self,
+                    path=None):
+        """Write the cumulative statistics of every timing span to a json
+        file, which defaults to timing.json in the logging dir
+
+        Arguments:
+
+        path: str
+            the path of the json file to write
+        """
+
+        path = path if path is not None \
+            else os.path.join(self.logging_dir, 'timing.json')
+        summary = OrderedDict()
+        for name, statistics in self.timing.items():
+            summary[name] = dict(statistics, mean_seconds=statistics[
+                'total_seconds'] / max(1, statistics['calls']))
+        with tf.io.gfile.GFile(path, "w") as f:
+            f.write(json.dumps(summary, indent=4))
+
+    def close(self):
+        """Write every buffered record to tensorboard and close the file,
+        which every experiment calls when it finishes, since records left
+        in the buffer are lost when a worker process is killed
+        """
+
+        self.flush()
+        self.writer.flush()
+        self.writer.close()
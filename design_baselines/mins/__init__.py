@@ -1,5 +1,8 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
+from design_baselines.data import DesignStore
 from design_baselines.logger import Logger
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.mins.replay_buffer import ReplayBuffer
 from design_baselines.mins.trainers import Ensemble
 from design_baselines.mins.trainers import WeightedGAN
@@ -11,7 +14,7 @@ from design_baselines.mins.nets import ConvDiscriminator
 from design_baselines.mins.nets import DiscreteConvGenerator
 from design_baselines.mins.nets import ContinuousConvGenerator
 from design_baselines.mins.utils import get_weights
-from design_baselines.mins.utils import get_synthetic_data
+from design_baselines.mins.utils import get_synthetic_samples
 import tensorflow as tf
 import  numpy as np
 import os
@@ -28,17 +31,28 @@ def mins(config):
     """
 
     # create the training task and logger
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
-
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
+
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
 
+    # trace every step function once by padding and masking last batches
+    fixed = config.get('fixed_batch_size', False)
+    debug_retracing = config.get('debug_retracing', False)
+
+    # compile the training and sampling steps with XLA when requested
+    jit_compile = config.get('jit_compile', False)
+
     def map_to_probs(x, *rest):
         x = task.to_logits(x)
         x = tf.pad(x, [[0, 0]] * (len(x.shape) - 1) + [[1, 0]])
@@ -52,23 +66,54 @@ def mins(config):
 
     if config['offline']:
 
-        # make several keras neural networks with two hidden layers
-        forward_models = [ForwardModel(
-            input_shape,
-            hidden_size=config['hidden_size'],
-            num_layers=config['num_layers'],
-            initial_max_std=config['initial_max_std'],
-            initial_min_std=config['initial_min_std'])
-            for _ in range(config['bootstraps'])]
-
-        # create a trainer for a forward model with a conservative objective
-        oracle = Ensemble(forward_models,
-                          forward_model_optim=tf.keras.optimizers.Adam,
-                          forward_model_lr=config['oracle_lr'],
-                          is_discrete=task.is_discrete,
-                          noise_std=config.get('noise_std', 0.0),
-                          keep=config.get('keep', 1.0),
-                          temp=config.get('temp', 0.001))
+        if config.get('stacked_ensemble', False):
+
+            # make one keras neural network that stacks every bootstrap
+            forward_model = StackedForwardModel(
+                input_shape,
+                bootstraps=config['bootstraps'],
+                activations=['leaky_relu'] * config['num_layers'],
+                hidden_size=config['hidden_size'],
+                initial_max_std=config['initial_max_std'],
+                initial_min_std=config['initial_min_std'])
+
+            # create a trainer that updates every bootstrap in one step
+            oracle = StackedEnsemble(
+                forward_model,
+                forward_model_optim=tf.keras.optimizers.Adam,
+                forward_model_lr=config['oracle_lr'],
+                is_discrete=task.is_discrete,
+                noise_std=config.get('noise_std', 0.0),
+                keep=config.get('keep', 1.0),
+                temp=config.get('temp', 0.001),
+                fixed_batch_size=config['oracle_batch_size']
+                if fixed else None,
+                debug_retracing=debug_retracing,
+                jit_compile=jit_compile)
+
+        else:
+
+            # make several keras neural networks with two hidden layers
+            forward_models = [ForwardModel(
+                input_shape,
+                hidden_size=config['hidden_size'],
+                num_layers=config['num_layers'],
+                initial_max_std=config['initial_max_std'],
+                initial_min_std=config['initial_min_std'])
+                for _ in range(config['bootstraps'])]
+
+            # create a trainer for a forward model with a conservative objective
+            oracle = Ensemble(forward_models,
+                              forward_model_optim=tf.keras.optimizers.Adam,
+                              forward_model_lr=config['oracle_lr'],
+                              is_discrete=task.is_discrete,
+                              noise_std=config.get('noise_std', 0.0),
+                              keep=config.get('keep', 1.0),
+                              temp=config.get('temp', 0.001),
+                              fixed_batch_size=config['oracle_batch_size']
+                              if fixed else None,
+                              debug_retracing=debug_retracing,
+                              jit_compile=jit_compile)
 
         # build a bootstrapped data set
         train_data, val_data = build_pipeline(
@@ -83,10 +128,12 @@ def mins(config):
                 map_to_probs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
         # train the model for an additional number of epochs
-        oracle.launch(train_data,
-                      val_data,
-                      logger,
-                      config['oracle_epochs'])
+        logger.watch(oracle)
+        with logger.span('ensemble'):
+            oracle.launch(train_data,
+                          val_data,
+                          logger,
+                          config['oracle_epochs'])
 
     disc_class = Discriminator
     dgen_class = DiscreteGenerator
@@ -140,7 +187,10 @@ def mins(config):
         noise_std=config.get('noise_std', 0.0),
         keep=config.get('keep', 1.0),
         start_temp=config.get('start_temp', 5.0),
-        final_temp=config.get('final_temp', 1.0))
+        final_temp=config.get('final_temp', 1.0),
+        fixed_batch_size=config['gan_batch_size'] if fixed else None,
+        debug_retracing=debug_retracing,
+        jit_compile=jit_compile)
 
     # build the neural network GAN components
     exploit_discriminator = disc_class(
@@ -163,7 +213,11 @@ def mins(config):
         noise_std=config.get('noise_std', 0.0),
         keep=config.get('keep', 1.0),
         start_temp=config.get('start_temp', 5.0),
-        final_temp=config.get('final_temp', 1.0))
+        final_temp=config.get('final_temp', 1.0),
+        fixed_batch_size=config['gan_batch_size'] if fixed else None,
+        debug_retracing=debug_retracing,
+        jit_compile=jit_compile)
+    logger.watch(explore_gan, exploit_gan)
 
     # build a weighted data set using newly collected samples
     train_data, val_data = build_pipeline(
@@ -178,9 +232,10 @@ def mins(config):
             map_to_probs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
     # train the gan for several epochs
-    explore_gan.launch(
-        train_data, val_data, logger, config['initial_epochs'],
-        header="exploration/")
+    with logger.span('gan'):
+        explore_gan.launch(
+            train_data, val_data, logger, config['initial_epochs'],
+            header="exploration/")
 
     # sample designs from the GAN and evaluate them
     condition_ys = tf.tile(tf.reduce_max(
@@ -194,9 +249,10 @@ def mins(config):
                   percentile=True)
 
     # train the gan for several epochs
-    exploit_gan.launch(
-        train_data, val_data, logger, config['initial_epochs'],
-        header="exploitation/")
+    with logger.span('gan'):
+        exploit_gan.launch(
+            train_data, val_data, logger, config['initial_epochs'],
+            header="exploitation/")
 
     # record score percentiles
     logger.record("exploitation/condition_ys",
@@ -210,20 +266,24 @@ def mins(config):
         explore_gan.start_temp = explore_gan.final_temp
         exploit_gan.start_temp = exploit_gan.final_temp
 
+    # store the growing data set in memory that doubles when full
+    store = DesignStore(x, y)
+
     # train the gan using an importance sampled data set
     for iteration in range(config['iterations']):
 
         # generate synthetic x paired with high performing scores
-        tilde_x, tilde_y = get_synthetic_data(
-            x, y,
-            exploration_samples=config['exploration_samples'],
-            exploration_rate=config['exploration_rate'],
-            base_temp=base_temp)
+        size = store.size
+        with logger.span('sampling'):
+            store.append(*get_synthetic_samples(
+                store.xs, store.y_numpy,
+                exploration_samples=config['exploration_samples'],
+                exploration_rate=config['exploration_rate'],
+                base_temp=base_temp, size=store.size))
 
         # build a weighted data set using newly collected samples
-        train_data, val_data = build_pipeline(
-            x=tilde_x.numpy(), y=tilde_y.numpy(),
-            w=get_weights(tilde_y.numpy(), base_temp=base_temp),
+        train_data, val_data = store.build_pipeline(
+            w=get_weights(store.y_numpy, base_temp=base_temp),
             batch_size=config['gan_batch_size'],
             val_size=config['val_size'], buffer=1)
 
@@ -234,15 +294,19 @@ def mins(config):
                 map_to_probs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
         # train the gan for several epochs
-        explore_gan.launch(
-            train_data, val_data, logger, config['epochs_per_iteration'],
-            start_epoch=config['epochs_per_iteration'] * iteration +
-                        config['initial_epochs'],
-            header="exploration/")
+        with logger.span('gan'):
+            explore_gan.launch(
+                train_data, val_data, logger, config['epochs_per_iteration'],
+                start_epoch=config['epochs_per_iteration'] * iteration +
+                            config['initial_epochs'],
+                header="exploration/")
 
         # sample designs from the GAN and evaluate them
-        condition_ys = tf.tile(tf.reduce_max(
-            tilde_y, keepdims=True), [config['thompson_samples'], 1])
+        condition_ys = tf.tile(np.max(
+            store.y_numpy, keepdims=True), [config['thompson_samples'], 1])
+
+        # remove the synthetic samples from the data set
+        store.rewind(size)
 
         # generate samples for exploration
         solver_xs = explore_gen.sample(condition_ys, temp=0.001)
@@ -264,14 +328,12 @@ def mins(config):
                       0,
                       percentile=True)
 
-        # concatenate newly paired samples with the existing data set
-        x = tf.concat([x, solver_xs], 0)
-        y = tf.concat([y, actual_ys], 0)
+        # append newly paired samples to the existing data set
+        store.append(solver_xs, actual_ys)
 
         # build a weighted data set using newly collected samples
-        train_data, val_data = build_pipeline(
-            x=x.numpy(), y=y.numpy(),
-            w=get_weights(y.numpy(), base_temp=base_temp),
+        train_data, val_data = store.build_pipeline(
+            w=get_weights(store.y_numpy, base_temp=base_temp),
             batch_size=config['gan_batch_size'],
             val_size=config['val_size'], buffer=1)
 
@@ -282,15 +344,16 @@ def mins(config):
                 map_to_probs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
         # train the gan for several epochs
-        exploit_gan.launch(
-            train_data, val_data, logger, config['epochs_per_iteration'],
-            start_epoch=config['epochs_per_iteration'] * iteration +
-                        config['initial_epochs'],
-            header="exploitation/")
+        with logger.span('gan'):
+            exploit_gan.launch(
+                train_data, val_data, logger, config['epochs_per_iteration'],
+                start_epoch=config['epochs_per_iteration'] * iteration +
+                            config['initial_epochs'],
+                header="exploitation/")
 
         # sample designs from the GAN and evaluate them
-        condition_ys = tf.tile(tf.reduce_max(
-            y, keepdims=True), [config['solver_samples'], 1])
+        condition_ys = tf.tile(np.max(
+            store.y_numpy, keepdims=True), [config['solver_samples'], 1])
 
         # record score percentiles
         logger.record("exploitation/condition_ys",
@@ -310,7 +373,12 @@ def mins(config):
     if config["do_evaluation"]:
 
         # evaluate the found solution and record a video
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
         if task.is_normalized_y:
             score = task.denormalize_y(score)
         logger.record("score", score, config['iterations'], percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
@@ -32,13 +32,6 @@ class ReplayBuffer(tf.Module):
         self.ys = tf.Variable(
             tf.zeros([capacity, 1], tf.dtypes.float32))
 
-        # a tensor for indexing into scatter_nd_update
-        self.idx = tf.concat([tf.tile(tf.reshape(
-            tf.range(shape_i),
-            [1] * i + [shape_i] + [1] * (len(shape) - i)),
-            list(shape[:i]) + [1] + list(shape[i + 1:]) + [1])
-            for i, shape_i in enumerate(shape)], axis=len(shape))
-
     @tf.function
     def insert(self, x, y):
         """Insert a single sample collected from the environment into
@@ -54,30 +47,12 @@ class ReplayBuffer(tf.Module):
             images may be shaped like [1]
         """
 
-        # create scatter indices for one sample
-        loc_x = tf.reshape(self.head, [1] * (len(self.shape) + 1))
-        loc_x = tf.broadcast_to(loc_x, tf.shape(self.idx))[..., 0:1]
-        loc_x = tf.concat([loc_x, self.idx], axis=len(self.shape))
-        loc_y = tf.concat([tf.reshape(self.head, [1, 1]), [[0]]], axis=1)
-
-        # insert samples at the position of the current head
-        self.xs.assign(tf.tensor_scatter_nd_update(
-            self.xs, loc_x, tf.cast(x, tf.dtypes.float32)))
-        self.ys.assign(tf.tensor_scatter_nd_update(
-            self.ys, loc_y, tf.cast(y, tf.dtypes.float32)))
-
-        # increment the size statistics of the buffer
-        self.head.assign(
-            tf.math.floormod(self.head + 1, self.capacity))
-        self.size.assign(
-            tf.minimum(self.size + 1, self.capacity))
-        self.step.assign(
-            self.step + 1)
+        self.insert_many(x[tf.newaxis], y[tf.newaxis])
 
-    @tf.function
+    @tf.function(experimental_relax_shapes=True)
     def insert_many(self, xs, ys):
-        """Insert a single sample collected from the environment into
-        the replay buffer at the current head position
+        """Insert a batch of samples collected from the environment into
+        the replay buffer starting at the current head position
 
         Args:
 
@@ -89,11 +64,31 @@ class ReplayBuffer(tf.Module):
             images may be shaped like [batch, 1]
         """
 
-        for i in tf.range(tf.shape(xs)[0]):
-            self.insert(xs[i], ys[i])
+        # only the final capacity samples of a large batch are kept
+        batch_size = tf.shape(xs)[0]
+        keep = tf.minimum(batch_size, self.capacity)
+        skip = batch_size - keep
+
+        # compute the ring buffer slot of every sample in the batch
+        indices = tf.math.floormod(
+            self.head + skip + tf.range(keep), self.capacity)[:, tf.newaxis]
+
+        # write every sample into the buffer with a single scatter
+        self.xs.scatter_nd_update(
+            indices, tf.cast(xs[skip:], tf.dtypes.float32))
+        self.ys.scatter_nd_update(
+            indices, tf.cast(ys[skip:], tf.dtypes.float32))
+
+        # increment the size statistics of the buffer
+        self.head.assign(
+            tf.math.floormod(self.head + batch_size, self.capacity))
+        self.size.assign(
+            tf.minimum(self.size + batch_size, self.capacity))
+        self.step.assign(
+            self.step + batch_size)
 
     @tf.function
-    def sample(self, batch_size):
+    def sample(self, batch_size, temperature=None, stratified=False):
         """Samples a batch of training data from the replay buffer
         and returns the batch of data
 
@@ -102,6 +97,12 @@ class ReplayBuffer(tf.Module):
         batch_size: tf.dtypes.int32
             a scalar tensor that specifies how many elements to sample
             typically smaller than the replay buffer capacity
+        temperature: float
+            when provided samples are prioritized with probability
+            proportional to exp(y / temperature) of their stored scores
+        stratified: bool
+            whether to draw one sample from each of batch_size strata
+            with equal probability, which reduces sampling variance
 
         Returns:
 
@@ -113,7 +114,31 @@ class ReplayBuffer(tf.Module):
             images may be shaped like [batch, 1]
         """
 
-        indices = tf.random.uniform([
-            batch_size], maxval=self.size, dtype=tf.dtypes.int32)
+        if temperature is None and not stratified:
+            indices = tf.random.uniform([
+                batch_size], maxval=self.size, dtype=tf.dtypes.int32)
+
+        else:
+
+            # assign a sampling priority to every filled slot
+            logits = tf.zeros([self.capacity]) if temperature is None \
+                else self.ys[:, 0] / temperature
+            logits = tf.where(tf.range(self.capacity) < self.size,
+                              logits, tf.fill([self.capacity], -float('inf')))
+
+            if stratified:
+
+                # invert the cumulative distribution once per stratum
+                cdf = tf.math.cumsum(tf.math.softmax(logits))
+                u = (tf.cast(tf.range(batch_size), tf.dtypes.float32) +
+                     tf.random.uniform([batch_size])) / tf.cast(
+                    batch_size, tf.dtypes.float32)
+                indices = tf.minimum(tf.searchsorted(
+                    cdf, u * cdf[-1], side='right'), self.size - 1)
+
+            else:
+                indices = tf.random.categorical(
+                    logits[tf.newaxis], batch_size, dtype=tf.dtypes.int32)[0]
+
         return tf.gather(self.xs, indices, axis=0), \
                tf.gather(self.ys, indices, axis=0)
@@ -1,6 +1,11 @@
 from design_baselines.utils import spearman
 from design_baselines.utils import disc_noise
 from design_baselines.utils import cont_noise
+from design_baselines.utils import pad_batch
+from design_baselines.utils import unpad_statistics
+from design_baselines.utils import get_fixed_step
+from design_baselines.utils import check_retracing
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow as tf
@@ -15,7 +20,10 @@ class Ensemble(tf.Module):
                  is_discrete=False,
                  noise_std=0.0,
                  keep=0.0,
-                 temp=0.0):
+                 temp=0.0,
+                 fixed_batch_size=None,
+                 debug_retracing=False,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -39,6 +47,9 @@ class Ensemble(tf.Module):
         temp: float
             if designs x are discrete this specifies the
             temperature of the discrete noise
+        fixed_batch_size, debug_retracing, jit_compile:
+            how the step functions are traced and compiled, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -54,6 +65,12 @@ class Ensemble(tf.Module):
             forward_model_optim(learning_rate=forward_model_lr)
             for _ in range(self.bootstraps)]
 
+        # trace and compile the step functions as requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        fixed_batch_size=fixed_batch_size,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
+
     def get_distribution(self,
                          x,
                          **kwargs):
@@ -90,7 +107,8 @@ class Ensemble(tf.Module):
     def train_step(self,
                    x,
                    y,
-                   b):
+                   b,
+                   size=None):
         """Perform a training step of gradient descent on an ensemble
         using bootstrap weights for each model in the ensemble
 
@@ -102,6 +120,9 @@ class Ensemble(tf.Module):
             a batch of training labels shaped like [batch_size, 1]
         b: tf.Tensor
             bootstrap indicators shaped like [batch_size, num_oracles]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
 
         Returns:
 
@@ -128,7 +149,8 @@ class Ensemble(tf.Module):
                 statistics[f'oracle_{i}/train/nll'] = nll
 
                 # evaluate how correct the rank fo the model predictions are
-                rank_correlation = spearman(y[:, 0], d.mean()[:, 0])
+                rank_correlation = spearman(
+                    y[:, 0], d.mean()[:, 0], size=size)
                 statistics[f'oracle_{i}/train/rank_corr'] = rank_correlation
 
                 # build the total loss
@@ -144,7 +166,8 @@ class Ensemble(tf.Module):
     @tf.function(experimental_relax_shapes=True)
     def validate_step(self,
                       x,
-                      y):
+                      y,
+                      size=None):
         """Perform a validation step on an ensemble of models
         without using bootstrapping weights
 
@@ -154,6 +177,9 @@ class Ensemble(tf.Module):
             a batch of validation inputs shaped like [batch_size, channels]
         y: tf.Tensor
             a batch of validation labels shaped like [batch_size, 1]
+        size: tf.Tensor
+            an optional number of samples in the batch before it was
+            padded, which excludes the padding from rank correlations
 
         Returns:
 
@@ -178,7 +204,8 @@ class Ensemble(tf.Module):
             statistics[f'oracle_{i}/validate/nll'] = nll
 
             # evaluate how correct the rank fo the model predictions are
-            rank_correlation = spearman(y[:, 0], d.mean()[:, 0])
+            rank_correlation = spearman(
+                y[:, 0], d.mean()[:, 0], size=size)
             statistics[f'oracle_{i}/validate/rank_corr'] = rank_correlation
 
         return statistics
@@ -201,7 +228,16 @@ class Ensemble(tf.Module):
 
         statistics = defaultdict(list)
         for x, y, b in dataset:
-            for name, tensor in self.train_step(x, y, b).items():
+            step, size = self.train_step, int(x.shape[0])
+            args = (x, y, b)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and mask the padding out of the loss
+                mask, (x, y, b) = pad_batch(self.fixed_batch_size, x, y, b)
+                args = (x, y, b * mask, tf.constant(size))
+                step = get_fixed_step(self, 'train_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -225,7 +261,16 @@ class Ensemble(tf.Module):
 
         statistics = defaultdict(list)
         for x, y in dataset:
-            for name, tensor in self.validate_step(x, y).items():
+            step, size = self.validate_step, int(x.shape[0])
+            args = (x, y)
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and remove padding from statistics
+                _, (x, y) = pad_batch(self.fixed_batch_size, x, y)
+                args = (x, y, tf.constant(size))
+                step = get_fixed_step(self, 'validate_step', *args)
+            for name, tensor in unpad_statistics(
+                    step(*args), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -255,9 +300,13 @@ class Ensemble(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(header + name, loss, e)
+                logger.record(header + name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(header + name, loss, e)
+                logger.record(header + name, loss, e, level=1)
+
+            # fail when a step function is traced again after one epoch
+            if self.debug_retracing:
+                check_retracing(self)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
@@ -295,7 +344,10 @@ class WeightedGAN(tf.Module):
                  noise_std=0.0,
                  keep=0.99,
                  start_temp=5.0,
-                 final_temp=1.0):
+                 final_temp=1.0,
+                 fixed_batch_size=None,
+                 debug_retracing=False,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -352,6 +404,9 @@ class WeightedGAN(tf.Module):
         final_temp: float
             if designs x are discrete this specifies the final
             temperature of the discrete noise
+        fixed_batch_size, debug_retracing, jit_compile:
+            how the step functions are traced and compiled, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -381,6 +436,12 @@ class WeightedGAN(tf.Module):
             beta_1=discriminator_beta_1,
             beta_2=discriminator_beta_2)
 
+        # trace and compile the step functions as requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        fixed_batch_size=fixed_batch_size,
+                        debug_retracing=debug_retracing,
+                        jit_compile=jit_compile)
+
     @tf.function(experimental_relax_shapes=True)
     def train_step(self,
                    i,
@@ -587,7 +648,16 @@ class WeightedGAN(tf.Module):
         statistics = defaultdict(list)
         for i, (x, y, w) in enumerate(dataset):
             i = tf.convert_to_tensor(i)
-            for name, tensor in self.train_step(i, x, y, w).items():
+            step, size = self.train_step, int(x.shape[0])
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and mask the padding out of the loss
+                # scaling weights so the mean over the batch is unchanged
+                mask, (x, y, w) = pad_batch(self.fixed_batch_size, x, y, w)
+                w = w * mask * (self.fixed_batch_size / size)
+                step = get_fixed_step(self, 'train_step', i, x, y, w)
+            for name, tensor in unpad_statistics(
+                    step(i, x, y, w), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -611,7 +681,14 @@ class WeightedGAN(tf.Module):
 
         statistics = defaultdict(list)
         for x, y in dataset:
-            for name, tensor in self.validate_step(x, y).items():
+            step, size = self.validate_step, int(x.shape[0])
+            if self.fixed_batch_size is not None:
+
+                # pad the last batch and remove padding from statistics
+                _, (x, y) = pad_batch(self.fixed_batch_size, x, y)
+                step = get_fixed_step(self, 'validate_step', x, y)
+            for name, tensor in unpad_statistics(
+                    step(x, y), size, self.fixed_batch_size).items():
                 statistics[name].append(tensor)
         for name in statistics.keys():
             statistics[name] = tf.concat(statistics[name], axis=0)
@@ -643,9 +720,13 @@ class WeightedGAN(tf.Module):
             self.temp.assign(self.final_temp * e / (epochs - 1) +
                              self.start_temp * (1.0 - e / (epochs - 1)))
             for name, loss in self.train(train_data).items():
-                logger.record(header + name, loss, start_epoch + e)
+                logger.record(header + name, loss, start_epoch + e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(header + name, loss, start_epoch + e)
+                logger.record(header + name, loss, start_epoch + e, level=1)
+
+            # fail when a step function is traced again after one epoch
+            if self.debug_retracing:
+                check_retracing(self)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
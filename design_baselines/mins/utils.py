@@ -118,40 +118,49 @@ def get_p_y(scores, base_temp=None):
 
 
 @tf.function(experimental_relax_shapes=True)
-def get_synthetic_data(x,
-                       y,
-                       exploration_samples=32,
-                       exploration_rate=10.0,
-                       base_temp=None):
-    """Generate a synthetic dataset of designs x and scores y using the
-    Randomized Labelling algorithm
+def get_synthetic_samples(x,
+                          y,
+                          exploration_samples=32,
+                          exploration_rate=10.0,
+                          base_temp=None,
+                          size=None):
+    """Generate only the synthetic designs x and scores y sampled by the
+    Randomized Labelling algorithm, without the existing data set
 
     Args:
 
     x: tf.Tensor
         a tensor containing an existing data set of realistic designs
     y: tf.Tensor
-        a tensor containing an existing data set of realistic scores
+        a tensor containing an existing data set of realistic scores,
+        or a numpy array that is used on the host without a copy
     exploration_samples: int
         the number of samples to draw for randomized labelling
     exploration_rate: float
         the rate of the exponential noise added to y
+    size: int
+        the number of leading designs in x to sample from, so that x can
+        be the preallocated storage of a DesignStore without a copy
 
     Returns:
 
-    tilde_x: tf.Tensor
-        a tensor containing a data set of synthetic designs
-    tilde_y: tf.Tensor
-        a tensor containing a data set of synthetic scores
+    xs: tf.Tensor
+        a tensor containing exploration_samples synthetic designs
+    ys: tf.Tensor
+        a tensor containing exploration_samples synthetic scores
     """
 
     def wrapped_py(_y):
         return get_p_y(_y, base_temp=base_temp)
 
     # sample ys based on their importance weight
-    p_y, bin_edges = tf.numpy_function(wrapped_py, [y], [tf.float32, tf.float32])
-    p_y.set_shape([20, 1])
-    bin_edges.set_shape([20, 1])
+    if isinstance(y, np.ndarray):
+        p_y, bin_edges = wrapped_py(y)
+    else:
+        p_y, bin_edges = tf.numpy_function(
+            wrapped_py, [y], [tf.float32, tf.float32])
+        p_y.set_shape([20, 1])
+        bin_edges.set_shape([20, 1])
 
     # sample ys according to the optimal bins
     d = tfpd.Categorical(probs=p_y[:, 0])
@@ -163,9 +172,46 @@ def get_synthetic_data(x,
     ys = ys + d.sample(sample_shape=tf.shape(ys))
 
     # select data points randomly from the data set
-    d = tfpd.Categorical(logits=tf.zeros([tf.shape(x)[0]]))
+    d = tfpd.Categorical(logits=tf.zeros([
+        tf.shape(x)[0] if size is None else size]))
     xs_ids = d.sample(sample_shape=(exploration_samples,))
     xs = tf.nn.embedding_lookup(x, xs_ids)
+    return xs, ys
+
+
+@tf.function(experimental_relax_shapes=True)
+def get_synthetic_data(x,
+                       y,
+                       exploration_samples=32,
+                       exploration_rate=10.0,
+                       base_temp=None):
+    """Generate a synthetic dataset of designs x and scores y using the
+    Randomized Labelling algorithm
+
+    Args:
+
+    x: tf.Tensor
+        a tensor containing an existing data set of realistic designs
+    y: tf.Tensor
+        a tensor containing an existing data set of realistic scores
+    exploration_samples: int
+        the number of samples to draw for randomized labelling
+    exploration_rate: float
+        the rate of the exponential noise added to y
+
+    Returns:
+
+    tilde_x: tf.Tensor
+        a tensor containing a data set of synthetic designs
+    tilde_y: tf.Tensor
+        a tensor containing a data set of synthetic scores
+    """
+
+    xs, ys = get_synthetic_samples(
+        x, y,
+        exploration_samples=exploration_samples,
+        exploration_rate=exploration_rate,
+        base_temp=base_temp)
 
     # concatenate newly paired samples with the existing data set
     return tf.concat([x, xs], 0), \
@@ -1,10 +1,14 @@
 from design_baselines.data import StaticGraphTask, build_pipeline
 from design_baselines.logger import Logger
+from design_baselines.checkpoints import ModelCache
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
 from design_baselines.reinforce.trainers import Ensemble
 from design_baselines.reinforce.nets import ForwardModel
 from design_baselines.reinforce.nets import DiscreteMarginal
 from design_baselines.reinforce.nets import ContinuousMarginal
 from design_baselines.utils import render_video
+from design_baselines.utils import set_seed
 import tensorflow as tf
 import numpy as np
 import os
@@ -20,15 +24,23 @@ def reinforce(config):
         a dictionary of hyper parameters such as the learning rate
     """
 
-    logger = Logger(config['logging_dir'])
-    task = StaticGraphTask(config['task'], **config['task_kwargs'])
-    if task.is_discrete:
-        task.map_to_integers()
+    # models are only cached when training is seeded
+    if config.get('seed', None) is not None:
+        set_seed(config['seed'])
+
+    logger = Logger(config['logging_dir'],
+                    flush_interval=config.get('logger_flush_interval', 0),
+                    verbosity=config.get('logger_verbosity', 1),
+                    profile_span=config.get('profile_span', None))
+    with logger.span('task'):
+        task = StaticGraphTask(config['task'], **config['task_kwargs'])
+        if task.is_discrete:
+            task.map_to_integers()
 
-    if config['normalize_ys']:
-        task.map_normalize_y()
-    if config['normalize_xs']:
-        task.map_normalize_x()
+        if config['normalize_ys']:
+            task.map_normalize_y()
+        if config['normalize_xs']:
+            task.map_normalize_x()
 
     x = task.x
     y = task.y
@@ -39,27 +51,70 @@ def reinforce(config):
         batch_size=config['ensemble_batch_size'],
         val_size=config['val_size'])
 
-    # make several keras neural networks with two hidden layers
-    forward_models = [ForwardModel(
-        task,
-        embedding_size=config['embedding_size'],
-        hidden_size=config['hidden_size'],
-        num_layers=config['num_layers'],
-        initial_max_std=config['initial_max_std'],
-        initial_min_std=config['initial_min_std'])
-        for b in range(config['bootstraps'])]
-
-    # create a trainer for a forward model with a conservative objective
-    ensemble = Ensemble(
-        forward_models,
-        forward_model_optim=tf.keras.optimizers.Adam,
-        forward_model_lr=config['ensemble_lr'])
-
-    # train the model for an additional number of epochs
-    ensemble.launch(train_data,
-                    val_data,
-                    logger,
-                    config['ensemble_epochs'])
+    if config.get('stacked_ensemble', False):
+
+        # make one keras neural network that stacks every bootstrap
+        forward_model = StackedForwardModel(
+            task.input_shape,
+            bootstraps=config['bootstraps'],
+            activations=['leaky_relu'] * config['num_layers'],
+            hidden_size=config['hidden_size'],
+            num_classes=task.num_classes if task.is_discrete else None,
+            embedding_size=config['embedding_size'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+
+        # create a trainer that updates every bootstrap in one step
+        ensemble = StackedEnsemble(
+            forward_model,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+
+    else:
+
+        # make several keras neural networks with two hidden layers
+        forward_models = [ForwardModel(
+            task,
+            embedding_size=config['embedding_size'],
+            hidden_size=config['hidden_size'],
+            num_layers=config['num_layers'],
+            initial_max_std=config['initial_max_std'],
+            initial_min_std=config['initial_min_std'])
+            for b in range(config['bootstraps'])]
+
+        # create a trainer for a forward model with a conservative objective
+        ensemble = Ensemble(
+            forward_models,
+            forward_model_optim=tf.keras.optimizers.Adam,
+            forward_model_lr=config['ensemble_lr'],
+            jit_compile=config.get('jit_compile', False))
+    logger.watch(ensemble)
+
+    if config.get('model_cache_dir', None) is not None \
+            and config.get('seed', None) is not None:
+
+        # restore the ensemble when an identical one was trained before
+        cache = ModelCache(config['model_cache_dir'])
+        key = cache.get_key(seed=config['seed'], model='reinforce', **{
+            name: config.get(name, None) for name in (
+                'task', 'task_kwargs', 'normalize_ys', 'normalize_xs',
+                'stacked_ensemble', 'bootstraps', 'embedding_size',
+                'hidden_size', 'num_layers', 'initial_max_std',
+                'initial_min_std', 'ensemble_lr', 'ensemble_batch_size',
+                'ensemble_epochs', 'val_size')})
+        with logger.span('ensemble'):
+            cache.launch(key, ensemble, train_data, val_data,
+                         logger, config['ensemble_epochs'])
+
+    else:
+
+        # train the model for an additional number of epochs
+        with logger.span('ensemble'):
+            ensemble.launch(train_data,
+                            val_data,
+                            logger,
+                            config['ensemble_epochs'])
 
     rl_opt = tf.keras.optimizers.Adam(
         learning_rate=config['reinforce_lr'])
@@ -79,36 +134,37 @@ def reinforce(config):
         logstd = tf.math.log(tf.ones_like(mean) * config['exploration_std'])
         sampler = ContinuousMarginal(mean, logstd)
 
-    for iteration in range(config['iterations']):
+    with logger.span('solver'):
+        for iteration in range(config['iterations']):
 
-        with tf.GradientTape() as tape:
-            td = sampler.get_distribution()
-            tx = td.sample(sample_shape=config['reinforce_batch_size'])
-            if config['optimize_ground_truth']:
-                ty = task.predict(tx)
-            else:  # use the surrogate model for optimization
-                ty = ensemble.get_distribution(tx).mean()
+            with tf.GradientTape() as tape:
+                td = sampler.get_distribution()
+                tx = td.sample(sample_shape=config['reinforce_batch_size'])
+                if config['optimize_ground_truth']:
+                    ty = task.predict(tx)
+                else:  # use the surrogate model for optimization
+                    ty = ensemble.get_distribution(tx).mean()
 
-            mean_y = tf.reduce_mean(ty)
-            standard_dev_y = tf.math.reduce_std(ty - mean_y)
-            log_probs = td.log_prob(tf.stop_gradient(tx))
-            loss = tf.reduce_mean(-log_probs[:, tf.newaxis] *
-                                  tf.stop_gradient(
-                                      (ty - mean_y) / standard_dev_y))
+                mean_y = tf.reduce_mean(ty)
+                standard_dev_y = tf.math.reduce_std(ty - mean_y)
+                log_probs = td.log_prob(tf.stop_gradient(tx))
+                loss = tf.reduce_mean(-log_probs[:, tf.newaxis] *
+                                      tf.stop_gradient(
+                                          (ty - mean_y) / standard_dev_y))
 
-        print(f"[Iteration {iteration}] "
-              f"Average Prediction = {tf.reduce_mean(ty)}")
+            print(f"[Iteration {iteration}] "
+                  f"Average Prediction = {tf.reduce_mean(ty)}")
 
-        logger.record("reinforce/prediction",
-                      ty, iteration, percentile=True)
-        logger.record("reinforce/loss",
-                      loss, iteration, percentile=True)
+            logger.record("reinforce/prediction",
+                          ty, iteration, percentile=True)
+            logger.record("reinforce/loss",
+                          loss, iteration, percentile=True)
 
-        grads = tape.gradient(
-            loss, sampler.trainable_variables)
+            grads = tape.gradient(
+                loss, sampler.trainable_variables)
 
-        rl_opt.apply_gradients(zip(
-            grads, sampler.trainable_variables))
+            rl_opt.apply_gradients(zip(
+                grads, sampler.trainable_variables))
 
     td = sampler.get_distribution()
     solution = td.sample(sample_shape=config['solver_samples'])
@@ -119,8 +175,13 @@ def reinforce(config):
     if config["do_evaluation"]:
 
         # evaluate the found solution and record a video
-        score = task.predict(solution)
+        with logger.span('oracle'):
+            score = task.predict(solution)
         if config['normalize_ys']:
             score = task.denormalize_y(score)
         logger.record(
             "score", score, config['iterations'], percentile=True)
+
+    # save the time spent in every phase next to the solution
+    logger.save_timing()
+    logger.close()
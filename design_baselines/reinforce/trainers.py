@@ -1,6 +1,7 @@
 from design_baselines.utils import spearman
 from design_baselines.utils import disc_noise
 from design_baselines.utils import cont_noise
+from design_baselines.utils import configure_steps
 from collections import defaultdict
 from tensorflow_probability import distributions as tfpd
 import tensorflow_probability as tfp
@@ -12,7 +13,8 @@ class Ensemble(tf.Module):
     def __init__(self,
                  forward_models,
                  forward_model_optim=tf.keras.optimizers.Adam,
-                 forward_model_lr=0.001):
+                 forward_model_lr=0.001,
+                 jit_compile=False):
         """Build a trainer for an ensemble of probabilistic neural networks
         trained on bootstraps of a dataset
 
@@ -24,6 +26,9 @@ class Ensemble(tf.Module):
             the optimizer class to use for optimizing the oracle model
         oracle__lr: float
             the learning rate for the oracle model optimizer
+        jit_compile: bool
+            whether to compile the step functions with XLA, as
+            described by configure_steps in design_baselines.utils
         """
 
         super().__init__()
@@ -35,6 +40,10 @@ class Ensemble(tf.Module):
             forward_model_optim(learning_rate=forward_model_lr)
             for i in range(self.bootstraps)]
 
+        # compile the step functions with XLA when requested
+        configure_steps(self, 'train_step', 'validate_step',
+                        jit_compile=jit_compile)
+
     def get_distribution(self,
                          x,
                          **kwargs):
@@ -225,9 +234,9 @@ class Ensemble(tf.Module):
 
         for e in range(start_epoch, start_epoch + epochs):
             for name, loss in self.train(train_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
             for name, loss in self.validate(validate_data).items():
-                logger.record(name, loss, e)
+                logger.record(name, loss, e, level=1)
 
     def get_saveables(self):
         """Collects and returns stateful objects that are serializeable
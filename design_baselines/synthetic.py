@@ -0,0 +1,554 @@
+import numpy as np
+
+
+def get_statistics(x,
+                   transform=None,
+                   batch_size=4096):
+    """Returns the mean and standard deviation of every component of a
+    batch of values, computed one batch at a time so that memory mapped
+    arrays are never loaded into memory at once
+
+    Args:
+
+    x: np.ndarray
+        the values shaped like [num_samples, ...]
+    transform: Callable
+        an optional function applied to every batch before the statistics
+        are computed, such as converting integers to logits
+    batch_size: int
+        the number of values processed at once
+
+    Returns:
+
+    mean: np.ndarray
+        the mean of every component shaped like [1, ...]
+    standard_dev: np.ndarray
+        the standard deviation of every component shaped like [1, ...]
+        where components with no variation have a standard deviation of one
+    """
+
+    transform = transform if transform is not None else (lambda xi: xi)
+    batches = range(0, x.shape[0], batch_size)
+
+    mean = sum(np.sum(transform(x[i:i + batch_size]).astype(
+        np.float64), axis=0, keepdims=True) for i in batches) / x.shape[0]
+    variance = sum(np.sum(np.square(transform(x[i:i + batch_size]).astype(
+        np.float64) - mean), axis=0, keepdims=True)
+        for i in batches) / x.shape[0]
+
+    standard_dev = np.sqrt(variance)
+    standard_dev = np.where(standard_dev == 0, 1, standard_dev)
+    return mean.astype(np.float32), standard_dev.astype(np.float32)
+
+
+class SyntheticDataset(object):
+
+    def __init__(self,
+                 x,
+                 y,
+                 num_classes=None,
+                 soft_interpolation=0.6,
+                 statistics=None):
+        """A dataset of designs and scores held in memory with the same
+        transforms as a design_bench dataset, so that designs can be
+        normalized and converted between integers and logits
+
+        Args:
+
+        x: np.ndarray
+            the design values shaped like [dataset_size, *design_shape]
+            which are integers when num_classes is not None
+        y: np.ndarray
+            the prediction values shaped like [dataset_size, 1]
+        num_classes: int
+            the number of categories of every discrete design component,
+            or None for continuous designs
+        soft_interpolation: float
+            the weight of the one hot vector mixed with a uniform
+            distribution when converting integers to logits
+        statistics: dict
+            optional means and standard deviations returned by
+            get_statistics, used in place of the statistics of the
+            current arrays when the dataset is normalized
+        """
+
+        self.x = x
+        self.y = y
+        self.num_classes = num_classes
+        self.soft_interpolation = soft_interpolation
+        self.is_discrete = num_classes is not None
+        self.statistics = statistics
+
+        self.is_logits = False
+        self.is_normalized_x = False
+        self.is_normalized_y = False
+        self.x_mean = None
+        self.x_standard_dev = None
+        self.y_mean = None
+        self.y_standard_dev = None
+
+    def relabel(self,
+                relabel_fn,
+                batch_size=4096):
+        """Replace the prediction values of the dataset one batch at a time
+        using a function of the designs and their current predictions
+
+        Args:
+
+        relabel_fn: Callable
+            a function that accepts a batch of designs and predictions
+            and returns new predictions shaped like [batch_size, 1]
+        batch_size: int
+            the number of designs passed to the function at once
+        """
+
+        self.y = np.concatenate([relabel_fn(
+            self.x[i:i + batch_size], self.y[i:i + batch_size])
+            for i in range(0, self.x.shape[0], batch_size)], axis=0)
+
+    def to_logits(self,
+                  x):
+        """Convert integer designs to the logits of a smoothed categorical
+        distribution, with the logit of the first class fixed at zero
+
+        Args:
+
+        x: np.ndarray
+            a batch of integer designs shaped like [batch_size, ...]
+
+        Returns:
+
+        x: np.ndarray
+            a batch of logits shaped like [batch_size, ..., num_classes - 1]
+        """
+
+        one_hot = np.eye(self.num_classes, dtype=np.float32)[x]
+        probs = self.soft_interpolation * one_hot + \
+            (1.0 - self.soft_interpolation) / self.num_classes
+        logits = np.log(probs)
+        return (logits[..., 1:] - logits[..., :1]).astype(np.float32)
+
+    def to_integers(self,
+                    x):
+        """Convert logits back to integer designs by selecting the class
+        with the largest logit
+
+        Args:
+
+        x: np.ndarray
+            a batch of logits shaped like [batch_size, ..., num_classes - 1]
+
+        Returns:
+
+        x: np.ndarray
+            a batch of integer designs shaped like [batch_size, ...]
+        """
+
+        # the first class has an implicit logit of zero
+        return np.argmax(np.pad(x, [[0, 0]] * (len(x.shape) - 1) +
+                                [[1, 0]]), axis=-1).astype(np.int32)
+
+    def normalize_x(self, x):
+        return (x - self.x_mean) / self.x_standard_dev
+
+    def denormalize_x(self, x):
+        return x * self.x_standard_dev + self.x_mean
+
+    def normalize_y(self, y):
+        return (y - self.y_mean) / self.y_standard_dev
+
+    def denormalize_y(self, y):
+        return y * self.y_standard_dev + self.y_mean
+
+    def map_to_logits(self):
+        self.x = self.to_logits(self.x)
+        self.is_logits = True
+
+    def map_to_integers(self):
+        self.x = self.to_integers(self.x)
+        self.is_logits = False
+
+    def map_normalize_x(self):
+        name = "logits" if self.is_logits else "x"
+        if self.statistics is not None and f"{name}_mean" in self.statistics:
+            self.x_mean = self.statistics[f"{name}_mean"]
+            self.x_standard_dev = self.statistics[f"{name}_standard_dev"]
+        else:
+            self.x_mean, self.x_standard_dev = get_statistics(self.x)
+        self.x = self.normalize_x(self.x).astype(np.float32)
+        self.is_normalized_x = True
+
+    def map_denormalize_x(self):
+        self.x = self.denormalize_x(self.x).astype(np.float32)
+        self.is_normalized_x = False
+
+    def map_normalize_y(self):
+        if self.statistics is not None and "y_mean" in self.statistics:
+            self.y_mean = self.statistics["y_mean"]
+            self.y_standard_dev = self.statistics["y_standard_dev"]
+        else:
+            self.y_mean, self.y_standard_dev = get_statistics(self.y)
+        self.y = self.normalize_y(self.y).astype(np.float32)
+        self.is_normalized_y = True
+
+    def map_denormalize_y(self):
+        self.y = self.denormalize_y(self.y).astype(np.float32)
+        self.is_normalized_y = False
+
+
+class ArrayTask(object):
+
+    def __init__(self,
+                 dataset,
+                 oracle_name,
+                 dataset_name,
+                 x_name="design",
+                 y_name="score"):
+        """A model-based optimization task whose dataset is held in arrays,
+        which has the interface of a design_bench task, where subclasses
+        score designs in the original format of the dataset
+
+        Args:
+
+        dataset: SyntheticDataset
+            the designs and scores of the task with design_bench transforms
+        oracle_name: str
+            the name of the ground truth score function
+        dataset_name: str
+            the name of the dataset
+        x_name: str
+            the name of the designs in the dataset
+        y_name: str
+            the name of the scores in the dataset
+        """
+
+        self.dataset = dataset
+        self.oracle_name = oracle_name
+        self.dataset_name = dataset_name
+        self.x_name = x_name
+        self.y_name = y_name
+
+    def oracle_predict(self,
+                       x):
+        """Score designs in the original format of the dataset
+
+        Args:
+
+        x: np.ndarray
+            a batch of designs shaped like [batch_size, *design_shape]
+
+        Returns:
+
+        y: np.ndarray
+            a batch of scores shaped like [batch_size, 1]
+        """
+
+        raise NotImplementedError
+
+    @property
+    def x(self):
+        return self.dataset.x
+
+    @property
+    def y(self):
+        return self.dataset.y
+
+    @property
+    def is_discrete(self):
+        return self.dataset.is_discrete
+
+    @property
+    def num_classes(self):
+        return self.dataset.num_classes
+
+    @property
+    def is_logits(self):
+        return self.dataset.is_logits
+
+    @property
+    def is_normalized_x(self):
+        return self.dataset.is_normalized_x
+
+    @property
+    def is_normalized_y(self):
+        return self.dataset.is_normalized_y
+
+    @property
+    def dataset_size(self):
+        return self.x.shape[0]
+
+    @property
+    def dataset_max_percentile(self):
+        return 100.0
+
+    @property
+    def dataset_min_percentile(self):
+        return 0.0
+
+    @property
+    def dataset_max_output(self):
+        return float(np.max(self.y))
+
+    @property
+    def dataset_min_output(self):
+        return float(np.min(self.y))
+
+    @property
+    def input_shape(self):
+        return self.x.shape[1:]
+
+    @property
+    def input_size(self):
+        return int(np.prod(self.input_shape))
+
+    @property
+    def input_dtype(self):
+        return self.x.dtype
+
+    @property
+    def output_shape(self):
+        return self.y.shape[1:]
+
+    @property
+    def output_size(self):
+        return int(np.prod(self.output_shape))
+
+    @property
+    def output_dtype(self):
+        return self.y.dtype
+
+    def iterate_batches(self, batch_size, return_x=True,
+                        return_y=True, drop_remainder=False):
+        size = self.dataset_size
+        if drop_remainder:
+            size -= size % batch_size
+        for i in range(0, size, batch_size):
+            batch = ([self.x[i:i + batch_size]] if return_x else []) + \
+                ([self.y[i:i + batch_size]] if return_y else [])
+            yield batch[0] if len(batch) == 1 else tuple(batch)
+
+    def iterate_samples(self, return_x=True, return_y=True):
+        for i in range(self.dataset_size):
+            sample = ([self.x[i]] if return_x else []) + \
+                ([self.y[i]] if return_y else [])
+            yield sample[0] if len(sample) == 1 else tuple(sample)
+
+    def __iter__(self):
+        return self.iterate_samples()
+
+    def to_logits(self, x):
+        return self.dataset.to_logits(x)
+
+    def to_integers(self, x):
+        return self.dataset.to_integers(x)
+
+    def normalize_x(self, x):
+        return self.dataset.normalize_x(x)
+
+    def denormalize_x(self, x):
+        return self.dataset.denormalize_x(x)
+
+    def normalize_y(self, y):
+        return self.dataset.normalize_y(y)
+
+    def denormalize_y(self, y):
+        return self.dataset.denormalize_y(y)
+
+    def map_to_logits(self):
+        self.dataset.map_to_logits()
+
+    def map_to_integers(self):
+        self.dataset.map_to_integers()
+
+    def map_normalize_x(self):
+        self.dataset.map_normalize_x()
+
+    def map_denormalize_x(self):
+        self.dataset.map_denormalize_x()
+
+    def map_normalize_y(self):
+        self.dataset.map_normalize_y()
+
+    def map_denormalize_y(self):
+        self.dataset.map_denormalize_y()
+
+    def predict(self,
+                x_batch):
+        """Score a batch of designs in the current format of the dataset,
+        undoing normalization and logits before calling the oracle
+
+        Args:
+
+        x_batch: np.ndarray
+            a batch of designs in the current format of the dataset
+
+        Returns:
+
+        y_batch: np.ndarray
+            a batch of scores shaped like [batch_size, 1], normalized
+            when the dataset scores are normalized
+        """
+
+        if self.is_normalized_x:
+            x_batch = self.denormalize_x(x_batch)
+        if self.is_discrete and self.is_logits:
+            x_batch = self.to_integers(x_batch)
+        y_batch = self.oracle_predict(x_batch)
+        if self.is_normalized_y:
+            y_batch = self.normalize_y(y_batch)
+        return y_batch.astype(np.float32)
+
+
+class SyntheticTask(ArrayTask):
+
+    def __init__(self,
+                 oracle="mlp",
+                 dataset_size=10000,
+                 design_shape=(32,),
+                 num_classes=None,
+                 hidden_size=64,
+                 nk_k=4,
+                 nk_table_size=4096,
+                 seed=0,
+                 relabel=False):
+        """A model-based optimization task with a random dataset and a
+        cheap analytic oracle, which has the interface of a design_bench
+        task so that baselines run at any scale without downloading data
+
+        Args:
+
+        oracle: str
+            the ground truth score function, either 'mlp' for a random
+            neural network or 'nk' for an NK landscape over discrete designs
+        dataset_size: int
+            the number of designs in the dataset
+        design_shape: tuple[int]
+            the shape of a single design
+        num_classes: int
+            the number of categories of every discrete design component,
+            or None for continuous designs
+        hidden_size: int
+            the hidden size of the random neural network oracle
+        nk_k: int
+            the number of neighbors that interact with every component
+            of a design in the NK landscape oracle
+        nk_table_size: int
+            the number of random contributions of every component in the
+            NK landscape oracle, indexed by hashing its neighborhood
+        seed: int
+            the seed used to sample the oracle and the dataset
+        relabel: bool
+            accepted for compatibility with design_bench, since the
+            dataset is always labelled by the oracle
+        """
+
+        if oracle not in ("mlp", "nk"):
+            raise ValueError(f"unknown synthetic oracle: {oracle}")
+        if oracle == "nk" and num_classes is None:
+            raise ValueError("the NK landscape requires discrete designs")
+
+        random = np.random.RandomState(seed)
+        design_shape = tuple(design_shape)
+        design_size = int(np.prod(design_shape))
+        self.oracle = oracle
+
+        if oracle == "mlp":
+
+            # a random two layer network applied to flattened designs
+            input_size = design_size * (num_classes or 1)
+            self.weights = [
+                (random.normal(size=[input_size, hidden_size]) /
+                 np.sqrt(input_size)).astype(np.float32),
+                (random.normal(size=[hidden_size, 1]) /
+                 np.sqrt(hidden_size)).astype(np.float32)]
+
+        else:
+
+            # random contributions of every component and its neighbors
+            self.nk_k = nk_k
+            self.nk_table = random.uniform(size=[
+                design_size, nk_table_size]).astype(np.float32)
+            self.nk_powers = np.power(num_classes, np.arange(
+                nk_k + 1), dtype=np.int64) % nk_table_size
+
+        if num_classes is None:
+            x = random.normal(size=[dataset_size, *design_shape])
+            x = x.astype(np.float32)
+        else:
+            x = random.randint(num_classes, size=[
+                dataset_size, *design_shape]).astype(np.int32)
+
+        super(SyntheticTask, self).__init__(
+            SyntheticDataset(x, None, num_classes=num_classes),
+            oracle, f"synthetic_{oracle}")
+        self.dataset.y = self.oracle_predict(x)
+
+    def oracle_predict(self,
+                       x,
+                       batch_size=4096):
+        """Score designs in the original format of the dataset using the
+        analytic oracle, one batch at a time to bound memory
+
+        Args:
+
+        x: np.ndarray
+            a batch of designs shaped like [batch_size, *design_shape]
+        batch_size: int
+            the number of designs scored at once
+
+        Returns:
+
+        y: np.ndarray
+            a batch of scores shaped like [batch_size, 1]
+        """
+
+        y = [np.zeros([0, 1], dtype=np.float32)]
+        for i in range(0, x.shape[0], batch_size):
+            xi = x[i:i + batch_size]
+            xi = xi.reshape([xi.shape[0], -1])
+
+            if self.oracle == "mlp":
+                if self.is_discrete:
+                    xi = np.eye(self.num_classes, dtype=np.float32)[
+                        xi].reshape([xi.shape[0], -1])
+                h = np.tanh(np.matmul(xi, self.weights[0]))
+                y.append(np.matmul(h, self.weights[1]))
+
+            else:
+                xi = xi.astype(np.int64)
+                index = np.zeros_like(xi)
+                for j in range(self.nk_k + 1):
+                    index += np.roll(xi, -j, axis=1) * self.nk_powers[j]
+                index %= self.nk_table.shape[1]
+                y.append(np.mean(self.nk_table[np.arange(
+                    xi.shape[1]), index], axis=1, keepdims=True))
+
+        return np.concatenate(y, axis=0).astype(np.float32)
+
+
+# the names of synthetic tasks and the oracle used by each task
+SYNTHETIC_TASKS = {
+    "Synthetic-MLP-v0": "mlp",
+    "Synthetic-NK-v0": "nk",
+}
+
+
+def make_synthetic(task_name,
+                   **task_kwargs):
+    """Make a synthetic task registered in SYNTHETIC_TASKS
+
+    Args:
+
+    task_name: str
+        the name of a synthetic task such as 'Synthetic-MLP-v0'
+    **task_kwargs: dict
+        keyword arguments passed to SyntheticTask, such as the dataset
+        size, design shape, number of classes, and seed
+
+    Returns:
+
+    task: SyntheticTask
+        a task with a random dataset and an analytic oracle
+    """
+
+    return SyntheticTask(oracle=SYNTHETIC_TASKS[task_name], **task_kwargs)
@@ -10,7 +10,7 @@ def get_rank(x):
 
 
 @tf.function(experimental_relax_shapes=True)
-def spearman(a, b):
+def spearman(a, b, size=None):
     """Computes the Spearman Rank-Correlation Coefficient for two
     continuous-valued tensors with the same shape
 
@@ -22,6 +22,10 @@ def spearman(a, b):
     b: tf.Tensor
         a tensor of any shape whose last axis represents the axis of which
         to rank elements of the tensor from
+    size: tf.Tensor
+        an optional number of leading elements along the last axis that
+        are ranked, where the remaining elements are padding added by
+        pad_batch and are ignored
 
     Returns:
 
@@ -30,14 +34,33 @@ def spearman(a, b):
         represents the spearman p between a and b
     """
 
-    x = get_rank(a)
-    y = get_rank(b)
-    cov = tfp.stats.covariance(
-        x, y, sample_axis=-1, keepdims=False, event_axis=None)
-    sd_x = tfp.stats.stddev(
-        x, sample_axis=-1, keepdims=True, name=None)
-    sd_y = tfp.stats.stddev(
-        y, sample_axis=-1, keepdims=True, name=None)
+    if size is None:
+        x = get_rank(a)
+        y = get_rank(b)
+        cov = tfp.stats.covariance(
+            x, y, sample_axis=-1, keepdims=False, event_axis=None)
+        sd_x = tfp.stats.stddev(
+            x, sample_axis=-1, keepdims=True, name=None)
+        sd_y = tfp.stats.stddev(
+            y, sample_axis=-1, keepdims=True, name=None)
+        return cov / (sd_x * sd_y)
+
+    # rank the padding after every sample so shapes stay static for xla
+    mask = tf.range(tf.shape(a)[-1]) < tf.cast(size, tf.int32)
+    x = get_rank(tf.where(
+        mask, a, tf.reduce_max(a, axis=-1, keepdims=True) + 1))
+    y = get_rank(tf.where(
+        mask, b, tf.reduce_max(b, axis=-1, keepdims=True) + 1))
+
+    # the correlation of the ranks of the samples without the padding
+    mask = tf.cast(mask, x.dtype)
+    x = (x - tf.reduce_sum(x * mask, axis=-1, keepdims=True) /
+         tf.reduce_sum(mask)) * mask
+    y = (y - tf.reduce_sum(y * mask, axis=-1, keepdims=True) /
+         tf.reduce_sum(mask)) * mask
+    cov = tf.reduce_sum(x * y, axis=-1)
+    sd_x = tf.sqrt(tf.reduce_sum(tf.square(x), axis=-1, keepdims=True))
+    sd_y = tf.sqrt(tf.reduce_sum(tf.square(y), axis=-1, keepdims=True))
     return cov / (sd_x * sd_y)
 
 
@@ -185,3 +208,265 @@ def render_video(config, task, solution):
                     mode='rgb_array', height=500, width=500))
 
         out.close()
+
+
+def get_cache_dir(*names):
+    """Returns the path to a directory used for caching intermediate
+    results on the disk, which can be moved by setting the
+    DESIGN_BASELINES_CACHE environment variable
+
+    Args:
+
+    names: list of str
+        a list of sub directory names appended to the cache root
+
+    Returns:
+
+    cache_dir: str
+        the path to a cache directory that is guaranteed to exist
+    """
+
+    import os
+    cache_dir = os.path.join(os.environ.get(
+        'DESIGN_BASELINES_CACHE', os.path.join(
+            os.path.expanduser('~'), '.cache', 'design-baselines')), *names)
+    tf.io.gfile.makedirs(cache_dir)
+    return cache_dir
+
+
+def set_seed(seed):
+    """Seed the random number generators of tensorflow and numpy so that
+    a trained model is determined by its arguments and the seed, which
+    is required before the model can be saved in a ModelCache
+
+    Args:
+
+    seed: int
+        the seed of the global random number generators
+    """
+
+    import numpy as np
+    tf.random.set_seed(seed)
+    np.random.seed(seed)
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the current process in
+    megabytes, which never decreases while the process is alive
+
+    Returns:
+
+    peak_rss: float
+        the peak resident set size in megabytes
+    """
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def get_tracing_count(*objects):
+    """Returns the number of times that tf.functions have been traced,
+    counting every tf.function method of modules and plain tf.functions
+
+    Args:
+
+    objects: list
+        a list of tf.functions and objects such as trainers whose
+        methods are decorated with tf.function
+
+    Returns:
+
+    count: int
+        the total number of traces of every tf.function so far
+    """
+
+    def count(fn):
+        for name in ('experimental_get_tracing_count', '_get_tracing_count'):
+            if hasattr(fn, name):
+                return getattr(fn, name)()
+        return 0
+
+    total = 0
+    for obj in objects:
+        if hasattr(obj, 'get_concrete_function'):
+            total += count(obj)
+            continue
+
+        # methods decorated with tf.function are bound to every instance
+        for name in dir(type(obj)):
+            if hasattr(getattr(type(obj), name, None),
+                       'get_concrete_function'):
+                total += count(getattr(obj, name))
+    return total
+
+
+def pad_batch(batch_size, *tensors):
+    """Pad the first axis of several tensors to a fixed batch size by
+    repeating their samples, so that the last partial batch of a dataset
+    has the same shape as every other batch
+
+    Args:
+
+    batch_size: int
+        the fixed batch size that every tensor is padded to
+    tensors: list of tf.Tensor
+        a list of tensors whose first axes have the same size, which must
+        not be larger than the fixed batch size
+
+    Returns:
+
+    mask: tf.Tensor
+        a float32 tensor shaped like [batch_size, 1] that is one for the
+        original samples and zero for the repeated samples
+    tensors: list of tf.Tensor
+        the padded tensors whose first axes have the fixed batch size
+    """
+
+    size = int(tensors[0].shape[0])
+    if size > batch_size:
+        raise ValueError(f"a batch of {size} samples is larger than "
+                         f"the fixed batch size {batch_size}")
+
+    # repeated samples keep statistics such as ranks well defined
+    indices = tf.range(batch_size) % size
+    mask = tf.cast(tf.range(batch_size) < size, tf.float32)[:, tf.newaxis]
+    return mask, [tf.gather(t, indices) for t in tensors]
+
+
+def unpad_statistics(statistics, size, batch_size):
+    """Remove the padded samples from the statistics returned by a step
+    function, keeping statistics that are not computed per sample
+
+    Args:
+
+    statistics: dict
+        a dictionary mapping names to tensors returned by a step function
+    size: int
+        the number of samples in the batch before padding
+    batch_size: int
+        the fixed batch size that the batch was padded to
+
+    Returns:
+
+    statistics: dict
+        a dictionary mapping names to tensors without padded samples
+    """
+
+    return {name: tensor[:size] if len(tensor.shape) > 0
+            and tensor.shape[0] == batch_size else tensor
+            for name, tensor in statistics.items()}
+
+
+def get_fixed_step(module, name, *tensors):
+    """Returns a step function of a trainer that is traced once with an
+    input signature fixed to the shapes of a batch of tensors, and raises
+    an error instead of tracing again for batches of other shapes
+
+    Args:
+
+    module: tf.Module
+        a trainer with a fixed_steps dictionary and a method decorated
+        with tf.function such as train_step
+    name: str
+        the name of the step function such as train_step
+    tensors: list of tf.Tensor
+        an example of the arguments passed to the step function
+
+    Returns:
+
+    step: tf.function
+        a step function whose input signature is fixed
+    """
+
+    if name not in module.fixed_steps:
+        module.fixed_steps[name] = tf.function(
+            getattr(module, name).python_function,
+            input_signature=[tf.TensorSpec(
+                t.shape, t.dtype) for t in tensors],
+            experimental_compile=getattr(module, 'jit_compile', False))
+    return module.fixed_steps[name]
+
+
+def compile_steps(module, *names):
+    """Replace several step functions of a trainer or solver with versions
+    that are compiled with XLA, which fuses the many small operations in
+    the forward and backward passes of small networks into few kernels
+
+    Args:
+
+    module: tf.Module
+        a trainer or solver whose methods are decorated with tf.function
+    names: list of str
+        the names of the step functions to compile such as train_step
+    """
+
+    for name in names:
+        setattr(module, name, tf.function(
+            getattr(module, name).python_function,
+            experimental_relax_shapes=True,
+            experimental_compile=True))
+
+
+def configure_steps(module,
+                    *names,
+                    fixed_batch_size=None,
+                    debug_retracing=False,
+                    jit_compile=False):
+    """Set up how the step functions of a trainer or solver are traced and
+    compiled, which is shared by every trainer that accepts these options
+
+    Args:
+
+    module: tf.Module
+        a trainer or solver whose methods are decorated with tf.function
+    names: list of str
+        the names of the step functions to compile such as train_step
+    fixed_batch_size: int
+        the batch size of every step when step functions are traced
+        once with a fixed input signature, where the last partial
+        batch is padded and masked, or None to allow any batch size
+    debug_retracing: bool
+        whether to raise an error when a step function is traced
+        again after the first epoch of training
+    jit_compile: bool
+        whether to compile the step functions with XLA, which
+        fuses small operations but compiles again for new shapes
+    """
+
+    # trace every step function once with a fixed batch size
+    module.fixed_batch_size = fixed_batch_size
+    module.debug_retracing = debug_retracing
+    module.fixed_steps = dict()
+    module.tracing_counts = dict()
+
+    # compile the step functions with XLA when requested
+    module.jit_compile = jit_compile
+    if jit_compile:
+        compile_steps(module, *names)
+
+
+def check_retracing(module):
+    """Raise an error when a step function of a trainer is traced again
+    after the first time this is called, which finds batches whose shape
+    or python arguments change during training, noting that the first
+    call of a step function may trace twice when it creates variables
+
+    Args:
+
+    module: tf.Module
+        a trainer with a tracing_counts dictionary whose methods are
+        decorated with tf.function
+    """
+
+    counts = {name: get_tracing_count(getattr(module, name))
+              for name in dir(type(module)) if hasattr(getattr(
+                  type(module), name, None), 'get_concrete_function')}
+    for name, step in module.fixed_steps.items():
+        counts[f'fixed_steps/{name}'] = get_tracing_count(step)
+
+    for name, count in counts.items():
+        previous = module.tracing_counts.setdefault(name, count)
+        if count > previous:
+            raise RuntimeError(f"{type(module).__name__}.{name} was traced "
+                               f"again after the first epoch, which added "
+                               f"{count - previous} new traces")
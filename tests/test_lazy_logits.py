@@ -0,0 +1,48 @@
+from design_baselines.data import StaticGraphTask
+import numpy as np
+import unittest
+
+
+class TestLazyLogits(unittest.TestCase):
+
+    def setUp(self):
+        """Build a small discrete synthetic task and score its designs
+        as integers, which lazy logits must reproduce
+        """
+
+        self.task_kwargs = dict(dataset_size=64, design_shape=(8,),
+                                num_classes=4, seed=0)
+        task = StaticGraphTask('Synthetic-NK-v0', **self.task_kwargs)
+        self.x = task.x[:16]
+        self.y = task.predict(self.x)
+
+    def predict_logits(self, normalize_xs):
+        """Score the designs converted to lazy logits, optionally
+        normalized, using the predict method of the task
+        """
+
+        task = StaticGraphTask('Synthetic-NK-v0', **self.task_kwargs)
+        task.map_to_lazy_logits()
+        if normalize_xs:
+            task.map_normalize_x()
+        return task.predict(task.lazy_to_logits(self.x))
+
+    def test_predict_without_normalization(self):
+        """Check that lazy logits are scored without denormalizing them
+        when the designs were never normalized
+        """
+
+        np.testing.assert_allclose(
+            self.predict_logits(False), self.y, rtol=1e-5)
+
+    def test_predict_with_normalization(self):
+        """Check that normalized lazy logits are denormalized before
+        they are converted to integers and scored
+        """
+
+        np.testing.assert_allclose(
+            self.predict_logits(True), self.y, rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
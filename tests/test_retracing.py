@@ -0,0 +1,75 @@
+from design_baselines.ensemble import StackedEnsemble
+from design_baselines.ensemble import StackedForwardModel
+from design_baselines.utils import get_tracing_count
+from design_baselines.utils import check_retracing
+from design_baselines.utils import spearman
+import tensorflow as tf
+import numpy as np
+import unittest
+
+
+class TestFixedBatchSize(unittest.TestCase):
+
+    def setUp(self):
+        """Build a small dataset whose size is not a multiple of the batch
+        size, so that every epoch ends with a ragged batch
+        """
+
+        random = np.random.RandomState(0)
+        self.batch_size = 32
+        self.x = random.normal(size=[100, 8]).astype(np.float32)
+        self.y = random.normal(size=[100, 1]).astype(np.float32)
+        self.b = np.ones([100, 2], dtype=np.float32)
+
+    def test_traced_once(self):
+        """Train for two epochs with a ragged last batch and check that
+        every step function is traced exactly once
+        """
+
+        trainer = StackedEnsemble(
+            StackedForwardModel([8], bootstraps=2, hidden_size=16),
+            fixed_batch_size=self.batch_size)
+
+        # create the variables of the model and optimizer before tracing
+        # since creating variables traces a step function a second time
+        trainer.forward_model(self.x[:1])
+        var_list = trainer.forward_model.trainable_variables
+        trainer.forward_model_optim.apply_gradients(
+            [(tf.zeros_like(v), v) for v in var_list])
+
+        train_data = tf.data.Dataset.from_tensor_slices(
+            (self.x, self.y, self.b)).batch(self.batch_size)
+        validate_data = tf.data.Dataset.from_tensor_slices(
+            (self.x, self.y)).batch(self.batch_size)
+        for epoch in range(2):
+            statistics = trainer.train(train_data)
+            trainer.validate(validate_data)
+            check_retracing(trainer)
+
+        self.assertEqual(statistics['oracle_0/train/nll'].shape[0], 100)
+        self.assertEqual(get_tracing_count(
+            trainer.fixed_steps['train_step']), 1)
+        self.assertEqual(get_tracing_count(
+            trainer.fixed_steps['validate_step']), 1)
+
+    def test_rank_correlation_ignores_padding(self):
+        """Check that the rank correlation of a padded batch matches the
+        rank correlation of the batch before padding
+        """
+
+        trainer = StackedEnsemble(
+            StackedForwardModel([8], bootstraps=2, hidden_size=16),
+            fixed_batch_size=self.batch_size)
+        validate_data = tf.data.Dataset.from_tensor_slices(
+            (self.x[-4:], self.y[-4:])).batch(self.batch_size)
+        statistics = trainer.validate(validate_data)
+
+        prediction = trainer.forward_model.get_distribution(
+            self.x[-4:], training=False).mean()[0, :, 0]
+        np.testing.assert_allclose(
+            statistics['oracle_0/validate/rank_corr'].numpy(),
+            spearman(self.y[-4:, 0], prediction).numpy(), rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()